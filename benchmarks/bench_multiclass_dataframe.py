@@ -0,0 +1,93 @@
+"""
+Compare `multiclass_dataframe` with the previous row-wise implementation.
+
+    python benchmarks/bench_multiclass_dataframe.py --annotations 1000000
+"""
+import argparse
+from datetime import datetime, timedelta
+import time
+
+import numpy as np
+import pandas as pd
+
+from linalgo.annotate.models import Annotation, Document, Entity, Task
+from linalgo.annotate.utils import multiclass_dataframe
+
+
+def make_task(n_annotations, n_documents, n_annotators, n_labels, seed=0):
+    rng = np.random.default_rng(seed)
+    entities = [Entity(unique_id=f'bench-entity-{i}', name=f'label-{i}')
+                for i in range(n_labels)]
+    documents = [Document(unique_id=f'bench-doc-{i}', content=f'text {i}')
+                 for i in range(n_documents)]
+    annotators = [f'bench-annotator-{i}' for i in range(n_annotators)]
+    start = datetime(2021, 1, 1)
+    doc = rng.integers(n_documents, size=n_annotations)
+    annotator = rng.integers(n_annotators, size=n_annotations)
+    label = rng.integers(n_labels, size=n_annotations)
+    seconds = rng.integers(10 ** 7, size=n_annotations)
+    annotations = [
+        Annotation(unique_id=f'bench-annotation-{i}', entity=entities[l],
+                   document=documents[d], annotator=annotators[a],
+                   target={}, created=start + timedelta(seconds=int(s)),
+                   auto_track=False)
+        for i, (d, a, l, s) in enumerate(zip(doc, annotator, label, seconds))
+    ]
+    return Task(entities=entities, documents=documents,
+                annotations=annotations)
+
+
+def rowwise_multiclass_dataframe(task):
+    names = {e: e.name or e.id for e in task.entities}
+    df = pd.DataFrame([{
+        'document': a.document.id,
+        'label': a.entity,
+        'annotator': a.annotator.id,
+        'created': a.created
+    } for a in task.annotations])
+    df['created'] = pd.to_datetime(df['created'])
+    df2 = df.loc[df.groupby(['annotator', 'document']).created.idxmax()]
+    df3 = df2.pivot(index='document', columns='annotator',
+                    values='label').reset_index()
+    annotators = list(df3.columns[1:])
+    df3.columns = ['document_id'] + annotators
+    get_name = np.vectorize(lambda e: names[e] if e in names else None,
+                            otypes=[object])
+    df3[annotators] = df3[annotators].map(get_name)
+    dd = pd.DataFrame([{'document_id': d.id, 'content': d.content}
+                       for d in task.documents])
+    return pd.merge(df3, dd, on='document_id')
+
+
+def timeit(fn, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--annotations', type=int, default=1000000)
+    parser.add_argument('--documents', type=int, default=200000)
+    parser.add_argument('--annotators', type=int, default=10)
+    parser.add_argument('--labels', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    task = make_task(args.annotations, args.documents, args.annotators,
+                     args.labels)
+    print(f'task: {args.annotations} annotations '
+          f'({time.perf_counter() - start:.1f}s to generate)')
+    rowwise = timeit(rowwise_multiclass_dataframe, task, repeat=args.repeat)
+    vectorized = timeit(multiclass_dataframe, task, repeat=args.repeat)
+    print(f'row-wise:   {rowwise:.3f}s')
+    print(f'vectorized: {vectorized:.3f}s')
+    print(f'speedup:    {rowwise / vectorized:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Measure the throughput of `LinalgoClient` against a local fake hub.
+
+    python benchmarks/load_test.py --documents 20000 --latency .005
+
+Reports requests/s and rows/s for each scenario.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from linalgo.hub.client import LinalgoClient  # noqa: E402
+from linalgo.hub.instrumentation import MetricsCollector  # noqa: E402
+from linalgo.tests.fake_hub import FakeHub  # noqa: E402
+from synthetic import SyntheticTask  # noqa: E402
+
+
+def make_hub(synthetic, **kwargs):
+    annotators = [{'id': a, 'name': a, 'owner': None}
+                  for a in synthetic.annotator_ids]
+    columns = synthetic.schedule()
+    schedule = [
+        {'document': d, 'annotator': a, 'status': s, 'timestamp': t,
+         'task': synthetic.task_id, 'type': 'A', 'priority': None,
+         'reviewee': None}
+        for d, a, s, t in zip(columns['document'], columns['annotator'],
+                              columns['status'], columns['timestamp'])]
+    return FakeHub({'id': synthetic.task_id, 'name': synthetic.prefix},
+                   documents=synthetic.documents,
+                   annotations=synthetic.annotations,
+                   entities=synthetic.entities, annotators=annotators,
+                   schedule=schedule, **kwargs)
+
+
+def get_task(client, synthetic, args):
+    task = client.get_task(synthetic.task_id)
+    return len(task.documents) + len(task.annotations)
+
+
+def get_schedule(client, synthetic, args):
+    task = client.get_task(synthetic.task_id, lazy=True)
+    return len(client.get_schedule_columns(task, page_size=args.page_size))
+
+
+def upload(client, synthetic, args):
+    task = client.get_task(synthetic.task_id)
+    annotations = [a.copy() for a in task.annotations[:args.uploads]]
+    for start in range(0, len(annotations), args.batch_size):
+        client.create_annotations(annotations[start:start + args.batch_size])
+    client.delete_annotations(annotations)
+    return 2 * len(annotations)
+
+
+def assign(client, synthetic, args):
+    task = client.get_task(synthetic.task_id, lazy=True)
+    annotator = synthetic.annotator_ids[0]
+    documents = [d['id'] for d in synthetic.documents[:args.uploads]]
+    results = client.assign_many([(d, annotator, task) for d in documents],
+                                 batch_size=args.batch_size)
+    return len(results)
+
+
+SCENARIOS = {
+    'get_task': get_task,
+    'get_schedule': get_schedule,
+    'upload': upload,
+    'assign': assign,
+}
+
+
+def run(scenario, hub, synthetic, args):
+    metrics = MetricsCollector()
+
+    def client_run(_):
+        client = LinalgoClient('token', api_url=hub.url,
+                               instrumentation=metrics)
+        return SCENARIOS[scenario](client, synthetic, args)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        rows = sum(executor.map(client_run, range(args.clients)))
+    elapsed = time.perf_counter() - start
+    requests = sum(metrics.requests.values())
+    return {'scenario': scenario, 'clients': args.clients,
+            'seconds': elapsed, 'requests': requests, 'rows': rows,
+            'requests_per_second': requests / elapsed,
+            'rows_per_second': rows / elapsed,
+            'bytes_in': sum(metrics.bytes_in.values()),
+            'errors': hub.errors}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--documents', type=int, default=5000)
+    parser.add_argument('--annotators', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.,
+                        help='seconds added to each response')
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--error-rate', type=float, default=0.)
+    parser.add_argument('--clients', type=int, default=1,
+                        help='number of concurrent clients')
+    parser.add_argument('--uploads', type=int, default=2000,
+                        help='annotations or assignments uploaded')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--scenario', action='append',
+                        choices=sorted(SCENARIOS))
+    parser.add_argument('--output', default=None,
+                        help='where to save the results as JSON')
+    args = parser.parse_args(argv)
+
+    synthetic = SyntheticTask(n_documents=args.documents,
+                              n_annotators=args.annotators, prefix='load')
+    results = []
+    with make_hub(synthetic, latency=args.latency, page_size=args.page_size,
+                  error_rate=args.error_rate) as hub:
+        for scenario in args.scenario or list(SCENARIOS):
+            result = run(scenario, hub, synthetic, args)
+            results.append(result)
+            print(f"{scenario:14s} {result['requests']:6d} requests "
+                  f"{result['requests_per_second']:9.1f} req/s "
+                  f"{result['rows_per_second']:11.1f} rows/s "
+                  f"{result['seconds']:8.2f}s", flush=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""
+Run the benchmark suite, save the timings as JSON and compare them with a
+baseline.
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --baseline results.json --threshold .2
+
+Exits with status 1 when a benchmark is slower than its baseline by more
+than the threshold.
+"""
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import pickle
+import platform
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from linalgo.annotate.bbox import BoundingBox  # noqa: E402
+from linalgo.annotate.diff import Snapshot  # noqa: E402
+from linalgo.annotate.gazetteer import Gazetteer  # noqa: E402
+from linalgo.annotate.models import (  # noqa: E402
+    Annotation, DocumentStatus, TargetFactory
+)
+from linalgo.annotate.serializers import AnnotationSerializer  # noqa: E402
+from linalgo.annotate.sharding import split  # noqa: E402
+from linalgo.annotate.transformers import (  # noqa: E402
+    MultiClassTransformer, MultiLabelTransformer
+)
+from linalgo.annotate.utils import multiclass_dataframe  # noqa: E402
+from linalgo.annotate.xtram import compare_tags, tokenize  # noqa: E402
+from linalgo.hub.scheduler import PriorityScheduler, Scheduler  # noqa: E402
+from synthetic import SyntheticTask  # noqa: E402
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Register a benchmark. The decorated function receives the `Fixtures`
+    and returns the function to time, so that setup is not measured.
+    """
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+class Fixtures:
+    """Synthetic data shared by the benchmarks, created on first use."""
+
+    def __init__(self, n_documents, n_annotators, n_entities, seed):
+        self.params = {'documents': n_documents, 'annotators': n_annotators,
+                       'entities': n_entities, 'seed': seed}
+        self._cache = {}
+
+    def _get(self, name, fn):
+        if name not in self._cache:
+            self._cache[name] = fn()
+        return self._cache[name]
+
+    def synthetic(self, selector='span', annotated=.5):
+        p = self.params
+        return self._get(('synthetic', selector, annotated), lambda: (
+            SyntheticTask(
+                n_documents=p['documents'], n_annotators=p['annotators'],
+                n_entities=p['entities'], selector=selector,
+                annotated=annotated, seed=p['seed'],
+                prefix=f'bench-{selector}-{annotated}')))
+
+    def task(self, selector='span', annotated=.5):
+        return self._get(('task', selector, annotated),
+                         lambda: self.synthetic(selector, annotated).task())
+
+
+@benchmark('diff.snapshot')
+def bench_snapshot_diff(fixtures):
+    annotations = fixtures.task().annotations
+    snapshot = Snapshot(annotations)
+    return lambda: snapshot.diff(annotations)
+
+
+@benchmark('gazetteer.find')
+def bench_gazetteer(fixtures):
+    documents = fixtures.task().documents
+    gazetteer = Gazetteer({
+        'names': ['Alice', 'Bob', 'Alice and Bob'],
+        'places': ['London', 'Paris', 'in London', 'in Paris'],
+    })
+    return lambda: gazetteer.find_many(d.content for d in documents)
+
+
+@benchmark('models.annotation_from_dict')
+def bench_annotation_from_dict(fixtures):
+    records = fixtures.synthetic('mixed').annotations
+    return lambda: [Annotation.from_dict(r) for r in records]
+
+
+@benchmark('models.copy_many')
+def bench_copy_many(fixtures):
+    annotations = fixtures.task('mixed').annotations
+    return lambda: Annotation.copy_many(annotations, auto_track=False)
+
+
+@benchmark('models.target_factory')
+def bench_target_factory(fixtures):
+    targets = [json.dumps(r['target'])
+               for r in fixtures.synthetic('mixed').annotations]
+    return lambda: [TargetFactory.factory(t) for t in targets]
+
+
+@benchmark('sharding.split')
+def bench_split(fixtures):
+    task = fixtures.task()
+    return lambda: [pickle.dumps(shard) for shard in split(task, 8)]
+
+
+@benchmark('serializers.annotation_serializer')
+def bench_annotation_serializer(fixtures):
+    annotations = fixtures.task('mixed').annotations
+    return lambda: AnnotationSerializer(annotations).serialize()
+
+
+@benchmark('xtram.tokenize')
+def bench_tokenize(fixtures):
+    documents = fixtures.task().documents
+    return lambda: tokenize(documents)
+
+
+@benchmark('xtram.compare_tags')
+def bench_compare_tags(fixtures):
+    task = fixtures.task()
+    return lambda: compare_tags(task)
+
+
+@benchmark('transformers.multiclass')
+def bench_multiclass(fixtures):
+    task = fixtures.task()
+    return lambda: MultiClassTransformer().transform(task, strategy='majority')
+
+
+@benchmark('transformers.multilabel')
+def bench_multilabel(fixtures):
+    task = fixtures.task()
+    classes = [e.name for e in task.entities]
+    transformer = MultiLabelTransformer(classes)
+    return lambda: list(transformer.iter_batches(
+        task, strategy='keep-last-by-annotator'))
+
+
+@benchmark('utils.multiclass_dataframe')
+def bench_multiclass_dataframe(fixtures):
+    task = fixtures.task()
+    return lambda: multiclass_dataframe(task)
+
+
+@benchmark('bbox.overlap')
+def bench_bbox_overlap(fixtures):
+    rng = np.random.default_rng(fixtures.params['seed'])
+    n = 20 * fixtures.params['documents']
+    corners = rng.uniform(0, 100, size=(n, 2, 2))
+    boxes = [BoundingBox(left=c[0, 0], right=c[0, 0] + c[1, 0],
+                         top=c[0, 1], bottom=c[0, 1] + c[1, 1])
+             for c in corners]
+    pairs = list(zip(boxes[::2], boxes[1::2]))
+    return lambda: [a.overlap(b) for a, b in pairs]
+
+
+def _scheduler_data(fixtures):
+    synthetic = fixtures.synthetic(annotated=.02)
+    return (fixtures.task(annotated=.02), synthetic.schedule(seed=1),
+            synthetic.annotator_ids)
+
+
+@benchmark('scheduler.init')
+def bench_scheduler_init(fixtures):
+    task, schedule, _ = _scheduler_data(fixtures)
+    return lambda: Scheduler(task, schedule, random_state=0)
+
+
+@benchmark('scheduler.random_assign')
+def bench_random_assign(fixtures):
+    task, schedule, annotators = _scheduler_data(fixtures)
+    scheduler = Scheduler(task, schedule, random_state=0)
+    n = max(1, len(task.documents) // (20 * len(annotators)))
+    return lambda: [scheduler.random_assign(a, n, record=False)
+                    for a in annotators]
+
+
+@benchmark('scheduler.random_review')
+def bench_random_review(fixtures):
+    task, schedule, annotators = _scheduler_data(fixtures)
+    scheduler = Scheduler(task, schedule, random_state=0)
+    pairs = [(a, b) for a in annotators for b in annotators if a != b]
+    return lambda: [scheduler.random_review(a, b, n=1, record=False)
+                    for a, b in pairs]
+
+
+@benchmark('scheduler.plan')
+def bench_plan(fixtures):
+    task, schedule, annotators = _scheduler_data(fixtures)
+    scheduler = Scheduler(task, schedule, random_state=0)
+    quota = max(1, len(task.documents) // (10 * len(annotators)))
+    return lambda: scheduler.plan(annotators, quota, review_ratio=.2,
+                                  record=False)
+
+
+@benchmark('scheduler.priority_push_pop')
+def bench_priority(fixtures):
+    _, schedule, annotators = _scheduler_data(fixtures)
+    rng = np.random.default_rng(fixtures.params['seed'])
+    rows = [(a, d, p) for a, d, s, p in zip(
+        schedule['annotator'], schedule['document'], schedule['status'],
+        rng.random(len(schedule['document'])))
+        if s == DocumentStatus.Assigned.value]
+
+    def run():
+        scheduler = PriorityScheduler(random_state=0)
+        for annotator, document, priority in rows:
+            scheduler.push(annotator, document, priority)
+        for annotator in annotators:
+            while scheduler.pop(annotator) is not None:
+                pass
+    return run
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings)
+    return {'min': timings.min(), 'median': float(np.median(timings)),
+            'mean': timings.mean(), 'repeat': repeat}
+
+
+def run(fixtures, names, repeat, warmup=1):
+    results = {}
+    for name in names:
+        fn = BENCHMARKS[name](fixtures)
+        for _ in range(warmup):
+            fn()
+        results[name] = measure(fn, repeat)
+        print(f"{name:40s} {results[name]['median'] * 1000:10.2f} ms",
+              flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare median timings with a baseline
+
+    Returns
+    -------
+    List[Tuple[str, float, float, float]]
+        The name, baseline, current time and ratio of the benchmarks slower
+        than the baseline by more than `threshold`
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['median'], result['median']
+        ratio = after / before if before > 0 else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append((name, before, after, ratio))
+            flag = '  REGRESSION'
+        print(f'{name:40s} {before * 1000:10.2f} -> {after * 1000:10.2f} ms '
+              f'({ratio:.2f}x){flag}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--annotators', type=int, default=5)
+    parser.add_argument('--entities', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--filter', default=None,
+                        help='regular expression selecting benchmarks')
+    parser.add_argument('--output', default=None,
+                        help='where to save the results as JSON')
+    parser.add_argument('--baseline', default=None,
+                        help='results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=.2,
+                        help='tolerated slowdown, as a fraction')
+    args = parser.parse_args(argv)
+
+    names = [n for n in BENCHMARKS
+             if args.filter is None or re.search(args.filter, n)]
+    fixtures = Fixtures(args.documents, args.annotators, args.entities,
+                        args.seed)
+    results = run(fixtures, names, args.repeat)
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': fixtures.params,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('params') != fixtures.params:
+            print('warning: the baseline was run with other parameters '
+                  f"{baseline.get('params')}")
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
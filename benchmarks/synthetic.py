@@ -0,0 +1,143 @@
+"""
+Deterministic synthetic tasks for benchmarks.
+
+The same parameters and seed always produce the same ids, texts, labels
+and timestamps, so that timings can be compared between runs.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from linalgo.annotate.models import Annotation, Document, Entity, Task
+
+
+VOCABULARY = [
+    'the', 'annotation', 'of', 'a', 'document', 'is', 'made', 'by',
+    'several', 'annotators', 'who', 'label', 'spans', 'and', 'boxes',
+    'London', 'Paris', 'Alice', 'Bob', 'model', 'review', 'task', 'in',
+    ',', '.', ';',
+]
+
+
+class SyntheticTask:
+    """
+    Records of a task, shaped like the hub exports.
+
+    Parameters
+    ----------
+    n_documents: int
+        Number of documents
+    n_annotators: int
+        Number of annotators
+    n_entities: int
+        Number of entities
+    annotations_per_document: int
+        Number of annotations of each annotator on each annotated document
+    annotated: float
+        Fraction of documents annotated by each annotator
+    selector: str, {'span', 'bbox', 'mixed'}
+        The kind of target selectors
+    tokens: int
+        Number of tokens per document
+    seed: int
+        Seed of the random number generator
+    prefix: str
+        Prefix of all ids, to keep synthetic objects apart in the registries
+    """
+
+    def __init__(self, n_documents=1000, n_annotators=5, n_entities=4,
+                 annotations_per_document=2, annotated=.5, selector='span',
+                 tokens=50, seed=0, prefix='synthetic'):
+        if selector not in ('span', 'bbox', 'mixed'):
+            raise NotImplementedError(f'{selector} is not a valid selector.')
+        rng = np.random.default_rng(seed)
+        self.prefix = prefix
+        self.task_id = f'{prefix}-task'
+        self.corpus_id = f'{prefix}-corpus'
+        self.annotator_ids = [f'{prefix}-annotator-{i}'
+                              for i in range(n_annotators)]
+        self.entities = [
+            {'id': f'{prefix}-entity-{i}', 'title': f'ENTITY-{i}',
+             'color': f'{(i * 2654435761) % 0xffffff:06x}'}
+            for i in range(n_entities)]
+        self.documents = []
+        for i in range(n_documents):
+            words = rng.choice(len(VOCABULARY), size=tokens)
+            self.documents.append({
+                'id': f'{prefix}-document-{i}', 'uri': f'synthetic://{i}',
+                'content': ' '.join(VOCABULARY[w] for w in words),
+                'corpus': self.corpus_id})
+        start = datetime(2021, 1, 1)
+        self.annotations = []
+        for a, annotator in enumerate(self.annotator_ids):
+            annotated_docs = np.flatnonzero(
+                rng.random(n_documents) < annotated)
+            for d in annotated_docs:
+                document = self.documents[d]
+                for k in range(annotations_per_document):
+                    kind = selector
+                    if selector == 'mixed':
+                        kind = 'span' if rng.random() < .5 else 'bbox'
+                    created = start + timedelta(
+                        seconds=int(rng.integers(10 ** 7)))
+                    self.annotations.append({
+                        'id': f'{prefix}-annotation-{a}-{d}-{k}',
+                        'annotator': annotator,
+                        'document': document['id'],
+                        'entity': self.entities[
+                            rng.integers(n_entities)]['id'],
+                        'task': self.task_id,
+                        'body': '',
+                        'created': created.isoformat(),
+                        'target': {
+                            'source': document['id'],
+                            'selector': [self._selector(
+                                kind, document['content'], rng)]
+                        },
+                    })
+
+    @staticmethod
+    def _selector(kind, content, rng):
+        if kind == 'bbox':
+            return {'x': float(rng.uniform(0, 1000)),
+                    'y': float(rng.uniform(0, 1000)),
+                    'width': float(rng.uniform(1, 200)),
+                    'height': float(rng.uniform(1, 200))}
+        # spans cover one to three whole tokens
+        starts = [0] + [i + 1 for i, c in enumerate(content) if c == ' ']
+        ends = [i for i, c in enumerate(content) if c == ' '] + [len(content)]
+        first = int(rng.integers(len(starts)))
+        last = min(len(ends) - 1, first + int(rng.integers(3)))
+        return {'startContainer': '/p[1]', 'endContainer': '/p[1]',
+                'startOffset': starts[first], 'endOffset': ends[last]}
+
+    def task(self) -> Task:
+        """Create the model objects of the task."""
+        entities = [Entity.from_dict(e) for e in self.entities]
+        documents = [Document.from_dict(d) for d in self.documents]
+        annotations = [Annotation.from_dict(a) for a in self.annotations]
+        return Task(unique_id=self.task_id, name=self.prefix,
+                    entities=entities, documents=documents,
+                    annotators=self.annotator_ids, annotations=annotations)
+
+    def schedule(self, assigned=.3, completed=.3, seed=0):
+        """
+        Assignments of documents to annotators, as a dict of columns
+        accepted by `Scheduler`
+        """
+        rng = np.random.default_rng(seed)
+        columns = {'document': [], 'annotator': [], 'status': [],
+                   'timestamp': []}
+        start = np.datetime64('2021-01-01T00:00:00')
+        for annotator in self.annotator_ids:
+            draw = rng.random(len(self.documents))
+            for d in np.flatnonzero(draw < assigned + completed):
+                columns['document'].append(self.documents[d]['id'])
+                columns['annotator'].append(annotator)
+                columns['status'].append('A' if draw[d] < assigned else 'C')
+                columns['timestamp'].append(str(
+                    start + np.timedelta64(int(rng.integers(10 ** 7)), 's')))
+        return columns
+
+
+__all__ = ['SyntheticTask', 'VOCABULARY']
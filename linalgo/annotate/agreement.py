@@ -0,0 +1,377 @@
+"""Inter-annotator agreement on token-level tags."""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List
+
+import numpy as np
+
+from linalgo.annotate.alignment import (
+    DocumentAlignment, LabelIndex, _spans, tag_tokens
+)
+from linalgo.annotate.batching import bounded_map
+from linalgo.annotate.models import Task
+
+
+class AgreementCounts:
+    """
+    Sufficient statistics for agreement measures. Counts computed on
+    disjoint sets of documents can be added together.
+
+    Attributes
+    ----------
+    tables: Dict[Tuple[int, int], np.ndarray]
+        (labels x labels) contingency tables of the pairs of annotators
+        that annotated the same documents. For i < j, `tables[i, j][k, l]`
+        counts tokens tagged `k` by annotator `i` and `l` by annotator `j`.
+    coincidences: np.ndarray
+        (labels x labels) Krippendorff coincidence matrix.
+    fleiss: np.ndarray
+        Sum of the per-token observed agreement and number of tokens.
+    totals: np.ndarray
+        Number of times each label was assigned.
+    """
+
+    def __init__(self, n_annotators: int, n_labels: int):
+        self.n_annotators = n_annotators
+        self.n_labels = n_labels
+        self.tables = {}
+        self.coincidences = np.zeros((n_labels, n_labels), dtype=np.float64)
+        self.fleiss = np.zeros(2, dtype=np.float64)
+        self.totals = np.zeros(n_labels, dtype=np.int64)
+
+    def update(self, tags: np.ndarray, columns: np.ndarray):
+        """
+        Add the tags of one document
+
+        Parameters
+        ----------
+        tags: np.ndarray
+            (tokens x m) matrix of label codes
+        columns: np.ndarray
+            Global index of the annotator of each column of `tags`
+        """
+        n_tokens, m = tags.shape
+        if n_tokens == 0 or m < 2:
+            return self
+        k = self.n_labels
+        tags = tags.astype(np.int64, copy=False)
+        for a in range(m):
+            for b in range(a + 1, m):
+                i, j = columns[a], columns[b]
+                x, y = (tags[:, a], tags[:, b]) if i < j else \
+                    (tags[:, b], tags[:, a])
+                counts = np.bincount(x * k + y, minlength=k * k)
+                self._add_table((min(i, j), max(i, j)), counts.reshape(k, k))
+        rows = np.repeat(np.arange(n_tokens) * k, m)
+        n = np.bincount(rows + tags.ravel(), minlength=n_tokens * k)
+        n = n.reshape(n_tokens, k)
+        totals = n.sum(axis=0)
+        self.totals += totals
+        self.coincidences += (n.T @ n - np.diag(totals)) / (m - 1)
+        self.fleiss += [((n ** 2).sum() - n_tokens * m) / (m * (m - 1)),
+                        n_tokens]
+        return self
+
+    def _add_table(self, pair, table):
+        if pair in self.tables:
+            self.tables[pair] += table
+        else:
+            self.tables[pair] = table.astype(np.int64, copy=True)
+
+    def table(self, i: int, j: int) -> np.ndarray:
+        """The contingency table of annotators `i` < `j`."""
+        table = self.tables.get((i, j))
+        if table is None:
+            return np.zeros((self.n_labels, self.n_labels), dtype=np.int64)
+        return table
+
+    @property
+    def pairs(self) -> np.ndarray:
+        """
+        The dense (annotators x annotators x labels x labels) array of
+        contingency tables
+        """
+        n, k = self.n_annotators, self.n_labels
+        pairs = np.zeros((n, n, k, k), dtype=np.int64)
+        for (i, j), table in self.tables.items():
+            pairs[i, j] = table
+        return pairs
+
+    def __iadd__(self, other: 'AgreementCounts'):
+        for pair, table in other.tables.items():
+            self._add_table(pair, table)
+        self.coincidences += other.coincidences
+        self.fleiss += other.fleiss
+        self.totals += other.totals
+        return self
+
+
+class ConfusionMatrix:
+    """
+    Confusion matrix accumulated over batches with a fixed label index.
+
+    Memory only depends on the number of labels, so it can consume
+    alignments as they are produced. Matrices computed in different
+    processes over the same labels can be added together.
+
+    Parameters
+    ----------
+    labels: List
+        The labels, in the order of the rows and columns of the matrix
+    """
+
+    def __init__(self, labels: Iterable):
+        self.labels = list(labels)
+        self.index = {label: code for code, label in enumerate(self.labels)}
+        n = len(self.labels)
+        self.matrix = np.zeros((n, n), dtype=np.int64)
+
+    def __repr__(self):
+        return f'ConfusionMatrix::{len(self.labels)} labels'
+
+    def encode(self, values: Iterable) -> np.ndarray:
+        values = np.asarray(values, dtype=object)
+        uniques, inverse = np.unique(values, return_inverse=True)
+        codes = np.array([self.index[u] for u in uniques], dtype=np.int64)
+        return codes[inverse].reshape(values.shape)
+
+    def update_codes(self, y_true: np.ndarray, y_pred: np.ndarray):
+        """Add pairs of label codes."""
+        n = len(self.labels)
+        y_true = np.asarray(y_true, dtype=np.int64)
+        y_pred = np.asarray(y_pred, dtype=np.int64)
+        counts = np.bincount(y_true * n + y_pred, minlength=n * n)
+        self.matrix += counts.reshape(n, n)
+        return self
+
+    def update(self, y_true: Iterable, y_pred: Iterable):
+        """Add pairs of labels."""
+        return self.update_codes(self.encode(y_true), self.encode(y_pred))
+
+    def update_alignment(self, alignment: DocumentAlignment,
+                         true_annotator: str = None,
+                         pred_annotator: str = None):
+        """
+        Add the tags of two annotators of a `DocumentAlignment`. The matrix
+        labels must be ordered by `LabelIndex` code, e.g. `LabelIndex.names`.
+        The first two annotators
+        are compared by default and documents missing one of them are
+        skipped.
+        """
+        annotators = alignment.annotators
+        true_annotator = true_annotator or annotators[0]
+        if pred_annotator is None and len(annotators) > 1:
+            pred_annotator = annotators[1]
+        if true_annotator not in annotators or pred_annotator not in annotators:
+            return self
+        y_true = alignment.tags[:, annotators.index(true_annotator)]
+        y_pred = alignment.tags[:, annotators.index(pred_annotator)]
+        return self.update_codes(y_true, y_pred)
+
+    def __iadd__(self, other: 'ConfusionMatrix'):
+        if other.labels != self.labels:
+            raise ValueError('Cannot merge matrices with different labels.')
+        self.matrix += other.matrix
+        return self
+
+    def __add__(self, other: 'ConfusionMatrix'):
+        result = ConfusionMatrix(self.labels)
+        result.matrix = self.matrix.copy()
+        result += other
+        return result
+
+    def observed(self):
+        """A matrix restricted to the labels that were seen at least once."""
+        seen = (self.matrix.sum(axis=0) + self.matrix.sum(axis=1)) > 0
+        result = ConfusionMatrix(np.asarray(self.labels, dtype=object)[seen])
+        result.matrix = self.matrix[np.ix_(seen, seen)]
+        return result
+
+    def normalized(self):
+        """The matrix normalized by the number of true samples per label."""
+        return self.matrix / self.matrix.sum(axis=1)[:, np.newaxis]
+
+
+def _kappa(table: np.ndarray):
+    n = table.sum()
+    if n == 0:
+        return np.nan
+    po = np.trace(table) / n
+    pe = (table.sum(axis=0) * table.sum(axis=1)).sum() / n ** 2
+    if pe == 1:
+        return np.nan
+    return (po - pe) / (1 - pe)
+
+
+def _binarize(table: np.ndarray, code: int):
+    pos = table[code, code]
+    row = table[code].sum() - pos
+    col = table[:, code].sum() - pos
+    return np.array([[pos, row], [col, table.sum() - pos - row - col]])
+
+
+def _alpha(coincidences: np.ndarray):
+    n_c = coincidences.sum(axis=1)
+    n = n_c.sum()
+    expected = n ** 2 - (n_c ** 2).sum()
+    if n <= 1 or expected == 0:
+        return np.nan
+    observed = n - np.trace(coincidences)
+    return 1 - (n - 1) * observed / expected
+
+
+class Agreement:
+    """
+    Agreement measures computed from `AgreementCounts`.
+
+    Labels are indexed as in `labels` (code 0 is the outside tag) and
+    annotators as in `annotators`.
+    """
+
+    def __init__(self, counts: AgreementCounts, labels: LabelIndex,
+                 annotators: List[str]):
+        self.counts = counts
+        self.labels = labels
+        self.annotators = annotators
+
+    def __repr__(self):
+        return f'Agreement::{len(self.annotators)} annotators'
+
+    def _code(self, entity):
+        if entity is None:
+            return None
+        return self.labels.encode(entity)
+
+    def cohen_kappa(self, entity=None):
+        """
+        Cohen's kappa for every pair of annotators
+
+        Parameters
+        ----------
+        entity: Entity
+            If provided, compute the kappa of the binary task "tagged with
+            `entity` or not"
+
+        Returns
+        -------
+        np.ndarray
+            A symmetric (annotators x annotators) matrix, NaN for pairs that
+            never annotated the same document.
+        """
+        code = self._code(entity)
+        n = self.counts.n_annotators
+        kappa = np.full((n, n), np.nan)
+        for i in range(n):
+            for j in range(i + 1, n):
+                table = self.counts.table(i, j)
+                if code is not None:
+                    table = _binarize(table, code)
+                kappa[i, j] = kappa[j, i] = _kappa(table)
+        return kappa
+
+    def fleiss_kappa(self):
+        """Fleiss' kappa, allowing a varying number of annotators per token."""
+        p_obs, n_tokens = self.counts.fleiss
+        totals = self.counts.totals
+        if n_tokens == 0:
+            return np.nan
+        p = totals / totals.sum()
+        pe = (p ** 2).sum()
+        if pe == 1:
+            return np.nan
+        return (p_obs / n_tokens - pe) / (1 - pe)
+
+    def krippendorff_alpha(self, entity=None):
+        """
+        Krippendorff's alpha for nominal data
+
+        Parameters
+        ----------
+        entity: Entity
+            If provided, compute the alpha of the binary task "tagged with
+            `entity` or not"
+        """
+        coincidences = self.counts.coincidences
+        code = self._code(entity)
+        if code is not None:
+            coincidences = _binarize(coincidences, code)
+        return _alpha(coincidences)
+
+
+def _count(payload):
+    n_annotators, n_labels, dtype, untag_punct, documents = payload
+    counts = AgreementCounts(n_annotators, n_labels)
+    for content, spans in documents:
+        columns = sorted({column for column, _, _, _ in spans})
+        local = {column: j for j, column in enumerate(columns)}
+        spans = [(local[c], code, i, j) for c, code, i, j in spans]
+        _, _, _, tags = tag_tokens(
+            content, spans, len(columns), dtype, untag_punct)
+        counts.update(tags, np.array(columns))
+    return counts
+
+
+def _document_spans(document, index, labels):
+    spans = sorted(_spans(document.annotations), key=lambda s: s[0].created)
+    return [(index[a.annotator.id], labels.encode(a.entity), s.start_offset,
+             s.end_offset) for a, s in spans]
+
+
+def _payloads(task, labels, index, untag_punct, chunksize):
+    documents = []
+    for document in task.documents:
+        spans = _document_spans(document, index, labels)
+        if len({column for column, _, _, _ in spans}) < 2:
+            continue
+        documents.append((document.content, spans))
+        if len(documents) == chunksize:
+            yield len(index), len(labels), labels.dtype, untag_punct, \
+                documents
+            documents = []
+    if len(documents) > 0:
+        yield len(index), len(labels), labels.dtype, untag_punct, documents
+
+
+def agreement(task: Task, untag_punct=True, n_jobs=None, chunksize=256):
+    """
+    Compute inter-annotator agreement on a span annotation task
+
+    The spans of each document are reduced to tuples of codes and offsets
+    in the calling process. Documents are then tokenized, aligned and
+    counted per chunk, in `n_jobs` worker processes if provided, and the
+    partial counts are summed. Only the contingency tables of the pairs of
+    annotators seen in a chunk are sent back.
+
+    Parameters
+    ----------
+    task: Task
+        The task to evaluate
+    untag_punct : bool
+        Whether or not to automatically untag punctuation tokens
+    n_jobs: int
+        Number of worker processes. Counts are computed in the calling
+        process if None.
+    chunksize: int
+        Number of documents sent to a worker at once
+
+    Returns
+    -------
+    Agreement
+    """
+    annotators = sorted(
+        {a.annotator.id for doc in task.documents for a in doc.annotations})
+    index = {a: i for i, a in enumerate(annotators)}
+    labels = LabelIndex(task.entities)
+    payloads = _payloads(task, labels, index, untag_punct, chunksize)
+    counts = AgreementCounts(len(annotators), len(labels))
+    if n_jobs is None:
+        for payload in payloads:
+            counts += _count(payload)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            for partial in bounded_map(
+                    executor, _count, payloads, 2 * n_jobs):
+                counts += partial
+    return Agreement(counts, labels, annotators)
+
+
+__all__ = ['Agreement', 'AgreementCounts', 'ConfusionMatrix', 'agreement']
@@ -0,0 +1,224 @@
+"""Align span annotations with the tokens of their documents."""
+import string
+from typing import Iterable, List
+
+import numpy as np
+
+from linalgo.annotate.models import Document, Entity, Task, XPathSelector
+
+
+OUTSIDE = 'O'
+
+
+def is_punct(x):
+    if x in string.punctuation:
+        return True
+    if x in ['-RRB-', '-LRB-']:
+        return True
+    return False
+
+
+def token_offsets(content: str):
+    """
+    Split a text on whitespace and compute the offsets of each token
+
+    Offsets follow the convention of `xtram.tokenize`: `start` is the index
+    of the first character of a token and `end` the index of its last one.
+
+    Parameters
+    -------------
+    content: str
+        The text to tokenize
+
+    Returns
+    ---------
+    Tuple[List[str], np.ndarray, np.ndarray]
+        The tokens, their start offsets and their end offsets
+    """
+    tokens = content.split()
+    lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+    end = np.cumsum(lengths) + np.arange(len(tokens)) - 1
+    start = end - lengths + 1
+    return tokens, start, end
+
+
+class LabelIndex:
+    """
+    Map entities to integer tag codes. Code 0 is reserved for the outside
+    tag `O` so that a zero-filled matrix means "untagged".
+    """
+
+    def __init__(self, entities: Iterable[Entity]):
+        entities = list(entities)
+        self.ids = [None] + [e.id for e in entities]
+        self.names = [OUTSIDE] + [e.name or e.id for e in entities]
+        self.codes = {eid: code for code, eid in enumerate(self.ids)
+                      if eid is not None}
+        self.dtype = np.int16 if len(self.ids) < 2 ** 15 else np.int32
+
+    def __len__(self):
+        return len(self.ids)
+
+    def encode(self, entity: Entity) -> int:
+        return self.codes[entity.id]
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.asarray(self.names, dtype=object)[codes]
+
+
+class DocumentAlignment:
+    """
+    Token-level tags of several annotators on one document.
+
+    `tags` is a dense (tokens x annotators) matrix of codes from a
+    `LabelIndex`, the j-th column holding the tags of `annotators[j]`.
+    """
+
+    def __init__(self, document_id: str, tokens: List[str], start: np.ndarray,
+                 end: np.ndarray, annotators: List[str], tags: np.ndarray):
+        self.document_id = document_id
+        self.tokens = tokens
+        self.start = start
+        self.end = end
+        self.annotators = annotators
+        self.tags = tags
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __repr__(self):
+        return f'DocumentAlignment::{self.document_id}'
+
+    def to_records(self, labels: LabelIndex):
+        names = labels.decode(self.tags).T.tolist()
+        columns = [self.tokens, self.start.tolist(), self.end.tolist()] + names
+        keys = ['token', 'start', 'end'] + self.annotators
+        return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def _spans(annotations):
+    for annotation in annotations:
+        target = annotation.target
+        if target is None or len(target.selector) == 0:
+            continue
+        selector = target.selector[0]
+        if isinstance(selector, XPathSelector):
+            yield annotation, selector
+
+
+def tag_tokens(content: str, spans: List[tuple], n_columns: int,
+               dtype=np.int16, untag_punct=True):
+    """
+    Tokenize a text and tag its tokens with spans
+
+    Token offsets are mapped to span offsets with a binary search, so the
+    cost is O((tokens + spans) log tokens).
+
+    Parameters
+    -------------
+    content: str
+        The text to tokenize
+    spans: List[Tuple[int, int, int, int]]
+        (column, label code, start offset, end offset) of each span. When
+        spans of the same column overlap, the last one wins.
+    n_columns: int
+        The number of columns of the tag matrix
+    dtype: np.dtype
+        The type of the tag matrix, e.g. `LabelIndex.dtype`
+    untag_punct : bool
+        Whether or not to automatically untag punctuation tokens
+
+    Returns
+    ---------
+    Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]
+        The tokens, their start and end offsets and the
+        (tokens x n_columns) tag matrix
+    """
+    tokens, start, end = token_offsets(content)
+    tags = np.zeros((len(tokens), n_columns), dtype=dtype)
+    if len(spans) > 0:
+        span_start = np.fromiter((s[2] for s in spans), dtype=np.int64,
+                                 count=len(spans))
+        span_end = np.fromiter((s[3] for s in spans), dtype=np.int64,
+                               count=len(spans))
+        first = np.searchsorted(start, span_start, side='left')
+        last = np.searchsorted(end, span_end, side='right')
+        for (column, code, _, _), i, j in zip(spans, first, last):
+            if i < j:
+                tags[i:j, column] = code
+    if untag_punct and len(tokens) > 0:
+        punct = np.fromiter(map(is_punct, tokens), dtype=bool,
+                            count=len(tokens))
+        tags[punct] = 0
+    return tokens, start, end, tags
+
+
+def align_document(document: Document, labels: LabelIndex,
+                   untag_punct=True, min_annotators=1):
+    """
+    Align the span annotations of a document with its tokens
+
+    The cost is O((tokens + annotations) log tokens) regardless of how many
+    annotations a document has, see `tag_tokens`. When annotations of the
+    same annotator overlap, the most recent one wins.
+
+    Parameters
+    -------------
+    document: Document
+        The document to align
+    labels: LabelIndex
+        The index used to encode entities
+    untag_punct : bool
+        Whether or not to automatically untag punctuation tokens
+    min_annotators: int
+        Return None if fewer annotators annotated the document
+
+    Returns
+    ---------
+    DocumentAlignment
+    """
+    spans = sorted(_spans(document.annotations), key=lambda s: s[0].created)
+    annotators = sorted({a.annotator.id for a, _ in spans})
+    if len(annotators) < min_annotators:
+        return None
+    columns = {annotator: j for j, annotator in enumerate(annotators)}
+    spans = [(columns[a.annotator.id], labels.encode(a.entity),
+              s.start_offset, s.end_offset) for a, s in spans]
+    tokens, start, end, tags = tag_tokens(
+        document.content, spans, len(annotators), labels.dtype, untag_punct)
+    return DocumentAlignment(document.id, tokens, start, end, annotators, tags)
+
+
+def align(task: Task, untag_punct=True, min_annotators=2):
+    """
+    Lazily align the documents of a task annotated by enough annotators
+
+    Parameters
+    -------------
+    task : Task
+        The task object to compute alignement from
+    untag_punct : bool
+        Whether or not to automatically untag punctuation tokens
+    min_annotators: int
+        Skip documents annotated by fewer annotators
+
+    Returns
+    ---------
+    Tuple[LabelIndex, Iterator[DocumentAlignment]]
+    """
+    labels = LabelIndex(task.entities)
+
+    def alignments():
+        for doc in task.documents:
+            al = align_document(doc, labels, untag_punct=untag_punct,
+                                min_annotators=min_annotators)
+            if al is not None:
+                yield al
+
+    return labels, alignments()
+
+
+__all__ = [
+    'DocumentAlignment', 'LabelIndex', 'align', 'align_document',
+    'tag_tokens', 'token_offsets'
+]
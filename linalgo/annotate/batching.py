@@ -0,0 +1,39 @@
+from collections import deque
+from itertools import islice
+from typing import Iterable
+
+
+def batched(iterable: Iterable, size: int):
+    """
+    Split an iterable into lists of at most `size` items
+
+    Parameters
+    ----------
+    iterable: Iterable
+        The items to batch. It is consumed lazily.
+    size: int
+        The maximum size of a batch
+    """
+    if size < 1:
+        raise ValueError('`size` should be at least 1.')
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if len(batch) == 0:
+            return
+        yield batch
+
+
+def bounded_map(executor, fn, iterable: Iterable, max_pending: int):
+    """
+    Like `executor.map` but only submits items as results are consumed, so
+    that at most `max_pending` tasks are in flight. Results are returned in
+    order.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -1,7 +1,5 @@
 from typing import List
 
-from PIL import Image, ImageDraw
-
 
 class Vertex:
 
@@ -14,12 +12,40 @@ class Vertex:
 
 
 class BoundingBox:
+    """
+    A rectangle. Bounding boxes are immutable, use `replace` to get a
+    modified box.
+    """
+
+    __slots__ = ('left', 'right', 'top', 'bottom')
 
     def __init__(self, left, right, top, bottom):
-        self.left = left
-        self.right = right
-        self.top = top
-        self.bottom = bottom
+        init = object.__setattr__
+        init(self, 'left', left)
+        init(self, 'right', right)
+        init(self, 'top', top)
+        init(self, 'bottom', bottom)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            f'{type(self).__name__} is immutable, use replace() instead.')
+
+    def _values(self):
+        return self.left, self.right, self.top, self.bottom
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._values() == self._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __reduce__(self):
+        return type(self), self._values()
+
+    def replace(self, **changes):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return BoundingBox(**values)
 
     @staticmethod
     def fromVertex(v: Vertex, height: float, width: float):
@@ -84,7 +110,7 @@ class BoundingBox:
         return f"{{{', '.join(f'{v}' for v in self.vertices)}}}"
 
 
-def draw_bounding_boxes(image: Image, annotations: List):
+def draw_bounding_boxes(image: 'Image', annotations: List):
     """
     Draw bounding boxes on an image
 
@@ -93,6 +119,7 @@ def draw_bounding_boxes(image: Image, annotations: List):
     :param color: The color of the bounding box
     :return: The annotated image
     """
+    from PIL import ImageDraw
     draw = ImageDraw.Draw(image)
     for annotation in annotations:
         box = annotation.target.selectors[0]
@@ -0,0 +1,97 @@
+"""Find the annotations that changed between two states of a task."""
+import hashlib
+import json
+from typing import Dict, Iterable
+
+from linalgo.annotate.models import Annotation
+from linalgo.annotate.serializers import AnnotationSerializer
+
+
+def content_hash(annotation: Annotation) -> bytes:
+    """
+    Hash the serialized content of an annotation, its id excluded
+
+    Two annotations have the same hash if and only if they would be sent to
+    the hub with the same values.
+    """
+    s = AnnotationSerializer._serialize(annotation)
+    del s['id']
+    data = json.dumps(s, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).digest()
+
+
+class AnnotationDiff:
+    """
+    The ids of the annotations added, removed and modified between two
+    snapshots.
+    """
+
+    def __init__(self, added: set, removed: set, modified: set):
+        self.added = added
+        self.removed = removed
+        self.modified = modified
+
+    def __repr__(self):
+        return (f'AnnotationDiff::+{len(self.added)} -{len(self.removed)} '
+                f'~{len(self.modified)}')
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.modified)
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+class Snapshot:
+    """
+    The content hashes of a set of annotations, by id.
+
+    A snapshot only keeps 16 bytes per annotation, so that the state of a
+    task can be recorded when it is loaded and compared with the edited
+    annotations later.
+
+    Parameters
+    ----------
+    annotations: Iterable[Annotation]
+        The annotations to record
+    """
+
+    def __init__(self, annotations: Iterable[Annotation] = ()):
+        self.hashes: Dict[str, bytes] = {
+            a.id: content_hash(a) for a in annotations}
+
+    def __repr__(self):
+        return f'Snapshot::{len(self)} annotations'
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def diff(self, other) -> AnnotationDiff:
+        """
+        Compare with a later state
+
+        Parameters
+        ----------
+        other: Union[Snapshot, Iterable[Annotation]]
+            The later state, e.g. the annotations of a task after edits
+
+        Returns
+        -------
+        AnnotationDiff
+            The changes from this snapshot to `other`
+        """
+        if not isinstance(other, Snapshot):
+            other = Snapshot(other)
+        before, after = self.hashes, other.hashes
+        added, modified = set(), set()
+        for annotation_id, h in after.items():
+            previous = before.get(annotation_id)
+            if previous is None:
+                added.add(annotation_id)
+            elif previous != h:
+                modified.add(annotation_id)
+        removed = {i for i in before if i not in after}
+        return AnnotationDiff(added, removed, modified)
+
+
+__all__ = ['AnnotationDiff', 'Snapshot', 'content_hash']
@@ -0,0 +1,290 @@
+"""Pre-annotate documents with dictionaries of entity surface forms."""
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from linalgo.annotate.batching import batched, bounded_map
+from linalgo.annotate.models import (
+    Annotation, Annotator, Document, Entity, Target, Task, XPathSelector
+)
+
+
+Match = Tuple[int, int, str]
+
+# transitions are stored in a single dict keyed by state and character, as
+# `state << _SHIFT | ord(char)`, which is much smaller than a dict per state
+_SHIFT = 21
+
+
+def fold(text: str) -> str:
+    """
+    Lowercase a text without changing its length, so that offsets in the
+    folded text are offsets in the original text
+    """
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+def _is_word(c: str) -> bool:
+    return c.isalnum() or c == '_'
+
+
+class Automaton:
+    """
+    An Aho-Corasick automaton: finds all the occurrences of many patterns in
+    a single pass over a text.
+
+    Add the patterns with `add`, then call `build` before searching.
+    """
+
+    def __init__(self):
+        self.delta = {}
+        self.outputs = {}
+        self.n_states = 1
+        self._parent = array('q', [0])
+        self._char = array('q', [0])
+        self._depth = array('q', [0])
+        self.fail = None
+        self.link = None
+
+    def __len__(self):
+        return len(self.outputs)
+
+    def add(self, pattern: str, value):
+        """Add a pattern. `value` is returned with each of its matches."""
+        if len(pattern) == 0:
+            raise ValueError('Patterns should not be empty.')
+        if self.fail is not None:
+            raise RuntimeError('Patterns cannot be added once built.')
+        delta, state = self.delta, 0
+        for c in pattern:
+            key = state << _SHIFT | ord(c)
+            child = delta.get(key)
+            if child is None:
+                child = self.n_states
+                self.n_states += 1
+                delta[key] = child
+                self._parent.append(state)
+                self._char.append(ord(c))
+                self._depth.append(self._depth[state] + 1)
+            state = child
+        if state in self.outputs:
+            self.outputs[state][1].append(value)
+        else:
+            self.outputs[state] = (len(pattern), [value])
+
+    def build(self) -> 'Automaton':
+        """Compute the failure links."""
+        delta, outputs = self.delta, self.outputs
+        parent, char = self._parent, self._char
+        fail = array('q', bytes(8 * self.n_states))
+        link = array('q', bytes(8 * self.n_states))
+        depth = self._depth
+        # states are processed by increasing depth, so that the failure
+        # links of their parents are known
+        for state in sorted(range(1, self.n_states), key=depth.__getitem__):
+            p, o = parent[state], char[state]
+            if p == 0:
+                continue
+            f = fail[p]
+            target = delta.get(f << _SHIFT | o)
+            while target is None and f != 0:
+                f = fail[f]
+                target = delta.get(f << _SHIFT | o)
+            f = target or 0
+            fail[state] = f
+            link[state] = f if f in outputs else link[f]
+        self.fail, self.link = fail, link
+        self._parent = self._char = self._depth = None
+        return self
+
+    def iter(self, text: str):
+        """
+        Iterate over the occurrences of the patterns in a text
+
+        Yields
+        ------
+        Tuple[int, int, List]
+            The start and end offsets of the occurrence and the values of
+            the pattern, by increasing end offset
+        """
+        delta, outputs, fail, link = \
+            self.delta, self.outputs, self.fail, self.link
+        state = 0
+        for i, c in enumerate(text):
+            o = ord(c)
+            target = delta.get(state << _SHIFT | o)
+            while target is None and state != 0:
+                state = fail[state]
+                target = delta.get(state << _SHIFT | o)
+            state = target or 0
+            match = state if state in outputs else link[state]
+            while match != 0:
+                length, values = outputs[match]
+                yield i + 1 - length, i + 1, values
+                match = link[match]
+
+
+def _longest(matches: List[Match]) -> List[Match]:
+    # leftmost-longest matches that do not overlap; a span matching several
+    # entities is kept for each of them
+    matches.sort(key=lambda m: (m[0], -m[1]))
+    kept, end = [], -1
+    for m in matches:
+        if m[0] >= end:
+            kept.append(m)
+            end = m[1]
+        elif kept and m[:2] == kept[-1][:2]:
+            kept.append(m)
+    return kept
+
+
+class Gazetteer:
+    """
+    Find the surface forms of entities in documents.
+
+    All the terms are compiled into one `Automaton`, so that each document
+    is scanned once whatever the number of terms.
+
+    Parameters
+    ----------
+    terms: Dict[Entity, Iterable[str]]
+        The surface forms of each entity. Entities can also be given by id.
+    case_sensitive: bool
+        Whether terms only match with the same case
+    word_boundaries: bool
+        Whether terms only match whole words, i.e. are not preceded or
+        followed by a letter, a digit or an underscore
+    overlapping: bool
+        Whether to return all the matches. Otherwise only the leftmost
+        longest non overlapping matches are returned.
+    container: str
+        The container of the `XPathSelector` of annotations
+    """
+
+    def __init__(self, terms: Dict[Entity, Iterable[str]],
+                 case_sensitive=False, word_boundaries=True,
+                 overlapping=False, container='/p[1]'):
+        self.case_sensitive = case_sensitive
+        self.word_boundaries = word_boundaries
+        self.overlapping = overlapping
+        self.container = container
+        self.automaton = Automaton()
+        for entity, surface_forms in terms.items():
+            entity_id = getattr(entity, 'id', entity)
+            for term in set(surface_forms):
+                term = term if case_sensitive else fold(term)
+                if len(term) > 0:
+                    self.automaton.add(term, entity_id)
+        self.automaton.build()
+
+    def __repr__(self):
+        return f'Gazetteer::{len(self.automaton)} terms'
+
+    def find(self, text: str) -> List[Match]:
+        """
+        Returns
+        -------
+        List[Tuple[int, int, str]]
+            The start and end offsets and the entity id of each match, by
+            increasing start offset
+        """
+        if text is None:
+            return []
+        scanned = text if self.case_sensitive else fold(text)
+        matches = []
+        for start, end, entity_ids in self.automaton.iter(scanned):
+            if self.word_boundaries and (
+                    (start > 0 and _is_word(text[start - 1])) or
+                    (end < len(text) and _is_word(text[end]))):
+                continue
+            matches.extend((start, end, e) for e in entity_ids)
+        if self.overlapping:
+            return sorted(matches)
+        return _longest(matches)
+
+    def find_many(self, texts: Iterable[str]) -> List[List[Match]]:
+        return [self.find(text) for text in texts]
+
+    def annotate(self, document: Document, annotator: Annotator = None,
+                 task: Task = None) -> List[Annotation]:
+        return self.annotate_many([document], annotator, task)
+
+    def annotate_many(self, documents: Iterable[Document],
+                      annotator: Annotator = None, task: Task = None,
+                      batch_size=1000, n_jobs=None) -> List[Annotation]:
+        """
+        Create an annotation for each match in the documents
+
+        Parameters
+        ----------
+        documents: Iterable[Document]
+            The documents to annotate. They are consumed lazily.
+        annotator: Annotator
+            The author of the annotations
+        task: Task
+            The task of the annotations. They are added to
+            `task.annotations` if provided.
+        batch_size: int
+            Number of documents sent to a worker at once
+        n_jobs: int
+            Number of worker processes. Documents are scanned in the
+            calling process if None.
+
+        Returns
+        -------
+        List[Annotation]
+            The annotations, in the order of `documents`
+        """
+        batches = batched(documents, batch_size)
+        if n_jobs is None:
+            return self._add_annotations(
+                ((b, self.find_many(d.content for d in b)) for b in batches),
+                annotator, task)
+        pending = deque()
+
+        def texts():
+            for batch in batches:
+                pending.append(batch)
+                yield [d.content for d in batch]
+
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init,
+                                 initargs=(self,)) as executor:
+            matches = bounded_map(executor, _find_many, texts(), 2 * n_jobs)
+            return self._add_annotations(
+                ((pending.popleft(), m) for m in matches), annotator, task)
+
+    def _add_annotations(self, found, annotator, task):
+        annotations = []
+        container = self.container
+        for batch, matches in found:
+            created = datetime.now()
+            for document, spans in zip(batch, matches):
+                for start, end, entity_id in spans:
+                    selector = XPathSelector(container, container, start, end)
+                    annotations.append(Annotation(
+                        entity=entity_id, document=document,
+                        annotator=annotator, task=task, created=created,
+                        target=Target(source=document, selector=[selector])))
+        if task is not None:
+            task.annotations.extend(annotations)
+        return annotations
+
+
+_gazetteer = None
+
+
+def _init(gazetteer):
+    global _gazetteer
+    _gazetteer = gazetteer
+
+
+def _find_many(texts):
+    return _gazetteer.find_many(texts)
+
+
+__all__ = ['Automaton', 'Gazetteer', 'fold']
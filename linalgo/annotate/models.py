@@ -1,10 +1,14 @@
-import copy
+from collections import deque
+from concurrent import futures
 from enum import Enum
 from datetime import datetime
+from functools import partial
 from typing import Dict, Iterable, List, Union
 import json
+import threading
 import uuid
 
+from linalgo.annotate.batching import batched, bounded_map
 from linalgo.annotate.bbox import BoundingBox, Vertex
 
 
@@ -12,13 +16,46 @@ Selector = Union[BoundingBox]
 
 
 class XPathSelector:
+    """
+    A text span. Selectors are immutable so that copies of a target can
+    share them, use `replace` to get a modified selector.
+    """
+
+    __slots__ = ('start_container', 'end_container', 'start_offset',
+                 'end_offset')
 
     def __init__(self, start_container: str, end_container: str,
                  start_offset: int, end_offset: int):
-        self.start_container = start_container
-        self.end_container = end_container
-        self.start_offset = start_offset
-        self.end_offset = end_offset
+        init = object.__setattr__
+        init(self, 'start_container', start_container)
+        init(self, 'end_container', end_container)
+        init(self, 'start_offset', start_offset)
+        init(self, 'end_offset', end_offset)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            f'{type(self).__name__} is immutable, use replace() instead.')
+
+    def _values(self):
+        return (self.start_container, self.end_container, self.start_offset,
+                self.end_offset)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._values() == self._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __reduce__(self):
+        return type(self), self._values()
+
+    def __repr__(self):
+        return f'XPathSelector::{self.start_offset}:{self.end_offset}'
+
+    def replace(self, **changes):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return XPathSelector(**values)
 
 
 class SelectorFactory:
@@ -39,7 +76,7 @@ class SelectorFactory:
                   start_offset=d['startOffset'],
                   end_offset=d['endOffset']
             )
-        elif type(d) == XPathSelector:
+        elif type(d) in (XPathSelector, BoundingBox):
             return d
         raise Exception(f"No factory found for {type(d)}")
 
@@ -48,6 +85,8 @@ class TargetFactory:
 
     @staticmethod
     def factory(data):
+        if data is None:
+            return None
         if str(type(data)) == str(Target):
             return data
         elif type(data) == str:
@@ -68,37 +107,135 @@ class TargetFactory:
 
 
 class Target(TargetFactory):
+    """
+    The part of a document an annotation refers to.
+
+    `selector` is a tuple of immutable selectors: copies of a target share
+    it until one of them is given new selectors, e.g. with
+    `replace_selector`.
+    """
 
     def __init__(self, source: 'Document' = None,
                  selector: Iterable[Selector] = []):
         self.source = source
-        self.selector = [SelectorFactory.factory(s) for s in selector]
+        self.selector = selector
+
+    @property
+    def selector(self):
+        return self._selector
+
+    @selector.setter
+    def selector(self, selector: Iterable[Selector]):
+        self._selector = tuple(SelectorFactory.factory(s) for s in selector)
 
     def copy(self):
-        return Target(
-            source=self.source,
-            selector=[copy.deepcopy(s) for s in self.selector])
+        target = Target.__new__(Target)
+        target.source = self.source
+        target._selector = self._selector
+        return target
+
+    def replace_selector(self, index: int, **changes):
+        """Replace a selector of this target by a modified copy."""
+        selector = list(self._selector)
+        selector[index] = selector[index].replace(**changes)
+        self._selector = tuple(selector)
+        return selector[index]
+
+
+class Registry(dict):
+    """
+    The objects of a model class by id.
+
+    Lookups are plain dict lookups. Creations and field merges hold one of
+    `stripes` locks, chosen by id, so that threads creating or updating
+    different objects rarely wait for each other.
+    """
+
+    def __init__(self, stripes=64):
+        super().__init__()
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def lock(self, unique_id) -> threading.Lock:
+        return self._locks[hash(unique_id) % len(self._locks)]
+
+    def get_or_create(self, unique_id, create):
+        """
+        Return the object registered under `unique_id`, or register the
+        object returned by `create()`. Only one object is ever registered
+        for an id, even if several threads ask for it at the same time.
+        """
+        obj = self.get(unique_id)
+        if obj is not None:
+            return obj
+        with self.lock(unique_id):
+            obj = self.get(unique_id)
+            if obj is None:
+                obj = create()
+                self[unique_id] = obj
+            return obj
+
+
+_registry_lock = threading.Lock()
 
 
 class RegistryMixin:
 
     def __new__(cls, *args, **kwargs):
-        unique_id = kwargs.get('unique_id', str(uuid.uuid4()))
-        unique_id = kwargs.get('id', unique_id)
-        if not hasattr(cls, '_registry'):
-            cls._registry = dict()
-        if unique_id in cls._registry:
-            return cls._registry[unique_id]
+        if 'id' in kwargs:
+            unique_id = kwargs['id']
+        elif 'unique_id' in kwargs:
+            unique_id = kwargs['unique_id']
         else:
-            obj = super().__new__(cls)
+            unique_id = str(uuid.uuid4())
+        registry = cls.registry()
+        obj = registry.get(unique_id)
+        if obj is not None:
+            return obj
+
+        def create():
+            obj = super(RegistryMixin, cls).__new__(cls)
             obj.id = unique_id
-            cls._registry[unique_id] = obj
             return obj
+        return registry.get_or_create(unique_id, create)
+
+    @classmethod
+    def registry(cls) -> Registry:
+        try:
+            return cls._registry
+        except AttributeError:
+            with _registry_lock:
+                if not hasattr(cls, '_registry'):
+                    cls._registry = Registry()
+            return cls._registry
 
     def register(self):
         self._registry[self.id] = self
 
+    def __reduce__(self):
+        # unpickled objects are looked up in the registry by id, so that
+        # they are neither duplicated nor given a new id
+        return _registered, (type(self), self.id), self.__dict__
+
+    def __setstate__(self, state):
+        # unpickled values are merged like `setattr` does, so that changes
+        # made in another process are kept. Sets, e.g. the annotations of a
+        # document, are extended, as the other process may hold only some
+        # of their items.
+        with self._registry.lock(self.id):
+            for name, value in state.items():
+                current = getattr(self, name, None)
+                if isinstance(current, set) and isinstance(value, set):
+                    current.update(value)
+                else:
+                    self._merge(name, value)
+
     def setattr(self, name, value):
+        # the check and the update are atomic, so that concurrent merges
+        # of the same object do not override each other's values
+        with self._registry.lock(self.id):
+            return self._merge(name, value)
+
+    def _merge(self, name, value):
         if not hasattr(self, name):
             self.__setattr__(name, value)
             return True
@@ -113,6 +250,10 @@ class RegistryMixin:
         return False
 
 
+def _registered(cls, unique_id):
+    return RegistryMixin.__new__(cls, unique_id=unique_id)
+
+
 class FromIdFactoryMixin:
 
     @classmethod
@@ -155,6 +296,23 @@ class AnnotationFactory:
             target=row.target
         )
 
+    @staticmethod
+    def from_arrow(batch):
+        """Create the annotations of a `pyarrow.RecordBatch` of BQ rows."""
+        columns = batch.to_pydict()
+        return [
+            Annotation(
+                unique_id=unique_id, entity=entity, document=document,
+                body=body, annotator=annotator, task=task, created=created,
+                target=target
+            )
+            for unique_id, entity, document, body, annotator, task, created,
+            target in zip(
+                columns['id'], columns['entity_id'], columns['document_id'],
+                columns['body'], columns['annotator_id'], columns['task_id'],
+                columns['created'], columns['target'])
+        ]
+
 
 class Annotation(RegistryMixin, FromIdFactoryMixin, AnnotationFactory):
     """
@@ -201,10 +359,43 @@ class Annotation(RegistryMixin, FromIdFactoryMixin, AnnotationFactory):
         return self.document.content[start:end]
 
     def copy(self):
-        target = self.target.copy()
-        return Annotation(unique_id=str(uuid.uuid4()), entity=self.entity,
-                document=self.document, task=self.task, target=target,
-                body=self.body, annotator=self.annotator,  score=self.score)
+        return Annotation.copy_many([self])[0]
+
+    @staticmethod
+    def copy_many(annotations: Iterable['Annotation'], auto_track=True):
+        """
+        Copy annotations with new ids
+
+        Copies share the entity, document, annotator, task and selectors of
+        the original annotations, and are registered without going through
+        the factories.
+
+        Parameters
+        ----------
+        annotations: Iterable[Annotation]
+            The annotations to copy
+        auto_track: bool
+            Whether to add the copies to the annotations of their document
+
+        Returns
+        -------
+        List[Annotation]
+        """
+        registry = Annotation.registry()
+        created = datetime.now()
+        copies = []
+        for annotation in annotations:
+            c = object.__new__(Annotation)
+            c.__dict__.update(annotation.__dict__)
+            c.id = str(uuid.uuid4())
+            c.created = created
+            if annotation.target is not None:
+                c.target = annotation.target.copy()
+            registry[c.id] = c
+            if auto_track:
+                c.document.annotations.add(c)
+            copies.append(c)
+        return copies
 
 
 class AnnotatorFactory:
@@ -240,28 +431,103 @@ class Annotator(RegistryMixin, FromIdFactoryMixin, AnnotatorFactory):
     def assign_task(self, task):
         self.task = task
 
+    def _get_annotations(self, documents, scores):
+        import numpy as np
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        positive = scores >= self.threshold
+        annotations = []
+        for document, score, is_positive in zip(documents, scores, positive):
+            annotation = Annotation(
+                entity_id=self.entity_id if is_positive else '1',  # Viewed
+                score=float(score),
+                annotator=self,
+                task_id=self.task,
+                document_id=document,
+                target=Target(source=document)
+            )
+            annotations.append(annotation)
+        return annotations
+
     def _get_annotation(self, document):
-        score = self.model.decision_function([document.content])[0]
-        if score >= self.threshold:
-            label = self.entoty_id
-        else:
-            label = 1  # Viewed
-        annotation = Annotation(
-            entity_id=label,
-            score=score,
-            text=document.content,
-            annotator=self.id,
-            task_id=self.task.id,
-            document_id=document.id
-        )
-        return annotation
+        return self.annotate_many([document])[0]
 
     def annotate(self, document):
-        annotation = self._get_annotation(document)
-        if annotation is not None:
-            self.task.annotations.append(annotation)
-            document.annotations.add(annotation)
-        return annotation
+        return self._get_annotation(document)
+
+    def annotate_many(self, documents: Iterable['Document'], batch_size=1000,
+                      workers=None, backend='thread'):
+        """
+        Score documents in batches and create their annotations
+
+        Parameters
+        ----------
+        documents: Iterable[Document]
+            The documents to annotate. They are consumed lazily.
+        batch_size: int
+            Number of documents passed to `model.decision_function` at once
+        workers: int
+            Number of batches scored concurrently. Batches are scored in the
+            calling thread if None.
+        backend: str, {'thread', 'process'}
+            Use threads for models that release the GIL, processes
+            otherwise (the model must then be picklable).
+
+        Returns
+        -------
+        List[Annotation]
+            The annotations, in the order of `documents`
+        """
+        if backend not in ('thread', 'process'):
+            raise NotImplementedError(f'{backend} is not a valid backend.')
+        batches = batched(documents, batch_size)
+        if workers is None:
+            return self._add_annotations(
+                (b, _score(self.model, [d.content for d in b]))
+                for b in batches)
+        pending = deque()
+
+        def texts():
+            for batch in batches:
+                pending.append(batch)
+                yield [d.content for d in batch]
+
+        if backend == 'thread':
+            pool = futures.ThreadPoolExecutor(max_workers=workers)
+            score = partial(_score, self.model)
+        else:
+            # the model is sent once to each worker rather than with every
+            # batch
+            pool = futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(self.model,))
+            score = _score_in_worker
+        with pool:
+            scores = bounded_map(pool, score, texts(), 2 * workers)
+            return self._add_annotations(
+                (pending.popleft(), s) for s in scores)
+
+    def _add_annotations(self, scored):
+        annotations = []
+        for batch, scores in scored:
+            annotations.extend(self._get_annotations(batch, scores))
+        self.task.annotations.extend(annotations)
+        return annotations
+
+
+def _score(model, texts):
+    return model.decision_function(texts)
+
+
+_worker_model = None
+
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _score_in_worker(texts):
+    return _score(_worker_model, texts)
 
 
 class CorpusFactory:
@@ -310,6 +576,18 @@ class DocumentFactory:
             corpus=row.corpus_id
         )
 
+    @staticmethod
+    def from_arrow(batch):
+        """Create the documents of a `pyarrow.RecordBatch` of BQ rows."""
+        columns = batch.to_pydict()
+        return [
+            Document(unique_id=unique_id, uri=uri, content=content,
+                     corpus=corpus)
+            for unique_id, uri, content, corpus in zip(
+                columns['id'], columns['uri'], columns['content'],
+                columns['corpus_id'])
+        ]
+
 
 class Document(RegistryMixin, FromIdFactoryMixin, DocumentFactory):
     """
@@ -0,0 +1,209 @@
+"""Measure the number, size and construction cost of model objects."""
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+import sys
+import threading
+import time
+from typing import Dict
+
+from linalgo.annotate import models
+from linalgo.annotate.models import RegistryMixin
+
+
+FACTORY_METHODS = ('from_dict', 'from_bq_row', 'from_arrow', 'factory',
+                   '__init__')
+
+
+def _registry_classes():
+    classes, stack = [], [RegistryMixin]
+    while stack:
+        cls = stack.pop()
+        for sub in cls.__subclasses__():
+            if sub not in classes:
+                classes.append(sub)
+                stack.append(sub)
+    return classes
+
+
+def registry_counts() -> Dict[str, int]:
+    """Number of objects held by the registry of each model class."""
+    return {cls.__name__: len(cls.__dict__['_registry'])
+            for cls in _registry_classes() if '_registry' in cls.__dict__}
+
+
+def deep_sizeof(obj, seen=None) -> int:
+    """
+    Estimate the memory used by an object and what it owns
+
+    Other registered model objects are referenced, not owned: their size
+    is not included.
+    """
+    seen = set() if seen is None else seen
+    root, stack, size = obj, [obj], 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        if isinstance(o, RegistryMixin) and o is not root:
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(o, '__dict__') and not isinstance(o, type):
+            stack.append(o.__dict__)
+    return size
+
+
+def registry_sizes(sample: int = None) -> Dict[str, Dict]:
+    """
+    Count the objects of each registry and estimate their deep size
+
+    Parameters
+    ----------
+    sample: int
+        If provided, the size is extrapolated from the first `sample`
+        objects of each registry
+
+    Returns
+    -------
+    Dict[str, Dict]
+        The `count` and estimated `bytes` of each model class
+    """
+    stats = {}
+    for cls in _registry_classes():
+        registry = cls.__dict__.get('_registry')
+        if registry is None:
+            continue
+        objects = list(registry.values())
+        measured = objects if sample is None else objects[:sample]
+        size = sum(deep_sizeof(o) for o in measured)
+        if len(measured) > 0:
+            size = size * len(objects) / len(measured)
+        stats[cls.__name__] = {'count': len(objects), 'bytes': int(size)}
+    return stats
+
+
+class ModelProfile:
+    """
+    Calls to the model factories recorded by `profile`.
+
+    `calls` maps e.g. `Annotation.from_dict` to its number of calls and
+    cumulative time in seconds, nested calls included. `setattr` maps
+    e.g. `Annotation.target` to the number of times the attribute was
+    `set` for the first time, `overridden` with a new value, or `kept`
+    because the new value was empty.
+    """
+
+    def __init__(self):
+        self.calls = defaultdict(lambda: [0, 0.])
+        self.setattr = defaultdict(lambda: defaultdict(int))
+        self.registry_before = registry_counts()
+        self.registry_after = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'ModelProfile::{sum(c for c, _ in self.calls.values())} calls'
+
+    def created(self) -> Dict[str, int]:
+        """Number of objects added to each registry while profiling."""
+        after = self.registry_after or registry_counts()
+        return {name: n - self.registry_before.get(name, 0)
+                for name, n in after.items()
+                if n != self.registry_before.get(name, 0)}
+
+    def summary(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: {'calls': n, 'seconds': seconds,
+                           'mean': seconds / n if n else 0.}
+                    for name, (n, seconds) in sorted(self.calls.items())}
+
+    def _record(self, name, seconds):
+        with self._lock:
+            entry = self.calls[name]
+            entry[0] += 1
+            entry[1] += seconds
+
+    def _record_setattr(self, name, outcome):
+        with self._lock:
+            self.setattr[name][outcome] += 1
+
+
+def _timed(fn, name, profile):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile._record(name, time.perf_counter() - start)
+    return wrapper
+
+
+def _counted_setattr(fn, profile):
+    @wraps(fn)
+    def setattr(self, name, value):
+        existed = getattr(self, name, None) is not None
+        changed = fn(self, name, value)
+        outcome = 'kept' if not changed else \
+            'overridden' if existed else 'set'
+        profile._record_setattr(f'{type(self).__name__}.{name}', outcome)
+        return changed
+    return setattr
+
+
+_active = threading.Lock()
+
+
+@contextmanager
+def profile():
+    """
+    Record the calls to the model factories and to `setattr`
+
+    The methods are only wrapped inside the `with` block, so profiling
+    costs nothing when it is off. Profiles cannot be nested.
+
+    Examples
+    --------
+    >>> with profile() as p:
+    ...     task = client.get_task(task_id)
+    >>> p.summary()['Annotation.from_dict']
+    """
+    if not _active.acquire(blocking=False):
+        raise RuntimeError('A model profile is already active.')
+    p = ModelProfile()
+    patched = []
+    try:
+        for cls in vars(models).values():
+            if not isinstance(cls, type) or cls.__module__ != models.__name__:
+                continue
+            for name in FACTORY_METHODS:
+                if name not in cls.__dict__:
+                    continue
+                original = cls.__dict__[name]
+                label = f'{cls.__name__}.{name}'
+                if isinstance(original, staticmethod):
+                    wrapped = staticmethod(_timed(original.__func__, label, p))
+                elif isinstance(original, classmethod):
+                    wrapped = classmethod(_timed(original.__func__, label, p))
+                else:
+                    wrapped = _timed(original, label, p)
+                patched.append((cls, name, original))
+                setattr(cls, name, wrapped)
+        original = RegistryMixin.__dict__['setattr']
+        patched.append((RegistryMixin, 'setattr', original))
+        RegistryMixin.setattr = _counted_setattr(original, p)
+        yield p
+    finally:
+        for cls, name, original in reversed(patched):
+            setattr(cls, name, original)
+        p.registry_after = registry_counts()
+        _active.release()
+
+
+__all__ = ['ModelProfile', 'deep_sizeof', 'profile', 'registry_counts',
+           'registry_sizes']
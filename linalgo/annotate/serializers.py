@@ -19,7 +19,8 @@ class BoundingBoxSerializer(Serializer):
     @staticmethod
     def _serialize(instance):
         s = {
-            'vertex': instance.vertex,
+            'x': instance.left,
+            'y': instance.top,
             'height': instance.height,
             'width': instance.width
         }
@@ -54,7 +55,7 @@ class TargetSerializer(Serializer):
     @staticmethod
     def _serialize(target):
         s = {
-            'source': target.source.id,
+            'source': getattr(target.source, 'id', None),
             'selector': []
         }
         for selector in target.selector:
@@ -0,0 +1,221 @@
+"""Map-reduce over the documents of a task in worker processes."""
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from typing import Callable, Iterator, List
+import zlib
+
+from linalgo.annotate.batching import bounded_map
+from linalgo.annotate.models import (
+    Annotation, Annotator, Document, Entity, Target, Task
+)
+
+
+def shard_of(document_id, n_shards: int) -> int:
+    """
+    The shard of a document
+
+    Unlike `hash`, the result does not depend on the process, so that a
+    document always lands in the same shard.
+    """
+    return zlib.crc32(str(document_id).encode('utf-8')) % n_shards
+
+
+def _task_view(task: Task, documents, annotations) -> Task:
+    # an unregistered task, so that the original task is left untouched
+    view = object.__new__(Task)
+    view.__dict__.update(task.__dict__)
+    view.documents = documents
+    view.annotations = annotations
+    return view
+
+
+def _id(obj):
+    return None if obj is None else obj.id
+
+
+def _target(target: Target):
+    if target is None:
+        return None
+    return _id(target.source), target.selector
+
+
+class TaskShard:
+    """
+    The documents of a task that hash to the same shard, with their
+    annotations.
+
+    Models are stored as tuples of ids and values, so that a shard pickles
+    quickly and without the rest of the object graph.
+
+    Parameters
+    ----------
+    index: int
+        The shard number
+    n_shards: int
+        The total number of shards
+    task: tuple
+        The task id, name and description
+    entities: List[tuple]
+        (id, name, color) of the task entities
+    annotators: List[tuple]
+        (id, name) of the task annotators
+    documents: List[tuple]
+        (id, uri, content) of the documents in the shard
+    annotations: List[tuple]
+        (id, entity id, annotator id, document id, body, score, created,
+        target) of their annotations
+    """
+
+    def __init__(self, index: int, n_shards: int, task: tuple,
+                 entities: List[tuple], annotators: List[tuple],
+                 documents: List[tuple], annotations: List[tuple]):
+        self.index = index
+        self.n_shards = n_shards
+        self.task = task
+        self.entities = entities
+        self.annotators = annotators
+        self.documents = documents
+        self.annotations = annotations
+
+    def __repr__(self):
+        return f'TaskShard::{self.index}/{self.n_shards}'
+
+    def __len__(self):
+        return len(self.documents)
+
+    @classmethod
+    def from_models(cls, task: Task, index: int, n_shards: int,
+                    documents: List[Document],
+                    annotations: List[Annotation]) -> 'TaskShard':
+        return cls(
+            index=index,
+            n_shards=n_shards,
+            task=(task.id, task.name, task.description),
+            entities=[(e.id, e.name, e.color) for e in task.entities],
+            annotators=[(a.id, a.name) for a in task.annotators],
+            documents=[(d.id, d.uri, d.content) for d in documents],
+            annotations=[
+                (a.id, _id(a.entity), _id(a.annotator), _id(a.document),
+                 a.body, a.score, a.created, _target(a.target))
+                for a in annotations],
+        )
+
+    def to_task(self, register=False) -> Task:
+        """
+        Rebuild the models of the shard
+
+        Models are looked up in the registry by id, so that a process
+        holding the task already, e.g. a forked worker, reuses its objects.
+
+        Parameters
+        ----------
+        register: bool
+            Whether the shard task replaces the task in the registry, so
+            that annotations refer to it and pickle without the rest of the
+            task. Worker processes do so.
+
+        Returns
+        -------
+        Task
+            A task holding the documents and annotations of the shard
+        """
+        task_id, name, description = self.task
+        task = Task(unique_id=task_id, name=name, description=description)
+        task = _task_view(task, [], [])
+        if register:
+            task.register()
+        task.entities = [Entity(unique_id=i, name=n, color=c)
+                         for i, n, c in self.entities]
+        task.annotators = [Annotator(unique_id=i, name=n)
+                           for i, n in self.annotators]
+        task.documents = [Document(unique_id=i, uri=u, content=c)
+                          for i, u, c in self.documents]
+        task.annotations = [
+            Annotation(
+                unique_id=i, entity=entity, annotator=annotator,
+                document=document, task=task_id, body=body, score=score,
+                created=created,
+                target=None if target is None else Target(
+                    source=Document.factory(target[0]), selector=target[1]))
+            for (i, entity, annotator, document, body, score, created, target)
+            in self.annotations]
+        return task
+
+
+def _partition(task: Task, n_shards: int):
+    documents = [[] for _ in range(n_shards)]
+    annotations = [[] for _ in range(n_shards)]
+    for document in task.documents:
+        documents[shard_of(document.id, n_shards)].append(document)
+    for annotation in task.annotations:
+        document_id = _id(annotation.document)
+        annotations[shard_of(document_id, n_shards)].append(annotation)
+    return documents, annotations
+
+
+def split(task: Task, n_shards: int) -> Iterator[TaskShard]:
+    """
+    Split a task into `n_shards` shards by hashing the document ids
+
+    Annotations go to the shard of their document. Shards are built lazily.
+    """
+    documents, annotations = _partition(task, n_shards)
+    for i in range(n_shards):
+        yield TaskShard.from_models(
+            task, i, n_shards, documents[i], annotations[i])
+
+
+def _apply(payload):
+    fn, shard = payload
+    task = shard.to_task(register=True)
+    result = fn(task)
+    # the shard task unpickles as the task of the calling process, which
+    # must keep all its documents and annotations
+    task.documents, task.annotations = [], []
+    return result
+
+
+def map_shards(task: Task, fn: Callable[[Task], object], n_shards=None,
+               n_jobs=None, merge: Callable = None):
+    """
+    Apply a function to the documents of a task, shard by shard
+
+    Parameters
+    ----------
+    task: Task
+        The task to process
+    fn: Callable[[Task], object]
+        Called with a task holding the documents and annotations of one
+        shard. It must be picklable, e.g. a module level function, when
+        `n_jobs` is provided.
+    n_shards: int
+        The number of shards, 4 per job by default
+    n_jobs: int
+        Number of worker processes. Shards are processed in the calling
+        process, without copying the models, if None.
+    merge: Callable
+        Combines two results, e.g. `operator.add`. Results are merged in
+        shard order.
+
+    Returns
+    -------
+    The merged result if `merge` is provided, otherwise the list of results
+    in shard order.
+    """
+    if n_shards is None:
+        n_shards = 4 * (n_jobs or 1)
+    if n_jobs is None:
+        documents, annotations = _partition(task, n_shards)
+        results = [fn(_task_view(task, documents[i], annotations[i]))
+                   for i in range(n_shards)]
+    else:
+        payloads = ((fn, shard) for shard in split(task, n_shards))
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(
+                bounded_map(executor, _apply, payloads, 2 * n_jobs))
+    if merge is None:
+        return results
+    return reduce(merge, results)
+
+
+__all__ = ['TaskShard', 'map_shards', 'shard_of', 'split']
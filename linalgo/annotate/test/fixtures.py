@@ -29,4 +29,55 @@ DOCUMENTS = [
      "content": "skillful",
      "corpus": "788658a1-1f4f-4e40-86f7-7d65cde29438"
  }
-]
\ No newline at end of file
+]
+
+SPAN_ENTITIES = [
+    {"id": "0d4a4a5e-0b5c-4f0e-9d4b-3b8f3c1f0a01", "title": "PER",
+     "color": "ff0000"},
+    {"id": "0d4a4a5e-0b5c-4f0e-9d4b-3b8f3c1f0a02", "title": "LOC",
+     "color": "00ff00"},
+]
+
+SPAN_DOCUMENT = {
+    "id": "5a0c6c1e-5d0e-4a59-8f3c-6d2b7e0f4b10",
+    "uri": "ner-1",
+    "content": "John Smith lives in New York .",
+    "corpus": "5a0c6c1e-5d0e-4a59-8f3c-6d2b7e0f4b11"
+}
+
+
+def _span(annotation_id, annotator, entity, start, end, created):
+    return {
+        "id": annotation_id,
+        "annotator": annotator,
+        "target": {
+            "source": SPAN_DOCUMENT["id"],
+            "selector": [{
+                "startContainer": "/p[1]",
+                "endContainer": "/p[1]",
+                "startOffset": start,
+                "endOffset": end
+            }]
+        },
+        "document": SPAN_DOCUMENT["id"],
+        "body": "",
+        "created": created,
+        "entity": entity,
+        "task": "5a0c6c1e-5d0e-4a59-8f3c-6d2b7e0f4b12"
+    }
+
+
+SPAN_ANNOTATIONS = [
+    # annotator A: "John Smith" PER, "New York ." LOC
+    _span("7b6f2d4e-1c1a-4c55-9a53-8a0c1e7d2a01", "annotator-a",
+          SPAN_ENTITIES[0]["id"], 0, 10, "2020-08-17T21:38:07.000000"),
+    _span("7b6f2d4e-1c1a-4c55-9a53-8a0c1e7d2a02", "annotator-a",
+          SPAN_ENTITIES[1]["id"], 20, 30, "2020-08-17T21:38:08.000000"),
+    # annotator B: "John" PER, "York" PER, later corrected to LOC
+    _span("7b6f2d4e-1c1a-4c55-9a53-8a0c1e7d2a03", "annotator-b",
+          SPAN_ENTITIES[0]["id"], 0, 4, "2020-08-17T21:38:09.000000"),
+    _span("7b6f2d4e-1c1a-4c55-9a53-8a0c1e7d2a04", "annotator-b",
+          SPAN_ENTITIES[1]["id"], 24, 28, "2020-08-17T21:38:11.000000"),
+    _span("7b6f2d4e-1c1a-4c55-9a53-8a0c1e7d2a05", "annotator-b",
+          SPAN_ENTITIES[0]["id"], 24, 28, "2020-08-17T21:38:10.000000"),
+]
@@ -0,0 +1,129 @@
+import unittest
+
+import numpy as np
+
+from linalgo.annotate.agreement import (
+    AgreementCounts, ConfusionMatrix, agreement
+)
+from linalgo.annotate.alignment import align
+from linalgo.annotate.models import Annotation, Document, Entity, Task
+from .fixtures import SPAN_ANNOTATIONS, SPAN_DOCUMENT, SPAN_ENTITIES
+
+
+class TestAgreement(unittest.TestCase):
+
+    def setUp(self):
+        self.entities = [Entity.from_dict(e) for e in SPAN_ENTITIES]
+        self.task = Task(
+            entities=self.entities,
+            documents=[Document.from_dict(SPAN_DOCUMENT)],
+            annotations=[Annotation.from_dict(a) for a in SPAN_ANNOTATIONS]
+        )
+
+    def test_cohen_kappa(self):
+        # a: PER PER O O LOC LOC O
+        # b: PER O   O O O   LOC O
+        ag = agreement(self.task)
+        self.assertEqual(ag.annotators, ['annotator-a', 'annotator-b'])
+        po, pe = 5 / 7, (2 * 1 + 2 * 1 + 3 * 5) / 49
+        self.assertAlmostEqual(ag.cohen_kappa()[0, 1], (po - pe) / (1 - pe))
+        self.assertTrue(np.isnan(ag.cohen_kappa()[0, 0]))
+        po, pe = 6 / 7, (2 * 1 + 5 * 6) / 49
+        self.assertAlmostEqual(ag.cohen_kappa(self.entities[1])[0, 1],
+                               (po - pe) / (1 - pe))
+
+    def test_counts_are_additive(self):
+        rng = np.random.default_rng(0)
+        docs = [(rng.integers(0, 3, (20, 3)), np.array([0, 2, 3]))
+                for _ in range(4)]
+        full = AgreementCounts(4, 3)
+        for tags, columns in docs:
+            full.update(tags, columns)
+        partial = AgreementCounts(4, 3).update(*docs[0]).update(*docs[1])
+        partial += AgreementCounts(4, 3).update(*docs[2]).update(*docs[3])
+        np.testing.assert_array_equal(partial.pairs, full.pairs)
+        np.testing.assert_allclose(partial.coincidences, full.coincidences)
+        np.testing.assert_allclose(partial.fleiss, full.fleiss)
+
+    def test_perfect_agreement(self):
+        counts = AgreementCounts(3, 3)
+        tags = np.repeat(np.array([[0], [1], [2], [1]]), 3, axis=1)
+        counts.update(tags, np.arange(3))
+        ag = agreement(Task(entities=self.entities))
+        ag.counts = counts
+        self.assertAlmostEqual(ag.fleiss_kappa(), 1)
+        self.assertAlmostEqual(ag.krippendorff_alpha(), 1)
+
+    def test_parallel(self):
+        serial = agreement(self.task)
+        parallel = agreement(self.task, n_jobs=2, chunksize=1)
+        np.testing.assert_array_equal(serial.counts.pairs,
+                                      parallel.counts.pairs)
+
+    def test_matches_alignment(self):
+        rng = np.random.default_rng(0)
+        documents = [Document(unique_id=f'agreement-doc-{d}',
+                              content=' '.join(['word'] * 12 + ['.']))
+                     for d in range(6)]
+        annotations = [
+            Annotation(
+                unique_id=f'agreement-ann-{d}-{a}-{n}',
+                annotator=f'agreement-annotator-{a}',
+                entity=self.entities[int(rng.integers(2))],
+                document=documents[d],
+                created=f'2021-01-01T00:00:{n:02d}',
+                target={'source': documents[d].id, 'selector': [{
+                    'startContainer': '', 'endContainer': '',
+                    'startOffset': 5 * int(rng.integers(12)),
+                    'endOffset': 5 * int(rng.integers(1, 13)) - 1}]})
+            for d in range(6) for a in range(d % 4) for n in range(3)]
+        task = Task(entities=self.entities, documents=documents,
+                    annotations=annotations)
+        ag = agreement(task, n_jobs=2, chunksize=2)
+        labels, alignments = align(task)
+        counts = AgreementCounts(len(ag.annotators), len(labels))
+        for al in alignments:
+            counts.update(al.tags, np.array(
+                [ag.annotators.index(a) for a in al.annotators]))
+        self.assertEqual(set(ag.counts.tables), set(counts.tables))
+        np.testing.assert_array_equal(ag.counts.pairs, counts.pairs)
+        np.testing.assert_allclose(ag.counts.coincidences,
+                                   counts.coincidences)
+        np.testing.assert_allclose(ag.counts.fleiss, counts.fleiss)
+
+
+class TestConfusionMatrix(unittest.TestCase):
+
+    def test_update(self):
+        cm = ConfusionMatrix(['O', 'PER', 'LOC'])
+        cm.update(['O', 'PER', 'PER'], ['O', 'PER', 'LOC'])
+        cm.update(['LOC'], ['LOC'])
+        np.testing.assert_array_equal(
+            cm.matrix, [[1, 0, 0], [0, 1, 1], [0, 0, 1]])
+        with self.assertRaises(KeyError):
+            cm.update(['MISC'], ['O'])
+
+    def test_merge(self):
+        a = ConfusionMatrix(['x', 'y']).update_codes([0, 1], [1, 1])
+        b = ConfusionMatrix(['x', 'y']).update_codes([0], [0])
+        np.testing.assert_array_equal((a + b).matrix, [[1, 1], [0, 1]])
+        with self.assertRaises(ValueError):
+            a += ConfusionMatrix(['y', 'x'])
+
+    def test_alignment(self):
+        task = Task(
+            entities=[Entity.from_dict(e) for e in SPAN_ENTITIES],
+            documents=[Document.from_dict(SPAN_DOCUMENT)],
+            annotations=[Annotation.from_dict(a) for a in SPAN_ANNOTATIONS]
+        )
+        labels, alignments = align(task)
+        cm = ConfusionMatrix(labels.names)
+        for al in alignments:
+            cm.update_alignment(al)
+        np.testing.assert_array_equal(
+            cm.matrix, [[3, 0, 0], [1, 1, 0], [1, 0, 1]])
+        self.assertEqual(cm.observed().labels, ['O', 'PER', 'LOC'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+from linalgo.annotate.alignment import align, token_offsets
+from linalgo.annotate.models import Annotation, Document, Entity, Task
+from linalgo.annotate.xtram import (
+    compare_tags, plot_confusion_matrix, tokenize
+)
+from .fixtures import SPAN_ANNOTATIONS, SPAN_DOCUMENT, SPAN_ENTITIES
+
+
+class TestAlignment(unittest.TestCase):
+
+    def setUp(self):
+        self.task = Task(
+            entities=[Entity.from_dict(e) for e in SPAN_ENTITIES],
+            documents=[Document.from_dict(SPAN_DOCUMENT)],
+            annotations=[Annotation.from_dict(a) for a in SPAN_ANNOTATIONS]
+        )
+
+    def test_token_offsets(self):
+        doc = self.task.documents[0]
+        tokens, start, end = token_offsets(doc.content)
+        expected = tokenize([doc])[doc.id]
+        self.assertEqual(tokens, expected['token'])
+        self.assertEqual(start.tolist(), expected['start'])
+        self.assertEqual(end.tolist(), expected['end'])
+
+    def test_align(self):
+        labels, alignments = align(self.task)
+        alignments = list(alignments)
+        self.assertEqual(len(alignments), 1)
+        al = alignments[0]
+        self.assertEqual(al.annotators, ['annotator-a', 'annotator-b'])
+        per, loc = labels.codes[SPAN_ENTITIES[0]['id']], labels.codes[
+            SPAN_ENTITIES[1]['id']]
+        # John Smith lives in New York .
+        expected = np.array([
+            [per, per], [per, 0], [0, 0], [0, 0],
+            [loc, 0], [loc, loc], [0, 0]
+        ])
+        np.testing.assert_array_equal(al.tags, expected)
+
+    def test_min_annotators(self):
+        _, alignments = align(self.task, min_annotators=3)
+        self.assertEqual(list(alignments), [])
+
+    def test_compare_tags(self):
+        records = compare_tags(self.task)[0]
+        self.assertEqual(records[0], {
+            'token': 'John', 'start': 0, 'end': 3,
+            'annotator-a': 'PER', 'annotator-b': 'PER'
+        })
+        self.assertEqual(records[-1]['annotator-a'], 'O')
+
+    def test_plot_nothing(self):
+        # documents without tokens or with a single annotator
+        with self.assertRaises(ValueError):
+            plot_confusion_matrix([[], [{'token': 'a', 'start': 0, 'end': 1,
+                                         'annotator-a': 'O'}]], self.task)
+        with self.assertRaises(ValueError):
+            plot_confusion_matrix([], self.task)
+
+
+if __name__ == '__main__':
+    unittest.main()
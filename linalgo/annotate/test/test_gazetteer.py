@@ -0,0 +1,67 @@
+import re
+import unittest
+
+from linalgo.annotate.gazetteer import Automaton, Gazetteer
+from linalgo.annotate.models import Document, Entity, Task
+
+
+class TestGazetteer(unittest.TestCase):
+
+    def test_automaton(self):
+        patterns = ['he', 'she', 'his', 'hers', 'e', 'rs h']
+        automaton = Automaton()
+        for i, pattern in enumerate(patterns):
+            automaton.add(pattern, i)
+        automaton.build()
+        text = 'ushers say his hers shes'
+        found = sorted((start, end, v)
+                       for start, end, values in automaton.iter(text)
+                       for v in values)
+        expected = sorted(
+            (m.start(), m.start() + len(p), i)
+            for i, p in enumerate(patterns)
+            for m in re.finditer(f'(?={re.escape(p)})', text))
+        self.assertEqual(found, expected)
+
+    def test_find(self):
+        gazetteer = Gazetteer({
+            'PER': ['John Smith', 'John'],
+            'LOC': ['New York', 'York'],
+            'TITLE': ['new york'],
+        })
+        text = 'John Smith lives in NEW YORK, not in Johnny York.'
+        self.assertEqual(gazetteer.find(text), [
+            (0, 10, 'PER'), (20, 28, 'LOC'), (20, 28, 'TITLE'),
+            (44, 48, 'LOC')])
+        gazetteer = Gazetteer({'PER': ['John']}, case_sensitive=True,
+                              word_boundaries=False, overlapping=True)
+        self.assertEqual(gazetteer.find(text), [(0, 4, 'PER'),
+                                                (37, 41, 'PER')])
+
+    def test_annotate_many(self):
+        entity = Entity(unique_id='gazetteer-city', name='city')
+        documents = [
+            Document(unique_id=f'gazetteer-doc-{i}',
+                     content=f'{i}: from Paris to London via paris-nord')
+            for i in range(30)]
+        task = Task(unique_id='gazetteer-task', entities=[entity])
+        gazetteer = Gazetteer({entity: ['paris', 'london']})
+        annotations = gazetteer.annotate_many(
+            documents, task=task, batch_size=7)
+        self.assertEqual(len(annotations), 90)
+        self.assertEqual(len(task.annotations), 90)
+        first = annotations[0]
+        self.assertIs(first.entity, entity)
+        self.assertIs(first.document, documents[0])
+        selector = first.target.selector[0]
+        self.assertEqual(
+            documents[0].content[selector.start_offset:selector.end_offset],
+            'Paris')
+        parallel = gazetteer.annotate_many(documents, batch_size=7, n_jobs=2)
+        self.assertEqual(
+            [(a.document.id, a.target.selector) for a in parallel],
+            [(a.document.id, a.target.selector) for a in annotations])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,21 @@
+import sys
+import threading
 import unittest
 
-from linalgo.annotate.models import Annotation, Document
-from .fixtures import ANNOTATIONS, DOCUMENTS
+from linalgo.annotate.models import (
+    Annotation, Annotator, Document, Entity, Task
+)
+from linalgo.annotate.serializers import AnnotationSerializer
+from .fixtures import ANNOTATIONS, DOCUMENTS, SPAN_ANNOTATIONS
 
 
 class TestModels(unittest.TestCase):
 
     def test_unique_id_mixin(self):
+        # start from an empty registry, and give other tests theirs back
+        registry = Annotation.registry()
+        self.addCleanup(registry.update, dict(registry))
+        registry.clear()
         fixture = ANNOTATIONS[0]
         a1 = Annotation(
             unique_id=fixture['id'],
@@ -43,6 +52,134 @@ class TestModels(unittest.TestCase):
         anno = Annotation.from_dict(anno_fixture)
         self.assertEqual(doc, anno.document)
 
+    def test_bounding_box_round_trip(self):
+        anno = Annotation.from_dict(ANNOTATIONS[0])
+        target = AnnotationSerializer(anno).serialize()['target']
+        self.assertEqual(target['selector'],
+                         ANNOTATIONS[0]['target']['selector'])
+
+    def test_copy_on_write(self):
+        original = Annotation.from_dict(SPAN_ANNOTATIONS[0])
+        copies = Annotation.copy_many([original, original])
+        for a in [original] + copies:
+            self.addCleanup(Annotation._registry.pop, a.id)
+            self.addCleanup(original.document.annotations.discard, a)
+        self.assertEqual(len({original.id, copies[0].id, copies[1].id}), 3)
+        self.assertIs(Annotation._registry[copies[0].id], copies[0])
+        self.assertIn(copies[0], original.document.annotations)
+        self.assertIs(copies[0].target.selector, original.target.selector)
+        with self.assertRaises(AttributeError):
+            copies[0].target.selector[0].end_offset = 0
+        end = original.target.selector[0].end_offset
+        copies[0].target.replace_selector(0, end_offset=end + 1)
+        self.assertEqual(copies[0].target.selector[0].end_offset, end + 1)
+        self.assertEqual(original.target.selector[0].end_offset, end)
+        self.assertIs(copies[1].target.selector, original.target.selector)
+
+
+class LengthModel:
+    """Scores texts by length, and counts how many times it is pickled."""
+
+    pickled = 0
+
+    def decision_function(self, texts):
+        return [len(t) for t in texts]
+
+    def __getstate__(self):
+        LengthModel.pickled += 1
+        return self.__dict__
+
+
+class TestAnnotator(unittest.TestCase):
+
+    def setUp(self):
+        self.documents = [
+            Document(unique_id=f'annotator-doc-{i}', content='x' * (i % 7))
+            for i in range(40)]
+
+    def annotator(self, name):
+        task = Task(unique_id=f'annotator-task-{name}')
+        return Annotator(unique_id=f'annotator-{name}', model=LengthModel(),
+                         task=task, entity_id='annotator-long', threshold=3)
+
+    def check(self, annotator, annotations):
+        self.assertEqual([a.document for a in annotations], self.documents)
+        self.assertEqual([a.score for a in annotations],
+                         [float(i % 7) for i in range(40)])
+        self.assertEqual(
+            [a.entity.id for a in annotations],
+            ['annotator-long' if i % 7 >= 3 else '1' for i in range(40)])
+        self.assertEqual(annotator.task.annotations, annotations)
+
+    def test_annotate_many(self):
+        annotator = self.annotator('serial')
+        self.check(annotator, annotator.annotate_many(
+            self.documents, batch_size=6))
+
+    def test_workers(self):
+        annotator = self.annotator('threads')
+        self.check(annotator, annotator.annotate_many(
+            self.documents, batch_size=6, workers=3))
+        annotator = self.annotator('processes')
+        LengthModel.pickled = 0
+        self.check(annotator, annotator.annotate_many(
+            self.documents, batch_size=4, workers=2, backend='process'))
+        # at most once per worker, not once per batch
+        self.assertLessEqual(LengthModel.pickled, 2)
+        with self.assertRaises(NotImplementedError):
+            annotator.annotate_many(self.documents, backend='gpu')
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    def test_concurrent_loads(self):
+        n_threads, n_annotations = 8, 2000
+        barrier = threading.Barrier(n_threads)
+        loaded = [None] * n_threads
+
+        def load(k):
+            barrier.wait()
+            # threads load the same annotations, half of them without a body
+            loaded[k] = [Annotation.from_dict({
+                'id': f'stress-ann-{i}',
+                'entity': f'stress-entity-{i % 7}',
+                'document': f'stress-doc-{i % 50}',
+                'annotator': 'stress-annotator',
+                'task': 'stress-task',
+                'body': f'body {i}' if k % 2 else None,
+                'score': None,
+                'target': {},
+                'created': '2021-01-01T00:00:00',
+            }) for i in range(n_annotations)]
+
+        threads = [threading.Thread(target=load, args=(k,))
+                   for k in range(n_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        by_id = {}
+        for annotations in loaded:
+            for a in annotations:
+                by_id.setdefault(a.id, set()).add(id(a))
+        self.assertEqual(len(by_id), n_annotations)
+        self.assertTrue(all(len(objects) == 1 for objects in by_id.values()))
+        for i in range(n_annotations):
+            a = Annotation._registry[f'stress-ann-{i}']
+            self.assertEqual(a.body, f'body {i}')
+            self.assertIs(a.document,
+                          Document._registry[f'stress-doc-{i % 50}'])
+            self.assertIs(a.entity, Entity._registry[f'stress-entity-{i % 7}'])
+        for d in range(50):
+            document = Document._registry[f'stress-doc-{d}']
+            self.assertEqual(len(document.annotations), n_annotations // 50)
+
 
 if __name__ == '__main__':
     unittest.main()
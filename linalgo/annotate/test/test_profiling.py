@@ -0,0 +1,46 @@
+import unittest
+
+from linalgo.annotate.models import (
+    Annotation, AnnotationFactory, Document, RegistryMixin
+)
+from linalgo.annotate.profiling import (
+    deep_sizeof, profile, registry_counts, registry_sizes
+)
+from .fixtures import SPAN_ANNOTATIONS, SPAN_DOCUMENT
+
+
+class TestProfiling(unittest.TestCase):
+
+    def test_profile(self):
+        from_dict = AnnotationFactory.__dict__['from_dict']
+        setattr_ = RegistryMixin.__dict__['setattr']
+        with profile() as p:
+            Document.from_dict(SPAN_DOCUMENT)
+            for a in SPAN_ANNOTATIONS:
+                Annotation.from_dict(a)
+            with self.assertRaises(RuntimeError):
+                with profile():
+                    pass
+        summary = p.summary()
+        self.assertEqual(summary['AnnotationFactory.from_dict']['calls'],
+                         len(SPAN_ANNOTATIONS))
+        self.assertEqual(summary['DocumentFactory.from_dict']['calls'], 1)
+        # annotations may already be registered by other tests
+        self.assertEqual(sum(p.setattr['Annotation.target'].values()),
+                         len(SPAN_ANNOTATIONS))
+        self.assertGreater(p.setattr['Document.corpus']['overridden'], 0)
+        self.assertIs(AnnotationFactory.__dict__['from_dict'], from_dict)
+        self.assertIs(RegistryMixin.__dict__['setattr'], setattr_)
+
+    def test_registry_sizes(self):
+        document = Document.from_dict(SPAN_DOCUMENT)
+        self.assertGreaterEqual(registry_counts()['Document'], 1)
+        sizes = registry_sizes()
+        self.assertEqual(sizes['Document']['count'],
+                         registry_counts()['Document'])
+        self.assertGreater(deep_sizeof(document),
+                           len(SPAN_DOCUMENT['content']))
+
+
+if __name__ == '__main__':
+    unittest.main()
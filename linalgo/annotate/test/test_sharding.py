@@ -0,0 +1,97 @@
+import operator
+import pickle
+import unittest
+
+from linalgo.annotate.models import (
+    Annotation, Document, Entity, Target, Task, XPathSelector
+)
+from linalgo.annotate.sharding import map_shards, shard_of, split
+
+
+def _count(task):
+    return {d.id: len(task.annotations) for d in task.documents}
+
+
+def _annotation_ids(task):
+    return sorted(a.id for a in task.annotations)
+
+
+def _edit(task):
+    for annotation in task.annotations:
+        annotation.body = 'edited'
+    return task.annotations
+
+
+class TestSharding(unittest.TestCase):
+
+    def setUp(self):
+        entity = Entity(unique_id='shard-entity', name='entity')
+        documents = [Document(unique_id=f'shard-doc-{i}', content=f'text {i}')
+                     for i in range(20)]
+        annotations = [
+            Annotation(
+                unique_id=f'shard-ann-{i}', entity=entity,
+                annotator='shard-annotator', document=documents[i % 20],
+                target=Target(source=documents[i % 20],
+                              selector=[XPathSelector('', '', 0, 4)]),
+                created='2021-01-01T00:00:00')
+            for i in range(30)]
+        self.task = Task(unique_id='shard-task', entities=[entity],
+                         documents=documents, annotations=annotations)
+
+    def test_split(self):
+        shards = list(split(self.task, 4))
+        self.assertEqual(sum(len(s) for s in shards), 20)
+        for shard in shards:
+            for document in shard.documents:
+                self.assertEqual(shard_of(document[0], 4), shard.index)
+            for annotation in shard.annotations:
+                self.assertEqual(shard_of(annotation[3], 4), shard.index)
+        n_documents = len(Document._registry)
+        task = pickle.loads(pickle.dumps(shards[0])).to_task()
+        self.assertEqual(len(Document._registry), n_documents)
+        self.assertIs(task.documents[0],
+                      Document._registry[shards[0].documents[0][0]])
+        self.assertEqual(len(self.task.documents), 20)
+
+    def test_pickle_uses_registry(self):
+        annotation = self.task.annotations[0]
+        n_annotations = len(Annotation._registry)
+        self.assertIs(pickle.loads(pickle.dumps(annotation)), annotation)
+        self.assertEqual(len(Annotation._registry), n_annotations)
+
+    def test_map_shards(self):
+        expected = sorted(a.id for a in self.task.annotations)
+        merged = map_shards(self.task, _annotation_ids, n_shards=3,
+                            merge=operator.add)
+        self.assertEqual(sorted(merged), expected)
+        merged = map_shards(self.task, _annotation_ids, n_jobs=2,
+                            merge=operator.add)
+        self.assertEqual(sorted(merged), expected)
+        counts = map_shards(self.task, _count, n_jobs=2)
+        self.assertEqual(len(counts), 8)
+        self.assertEqual(len(self.task.annotations), 30)
+
+    def test_map_shards_edits(self):
+        for annotation in self.task.annotations:
+            self.addCleanup(setattr, annotation, 'body', annotation.body)
+        for n_jobs in (None, 2):
+            for annotation in self.task.annotations:
+                annotation.body = 'original'
+            edited = map_shards(self.task, _edit, n_jobs=n_jobs,
+                                merge=operator.add)
+            self.assertEqual({a.body for a in edited}, {'edited'})
+            self.assertEqual({a.body for a in self.task.annotations},
+                             {'edited'})
+            # results are the objects of the calling process
+            self.assertEqual(
+                {id(a) for a in edited},
+                {id(a) for a in self.task.annotations})
+            self.assertEqual(len(self.task.documents), 20)
+            self.assertEqual(len(self.task.annotations), 30)
+            self.assertEqual(
+                sum(len(d.annotations) for d in self.task.documents), 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
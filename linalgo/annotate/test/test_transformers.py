@@ -0,0 +1,85 @@
+import unittest
+
+from linalgo.annotate.models import Annotation, Document, Entity, Task
+from linalgo.annotate.transformers import (
+    MultiClassTransformer, MultiLabelTransformer
+)
+
+
+class TestTransformers(unittest.TestCase):
+
+    def setUp(self):
+        self.pos = Entity(unique_id='tr-pos', name='positive')
+        self.neg = Entity(unique_id='tr-neg', name='negative')
+        self.other = Entity(unique_id='tr-other', name='other')
+        self.documents = [Document(unique_id=f'tr-doc-{i}', content=f'doc {i}')
+                          for i in range(5)]
+        self.task = Task(unique_id='tr-task',
+                         entities=[self.pos, self.neg, self.other],
+                         documents=self.documents)
+
+        def annotation(i, annotator, document, entity, created):
+            return Annotation(
+                unique_id=f'tr-ann-{i}', annotator=annotator,
+                document=self.documents[document], entity=entity,
+                task=self.task, target={},
+                created=f'2021-01-01T00:00:{created:02d}')
+
+        self.annotations = [
+            # doc 0: one positive, then one negative: a tie
+            annotation(0, 'tr-a', 0, self.pos, 1),
+            annotation(1, 'tr-b', 0, self.neg, 2),
+            # doc 1: two negatives against a later positive
+            annotation(2, 'tr-a', 1, self.neg, 1),
+            annotation(3, 'tr-b', 1, self.neg, 2),
+            annotation(4, 'tr-c', 1, self.pos, 3),
+            # doc 2: annotator a changed their mind
+            annotation(5, 'tr-a', 2, self.pos, 1),
+            annotation(6, 'tr-a', 2, self.other, 4),
+            annotation(7, 'tr-b', 2, self.neg, 2),
+            # doc 4: a single label
+            annotation(8, 'tr-a', 4, self.other, 1),
+        ]
+
+    def test_majority(self):
+        batches = list(MultiClassTransformer().iter_batches(
+            self.task, batch_size=2, strategy='majority'))
+        self.assertEqual([len(ids) for ids, _, _ in batches], [2, 2])
+        labels = dict(zip(sum((b[0] for b in batches), []),
+                          sum((b[2] for b in batches), [])))
+        self.assertEqual(labels, {
+            'tr-doc-0': 'negative', 'tr-doc-1': 'negative',
+            'tr-doc-2': 'other', 'tr-doc-4': 'other'})
+        _, _, latest = zip(*MultiClassTransformer().iter_batches(self.task))
+        self.assertEqual(latest[0], ['negative', 'positive', 'other',
+                                     'other'])
+
+    def test_keep_last_by_annotator(self):
+        transformer = MultiLabelTransformer()
+        _, labels = transformer.transform(
+            self.task, strategy='keep-last-by-annotator')
+        self.assertEqual(labels, [{'positive', 'negative'},
+                                  {'positive', 'negative'},
+                                  {'other', 'negative'}, {'other'}])
+        _, labels = transformer.transform(self.task)
+        self.assertEqual(labels[2], {'positive', 'other', 'negative'})
+
+    def test_indicator_matrix(self):
+        transformer = MultiLabelTransformer()
+        batches = list(transformer.iter_batches(self.task, batch_size=3))
+        self.assertEqual(transformer.classes,
+                         ['positive', 'negative', 'other'])
+        ids = [i for batch in batches for i in batch[0]]
+        self.assertEqual(ids, ['tr-doc-0', 'tr-doc-1', 'tr-doc-2',
+                               'tr-doc-4'])
+        self.assertEqual([y.shape for _, _, y in batches], [(3, 3), (1, 3)])
+        self.assertEqual(batches[0][2].toarray().tolist(),
+                         [[1, 1, 0], [1, 1, 0], [1, 1, 1]])
+        self.assertEqual(batches[1][2].toarray().tolist(), [[0, 0, 1]])
+        transformer = MultiLabelTransformer(classes=['positive'])
+        with self.assertRaises(ValueError):
+            list(transformer.iter_batches(self.task))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from linalgo.annotate.models import Annotation, Document, Entity, Task
+from linalgo.annotate.utils import multiclass_dataframe
+
+
+class TestMulticlassDataframe(unittest.TestCase):
+
+    def setUp(self):
+        pos = Entity(unique_id='mc-pos', name='positive')
+        neg = Entity(unique_id='mc-neg', name='negative')
+        documents = [Document(unique_id=f'mc-doc-{i}', content=f'text {i}')
+                     for i in range(3)]
+
+        def annotation(i, annotator, document, entity, created):
+            return Annotation(
+                unique_id=f'mc-ann-{i}', annotator=annotator,
+                document=document, entity=entity, target={},
+                created=f'2021-01-01T00:00:{created:02d}')
+
+        annotations = [
+            annotation(0, 'mc-a', 'mc-doc-1', pos, 1),
+            annotation(1, 'mc-a', 'mc-doc-1', neg, 5),
+            annotation(2, 'mc-a', 'mc-doc-0', pos, 2),
+            annotation(3, 'mc-b', 'mc-doc-1', pos, 3),
+            annotation(4, 'mc-b', 'mc-doc-2', neg, 3),
+            annotation(5, 'mc-b', 'mc-unknown', neg, 3),
+        ]
+        self.task = Task(entities=[pos, neg], documents=documents,
+                         annotations=annotations)
+
+    def test_latest_label(self):
+        df = multiclass_dataframe(self.task)
+        self.assertEqual(list(df.columns),
+                         ['document_id', 'mc-a', 'mc-b', 'content'])
+        self.assertEqual(list(df['document_id']),
+                         ['mc-doc-0', 'mc-doc-1', 'mc-doc-2'])
+        self.assertEqual(list(df['mc-a'].astype(object).fillna('')),
+                         ['positive', 'negative', ''])
+        self.assertEqual(list(df['mc-b'].astype(object).fillna('')),
+                         ['', 'positive', 'negative'])
+        self.assertEqual(list(df['content']), ['text 0', 'text 1', 'text 2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
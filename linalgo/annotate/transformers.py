@@ -1,5 +1,9 @@
+from collections import Counter
 from typing import List, Union
 
+import numpy as np
+
+from .batching import batched
 from .models import Entity, Task
 
 
@@ -19,41 +23,136 @@ class BinaryTransformer:
 
 class MultiClassTransformer:
 
-    def transform(self, task: Task, strategy='latest', ignore=[], keep_ids=False):
+    @staticmethod
+    def _label(annotations, strategy):
+        if strategy == 'latest':
+            return max(annotations, key=lambda a: a.created).entity
+        counts = Counter(a.entity for a in annotations)
+        top = max(counts.values())
+        # ties are broken in favour of the most recent annotation
+        latest = None
+        for a in annotations:
+            if counts[a.entity] == top:
+                if latest is None or a.created > latest.created:
+                    latest = a
+        return latest.entity
+
+    def _iter_labels(self, task: Task, strategy='latest', ignore=[]):
         if strategy not in ('latest', 'majority'):
             raise NotImplementedError(f'{strategy} is not a valid strategy.')
-        texts, labels, doc_ids = [], [], []
         for doc in task.documents:
             aa = [a for a in doc.annotations if a.task == task]
             aa = [a for a in aa if a.entity not in ignore]
             if len(aa) > 0:
-                annotations = sorted(aa, key=lambda a: a.created, reverse=True)
-                doc_ids.append(doc.id)
-                texts.append(doc.content)
-                labels.append(annotations[0].entity.name)
+                yield doc, self._label(aa, strategy).name
+
+    def transform(self, task: Task, strategy='latest', ignore=[], keep_ids=False):
+        texts, labels, doc_ids = [], [], []
+        for doc, label in self._iter_labels(task, strategy, ignore):
+            doc_ids.append(doc.id)
+            texts.append(doc.content)
+            labels.append(label)
         if keep_ids:
             return doc_ids, texts, labels
         return texts, labels
 
+    def iter_batches(self, task: Task, batch_size=1000, strategy='latest',
+                     ignore=[]):
+        """
+        Stream the labelled documents of a task
+
+        Parameters
+        ----------
+        task: Task
+            The task to transform
+        batch_size: int
+            Maximum number of documents per batch
+        strategy: str, {'latest', 'majority'}
+            Keep the most recent label of a document, or the label chosen
+            by most annotations (ties going to the most recent one)
+        ignore: List[Entity]
+            Entities to discard
+
+        Returns
+        -------
+        Iterator[Tuple[List[str], List[str], List[str]]]
+            Batches of document ids, texts and labels
+        """
+        labels = self._iter_labels(task, strategy, ignore)
+        for batch in batched(labels, batch_size):
+            yield ([doc.id for doc, _ in batch],
+                   [doc.content for doc, _ in batch],
+                   [label for _, label in batch])
+
 
 class MultiLabelTransformer:
 
-    def transform(self, task: Task, strategy='keep-all'):
+    def __init__(self, classes: List[str] = None):
+        self.classes = classes
+
+    @staticmethod
+    def _iter_labels(task: Task, strategy='keep-all'):
         if strategy not in ('keep-all', 'keep-last-by-annotator'):
             raise NotImplementedError(f'{strategy} is not a valid strategy.')
-        texts, labels = [], []
         for doc in task.documents:
             if len(doc.annotations) > 0:
-                texts.append(doc.content)
                 if strategy == 'keep-last-by-annotator':
                     d = {}
                     for a in doc.annotations:
-                        try:
-                            if d[a.annotator.id].created > a.created:
-                                d[a.annotator.id] = a
-                        except:
+                        last = d.get(a.annotator.id)
+                        if last is None or a.created > last.created:
                             d[a.annotator.id] = a
-                    labels.append({v.entity.name for k, v in d.items()})
+                    yield doc, {v.entity.name for v in d.values()}
                 elif strategy == 'keep-all':
-                    labels.append({e.name for e in doc.entities})
+                    yield doc, {e.name for e in doc.entities}
+
+    def transform(self, task: Task, strategy='keep-all'):
+        texts, labels = [], []
+        for doc, label in self._iter_labels(task, strategy):
+            texts.append(doc.content)
+            labels.append(label)
         return texts, labels
+
+    def iter_batches(self, task: Task, batch_size=1000, strategy='keep-all'):
+        """
+        Stream the labelled documents of a task with labels encoded as a
+        sparse indicator matrix
+
+        The columns of the matrix follow `self.classes`, which defaults to
+        the names of the task entities so that every batch shares the same
+        label index.
+
+        Parameters
+        ----------
+        task: Task
+            The task to transform
+        batch_size: int
+            Maximum number of documents per batch
+        strategy: str, {'keep-all', 'keep-last-by-annotator'}
+            Keep all labels of a document, or only the most recent label of
+            each annotator
+
+        Returns
+        -------
+        Iterator[Tuple[List[str], List[str], csr_matrix]]
+            Batches of document ids, texts and (documents x classes)
+            indicator matrices
+        """
+        from scipy.sparse import csr_matrix
+        if self.classes is None:
+            self.classes = [e.name for e in task.entities]
+        index = {name: i for i, name in enumerate(self.classes)}
+        labels = self._iter_labels(task, strategy)
+        for batch in batched(labels, batch_size):
+            try:
+                indices = [index[name] for _, names in batch for name in names]
+            except KeyError as e:
+                raise ValueError(f'{e} is not a known class.') from e
+            indptr = np.cumsum([0] + [len(names) for _, names in batch])
+            data = np.ones(len(indices), dtype=np.int8)
+            y = csr_matrix((data, indices, indptr),
+                           shape=(len(batch), len(self.classes)))
+            y.sort_indices()
+            yield ([doc.id for doc, _ in batch],
+                   [doc.content for doc, _ in batch],
+                   y)
@@ -1,21 +1,35 @@
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from sklearn.metrics import confusion_matrix
+
+from linalgo.annotate.agreement import ConfusionMatrix
+
+# pandas and matplotlib are imported on first use, as importing them takes
+# longer than the rest of the package
 
 
 def plot_confusion_matrix(y_true, y_pred, classes,
                           normalize=False,
                           title=None,
                           names=None,
-                          cmap=plt.cm.Blues,
+                          cmap='Blues',
                           ax=None):
+    cm = ConfusionMatrix(classes).update(y_true, y_pred)
+    return plot_confusion(cm, normalize=normalize, title=title, names=names,
+                          cmap=cmap, ax=ax)
 
-    # Compute confusion matrix
-    cm = confusion_matrix(y_true, y_pred)
-    # Only use the labels that appear in the data
+
+def plot_confusion(cm: ConfusionMatrix,
+                   normalize=False,
+                   title=None,
+                   names=None,
+                   cmap='Blues',
+                   ax=None):
+    import matplotlib.pyplot as plt
+    classes = cm.labels
+    names = names or (None, None)
     if normalize:
-        cm = cm.astype('float') / cm.sum(axis=1)[:, np.newaxis]
+        cm = cm.normalized()
+    else:
+        cm = cm.matrix
 
     if ax is None:
         fig, ax = plt.subplots()
@@ -44,7 +58,8 @@ def plot_confusion_matrix(y_true, y_pred, classes,
     return ax
 
 
-def plot_matrix(cm, xlabels=None, ylabels=None, title=None, cmap=plt.cm.Blues):
+def plot_matrix(cm, xlabels=None, ylabels=None, title=None, cmap='Blues'):
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots()
     im = ax.imshow(cm, interpolation='nearest', cmap=cmap)
 
@@ -72,31 +87,77 @@ def plot_matrix(cm, xlabels=None, ylabels=None, title=None, cmap=plt.cm.Blues):
     return ax
 
 
+def _codes(values):
+    """Integer-code values in order of first appearance."""
+    import pandas as pd
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return pd.factorize(array)
+
+
+def latest(groups, created):
+    """
+    Find the most recent row of each group
+
+    Parameters
+    ----------
+    groups: np.ndarray
+        Integer group of each row
+    created: np.ndarray
+        Creation time of each row. Ties go to the row appearing last.
+
+    Returns
+    -------
+    np.ndarray
+        The index of the most recent row of each non-empty group, by
+        increasing group
+    """
+    order = np.lexsort((np.arange(len(groups)), created, groups))
+    groups = groups[order]
+    last = np.ones(len(groups), dtype=bool)
+    last[:-1] = groups[1:] != groups[:-1]
+    return order[last]
+
+
 def multiclass_dataframe(task):
-    df = []
-    for annotation in task.annotations:
-        data = {
-            'document': annotation.document_id,
-            'label': annotation.entity_id,
-            'annotator': annotation.annotator,
-            'created': annotation.created
-        }
-        df.append(data)
-    df = pd.DataFrame(df)
-    df['created'] = pd.to_datetime(df['created'])
-    df2 = df.loc[df.groupby(['annotator', 'document']).created.idxmax()]
-    df3 = df2.pivot(index='document', columns='annotator',
-                    values='label').reset_index()
-    annotators = [x for x in df3.columns[1:]]
-    df3.columns = ['document_id'] + annotators
-    df3[annotators] = df3[annotators].applymap(np.vectorize(task.get_name))
-
-    dd = []
-    for doc in task.documents:
-        data = {
-            'document_id': doc.id,
-            'content': doc.content
-        }
-        dd.append(data)
-    dd = pd.DataFrame(dd)
-    return pd.merge(df3, dd, on='document_id')
+    """
+    Build the document x annotator matrix of labels of a multiclass task
+
+    Only the latest label of each annotator on each document is kept.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per annotated document of the task, sorted by id, with a
+        `document_id` column, a categorical column of label names per
+        annotator and a `content` column.
+    """
+    import pandas as pd
+    annotations = task.annotations
+    documents, document_ids = _codes([a.document.id for a in annotations])
+    annotators, annotator_ids = _codes([a.annotator.id for a in annotations])
+    labels, entities = _codes([a.entity for a in annotations])
+    created = pd.to_datetime([a.created for a in annotations], utc=True)
+    created = np.asarray(created.asi8)
+
+    n_annotators = len(annotator_ids)
+    rows = latest(documents * n_annotators + annotators, created)
+    matrix = np.full((len(document_ids), n_annotators), -1, dtype=np.int64)
+    matrix[documents[rows], annotators[rows]] = labels[rows]
+
+    # several entities may share a name
+    names = [e.name or e.id for e in entities]
+    name_codes, categories = pd.factorize(np.array(names, dtype=object))
+    name_codes = np.append(name_codes, -1)
+    matrix = name_codes[matrix]
+
+    content = {d.id: d.content for d in task.documents}
+    keep = np.array([i in content for i in document_ids], dtype=bool)
+    order = np.argsort(document_ids[keep], kind='stable')
+    matrix, document_ids = matrix[keep][order], document_ids[keep][order]
+    columns = {'document_id': document_ids}
+    for j in np.argsort(annotator_ids, kind='stable'):
+        columns[annotator_ids[j]] = pd.Categorical.from_codes(
+            matrix[:, j], categories=categories)
+    columns['content'] = [content[i] for i in document_ids]
+    return pd.DataFrame(columns)
@@ -1,11 +1,12 @@
-import string
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 
 from itertools import accumulate
 
-from sklearn.metrics import confusion_matrix
+from linalgo.annotate.agreement import ConfusionMatrix
+from linalgo.annotate.alignment import (
+    DocumentAlignment, LabelIndex, align, is_punct
+)
+from linalgo.annotate.utils import plot_confusion
 
 
 def tokenize(documents, orient='dict'):
@@ -40,54 +41,34 @@ def tokenize(documents, orient='dict'):
     return tok_map
 
 
-def is_punct(x):
-    if x in string.punctuation:
-        return True
-    if x in ['-RRB-', '-LRB-']:
-        return True
-    return False
-
-
 def compare_tags(task, untag_punct=True, min_annotators=2):
     """
     Calculate tag alignment for several annotators on the same documents
 
+    This is a record-oriented view of `alignment.align`, which should be
+    preferred on large tasks as it returns compact arrays.
+
     Parameters
     -------------
     task : Task
         The task object to compute alignement from
     untag_punct : bool
         Whether or not to automatically untag punctuation tokens
+    min_annotators: int
+        Skip documents annotated by fewer annotators
 
     Returns
     ---------
     Dict
         Records containing the token and associated tags for each annotator
     """
-    entities = {e['id']: e['title'] for e in task.entities}
-    tok_map = tokenize(task.documents, orient='record')
-    al = []
-    for doc in task.documents:
-        tokens = tok_map[doc.id]
-        xl = pd.DataFrame(tokens)
-        annotators = list({a.annotator for a in doc.annotations})
-        if len(annotators) < min_annotators:
-            continue
-        for annotator in annotators:
-            xl[annotator] = 'O'
-        for anno in doc.annotations:
-            start = anno.target['selector'][0]['startOffset']
-            end = anno.target['selector'][0]['endOffset']
-            idx1 = xl['start'] >= start
-            idx2 = xl['end'] <= end
-            xl.loc[idx1 & idx2, anno.annotator] = entities[anno.entity_id]
-        if untag_punct:
-            xl.loc[xl['token'].apply(is_punct), annotators] = 'O'
-        al.append(xl.to_dict(orient='record'))
-    return al
+    labels, alignments = align(
+        task, untag_punct=untag_punct, min_annotators=min_annotators)
+    return [al.to_records(labels) for al in alignments]
 
 
 def filter_by_entity(al, entity, annotators):
+    import pandas as pd
     xl = pd.DataFrame(al)
     idx = np.array([False ]* xl.shape[0])
     for a in annotators:
@@ -103,19 +84,40 @@ def score(al, entity, annotators):
 
 
 def plot_confusion_matrix(
-        als, task, normalize=False, title=None, cmap=plt.cm.Blues):
-    xls = []
-    for al in als:
-        xl = pd.DataFrame(al)
-        xl = xl[[a for a in xl.columns if a in task.annotators]]
-        xl = xl.iloc[:, [0, 1]]
-        xl.columns = ['a', 'b']
-        xls.append(xl)
+        als, task, normalize=False, title=None, cmap='Blues'):
+    """
+    Plot the confusion matrix between the first two annotators of each
+    document
 
-    cc = pd.concat(xls)
-    classes = sorted(list(cc['b'].unique()))
-    y_true = cc.values[:, 1]
-    y_pred = cc.values[:, 0]
+    Documents without tokens or with fewer than two annotators are skipped,
+    and a `ValueError` is raised when no document is left.
+
+    Parameters
+    -------------
+    als : Iterable
+        Either `DocumentAlignment` objects or record lists as returned by
+        `compare_tags`. They are consumed one at a time.
+    task : Task
+        The task the alignments were computed from
+    """
+    labels = LabelIndex(task.entities)
+    cm = ConfusionMatrix(labels.names)
+    for al in als:
+        if isinstance(al, DocumentAlignment):
+            cm.update_alignment(al)
+            continue
+        if len(al) == 0:
+            # a document without tokens
+            continue
+        annotators = [k for k in al[0] if k not in ('token', 'start', 'end')]
+        if len(annotators) < 2:
+            continue
+        cm.update([r[annotators[0]] for r in al],
+                  [r[annotators[1]] for r in al])
+    if cm.matrix.sum() == 0:
+        raise ValueError('No token was tagged by two annotators, there is '
+                         'nothing to plot.')
+    cm = cm.observed()
 
     if not title:
         if normalize:
@@ -123,36 +125,7 @@ def plot_confusion_matrix(
         else:
             title = 'Confusion matrix, without normalization'
 
-    # Compute confusion matrix
-    cm = confusion_matrix(y_true, y_pred)
-    # Only use the labels that appear in the data
-#     classes = classes[unique_labels(y_true, y_pred)]
-    if normalize:
-        cm = cm.astype('float') / cm.sum(axis=1)[:, np.newaxis]
-
-    fig, ax = plt.subplots()
-    im = ax.imshow(cm, interpolation='nearest', cmap=cmap)
-    # ax.figure.colorbar(im, ax=ax)
-    # We want to show all ticks...
-    ax.set(xticks=np.arange(cm.shape[1]),
-           yticks=np.arange(cm.shape[0]),
-           # ... and label them with the respective list entries
-           xticklabels=classes, yticklabels=classes,
-           title=title,
-           ylabel='Annotator A',
-           xlabel='Annotator B')
-
-    # Rotate the tick labels and set their alignment.
-    plt.setp(ax.get_xticklabels(), rotation=45, ha="right",
-             rotation_mode="anchor")
-
-    # Loop over data dimensions and create text annotations.
-    fmt = '.2f' if normalize else 'd'
-    thresh = cm.max() / 2.
-    for i in range(cm.shape[0]):
-        for j in range(cm.shape[1]):
-            ax.text(j, i, format(cm[i, j], fmt),
-                    ha="center", va="center",
-                    color="white" if cm[i, j] > thresh else "black")
-    fig.tight_layout()
+    ax = plot_confusion(cm, normalize=normalize, title=title,
+                        names=('Annotator A', 'Annotator B'), cmap=cmap)
+    ax.figure.tight_layout()
     return ax
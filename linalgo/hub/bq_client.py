@@ -1,16 +1,58 @@
 """Retrieve annotated data from BigQuery."""
-from google.cloud import bigquery
+from concurrent.futures import ThreadPoolExecutor
 
 from linalgo.annotate.models import Annotation, Document
 
 
+PREFIX = "linalgo-infra.linhub_prod.public_"
+
+ANNOTATIONS_QUERY = (
+    'SELECT la.* '
+    f'FROM `{PREFIX}linhub_corpus` lc '
+    f'JOIN `{PREFIX}linhub_task_corpora` ltc ON ltc.corpus_id = lc.id '
+    f'LEFT JOIN `{PREFIX}linhub_annotation` la ON la.task_id = ltc.task_id '
+    'WHERE ltc.task_id = @task_id;'
+)
+
+DOCUMENTS_QUERY = (
+    'SELECT ld.* '
+    f'FROM `{PREFIX}linhub_document` ld '
+    f'JOIN `{PREFIX}linhub_corpus` lc on lc.id = ld.corpus_id '
+    f'JOIN `{PREFIX}linhub_task_corpora` ltc ON ltc.corpus_id = lc.id '
+    'WHERE ltc.task_id = @task_id;'
+)
+
+
 class BQClient:
+    """
+    Parameters
+    ----------
+    task_id: str
+        The task to retrieve
+    client: bigquery.Client
+        The BigQuery client, created from the environment if None
+    page_size: int
+        Number of rows per page of results
+    cache: QueryCache
+        If provided, results are read from and written to this cache, and
+        cached queries are not sent to BigQuery
+    """
 
-    def __init__(self, task_id):
-        self.client = bigquery.Client()
+    def __init__(self, task_id, client=None, page_size=10000, cache=None):
+        self._client = client
         self.task_id = task_id
+        self.page_size = page_size
+        self.cache = cache
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google.cloud import bigquery
+            self._client = bigquery.Client()
+        return self._client
 
     def _get_query_data(self, query):
+        from google.cloud import bigquery
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
                 bigquery.ScalarQueryParameter(
@@ -18,31 +60,83 @@ class BQClient:
             ]
         )
         job = self.client.query(query, job_config=job_config)
-        return job.result()
+        return job.result(page_size=self.page_size)
+
+    def _iter_record_batches(self, query):
+        """Stream the results of a query as `pyarrow.RecordBatch` pages."""
+        if self.cache is None:
+            return self._get_query_data(query).to_arrow_iterable()
+        key = self.cache.key(query, {'task_id': self.task_id})
+        batches = self.cache.get(key)
+        if batches is None:
+            batches = list(self._get_query_data(query).to_arrow_iterable())
+            self.cache.put(key, batches)
+        return iter(batches)
+
+    def iter_annotation_batches(self):
+        return self._iter_record_batches(ANNOTATIONS_QUERY)
+
+    def iter_document_batches(self):
+        return self._iter_record_batches(DOCUMENTS_QUERY)
 
     def get_annotations(self):
-        prefix = "linalgo-infra.linhub_prod.public_"
-        query = (
-            'SELECT la.* '
-            f'FROM `{prefix}linhub_corpus` lc '
-            f'JOIN `{prefix}linhub_task_corpora` ltc ON ltc.corpus_id = lc.id '
-            f'LEFT JOIN `{prefix}linhub_annotation` la ON la.task_id = ltc.task_id '
-            'WHERE ltc.task_id = @task_id;'
-        )
-        rows = self._get_query_data(query)
-        return [Annotation.from_bq_row(row) for row in rows]
+        batches = self.iter_annotation_batches()
+        return [a for batch in batches for a in Annotation.from_arrow(batch)]
 
     def get_documents(self):
-        prefix = "linalgo-infra.linhub_prod.public_"
-        query = (
-            'SELECT ld.* '
-            f'FROM `{prefix}linhub_document` ld '
-            f'JOIN `{prefix}linhub_corpus` lc on lc.id = ld.corpus_id '
-            f'JOIN `{prefix}linhub_task_corpora` ltc ON ltc.corpus_id = lc.id '
-            'WHERE ltc.task_id = @task_id;'
-        )
-        rows = self._get_query_data(query)
-        return [Document.from_bq_row(row) for row in rows]
+        batches = self.iter_document_batches()
+        return [d for batch in batches for d in Document.from_arrow(batch)]
+
+    def get_task_batches(self):
+        """
+        Run the document and annotation queries concurrently
+
+        Returns
+        -------
+        Tuple[List[pyarrow.RecordBatch], List[pyarrow.RecordBatch]]
+            The document and annotation record batches
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            documents = executor.submit(
+                lambda: list(self.iter_document_batches()))
+            annotations = executor.submit(
+                lambda: list(self.iter_annotation_batches()))
+            return documents.result(), annotations.result()
+
+    def get_task_tables(self):
+        """
+        Fetch the documents and annotations of the task concurrently,
+        without creating model objects
+
+        Returns
+        -------
+        Tuple[pyarrow.Table, pyarrow.Table]
+            The documents and annotations tables
+        """
+        import pyarrow as pa
+        return tuple(
+            pa.Table.from_batches(batches) if batches else pa.table({})
+            for batches in self.get_task_batches())
+
+    def get_task_data(self):
+        """
+        Fetch the documents and annotations of the task concurrently
+
+        Queries run in parallel. Models are then created from whole record
+        batches in the calling thread: the registry is thread-safe, but
+        creating models holds the interpreter lock, so threads would not
+        make it faster.
+
+        Returns
+        -------
+        Tuple[List[Document], List[Annotation]]
+        """
+        documents, annotations = self.get_task_batches()
+        documents = [d for batch in documents
+                     for d in Document.from_arrow(batch)]
+        annotations = [a for batch in annotations
+                       for a in Annotation.from_arrow(batch)]
+        return documents, annotations
 
 
 __all__ = ['BQClient']
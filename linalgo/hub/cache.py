@@ -0,0 +1,126 @@
+"""Local cache of query results stored as Arrow files."""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+
+class QueryCache:
+    """
+    Store query results on disk, keyed by the query text and parameters.
+
+    Each result is an Arrow IPC file named after the hash of its key.
+    Entries older than `ttl` are ignored, and the least recently used
+    entries are evicted once the cache grows beyond `max_bytes`.
+
+    Parameters
+    ----------
+    directory: str
+        Where the files are stored. Defaults to `~/.cache/linalgo/bq`.
+    ttl: float
+        Number of seconds a result stays valid, forever if None
+    max_bytes: int
+        Maximum size of the cache on disk
+    """
+
+    suffix = '.arrow'
+
+    def __init__(self, directory: str = None, ttl: Optional[float] = 86400,
+                 max_bytes: int = 2 ** 30):
+        if directory is None:
+            directory = os.path.join(
+                os.path.expanduser('~'), '.cache', 'linalgo', 'bq')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def __repr__(self):
+        return f'QueryCache::{self.directory}'
+
+    @staticmethod
+    def key(query: str, parameters: Dict = None) -> str:
+        content = json.dumps([query, parameters or {}], sort_keys=True)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+        return entries
+
+    def get(self, key: str) -> Optional[List]:
+        """
+        Returns
+        -------
+        List[pyarrow.RecordBatch]
+            The cached result, or None if it is missing or expired
+        """
+        import pyarrow as pa
+        path = self._path(key)
+        try:
+            modified = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        if self.ttl is not None and time.time() - modified > self.ttl:
+            self._remove(path)
+            return None
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            batches = [reader.get_batch(i)
+                       for i in range(reader.num_record_batches)]
+        # the access time orders entries for eviction
+        os.utime(path, (time.time(), modified))
+        return batches
+
+    def put(self, key: str, batches: List):
+        """Store a result given as a list of `pyarrow.RecordBatch`."""
+        import pyarrow as pa
+        schema = batches[0].schema if batches else pa.schema([])
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as sink:
+                with pa.ipc.new_file(sink, schema) as writer:
+                    for batch in batches:
+                        writer.write_batch(batch)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            self._remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries beyond `max_bytes`."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+__all__ = ['QueryCache']
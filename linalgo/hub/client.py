@@ -3,16 +3,25 @@ import io
 import warnings
 from enum import Enum
 
-from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
 import csv
+import queue
 import requests
+import threading
+import time
 import zipfile
 
 from linalgo.annotate.models import (
     Annotation, Annotator, Corpus, Document, Entity, Task, Schedule
 )
 from linalgo.annotate import models, serializers
+from linalgo.annotate.batching import batched
+from linalgo.annotate.diff import Snapshot
 from linalgo.annotate.serializers import AnnotationSerializer, DocumentSerializer
+from linalgo.hub.instrumentation import (
+    Instrumentation, RequestEvent, endpoint
+)
 
 
 class AssignmentType(Enum):
@@ -39,13 +48,42 @@ class LinalgoClient:
         'organizations': 'organizations'
     }
 
-    def __init__(self, token, api_url="http://localhost:8000"):
+    def __init__(self, token, api_url="http://localhost:8000",
+                 instrumentation: Instrumentation = None):
         self.api_url = api_url
         self.access_token = token
+        self.session = requests.Session()
+        self.instrumentation = instrumentation or Instrumentation()
+        self._bulk_endpoints = {}
 
-    def get(self, url, query_params={}):
+    def request(self, method, url, **kwargs):
+        """
+        Send a request to the hub and report it to `instrumentation`
+
+        The body is read before returning, so that the time to the response
+        headers and the download time are measured separately.
+        """
         headers = {'Authorization': f"Token {self.access_token}"}
-        res = requests.get(url, headers=headers, params=query_params)
+        start = time.perf_counter()
+        try:
+            res = self.session.request(
+                method, url, headers=headers, stream=True, **kwargs)
+            connect = time.perf_counter() - start
+            content = res.content
+        except Exception as e:
+            self.instrumentation.on_request(RequestEvent(
+                method, url, connect=time.perf_counter() - start,
+                error=str(e)))
+            raise
+        self.instrumentation.on_request(RequestEvent(
+            method, url, status=res.status_code,
+            bytes_out=_body_size(res.request), bytes_in=len(content),
+            connect=connect, download=time.perf_counter() - start - connect,
+            retries=_retries(res)))
+        return res
+
+    def get(self, url, query_params={}):
+        res = self.request('GET', url, params=query_params)
         if res.status_code == 401:
             raise Exception(f"Authentication failed. Please check your token.")
         if res.status_code == 404:
@@ -56,8 +94,7 @@ class LinalgoClient:
         return res.json()
 
     def post(self, url, data=None, files=None, json=None):
-        headers = {'Authorization': f"Token {self.access_token}"}
-        res = requests.post(url, data=data, json=json, files=files, headers=headers)
+        res = self.request('POST', url, data=data, json=json, files=files)
         if 200 <= res.status_code < 300:
             return res
         if res.status_code == 401:
@@ -69,10 +106,7 @@ class LinalgoClient:
                 f"Request returned status {res.status_code}, {res.content}")
 
     def request_csv(self, url, query_params={}):
-        headers = {'Authorization': f"Token {self.access_token}"}
-        # stream the file
-        with closing(requests.get(url, stream=True,
-                                  headers=headers, params=query_params)) as res:
+        with closing(self.request('GET', url, params=query_params)) as res:
             if res.status_code == 401:
                 raise Exception(
                     f"Authentication failed. Please check your token.")
@@ -80,14 +114,26 @@ class LinalgoClient:
                 raise Exception(f"{url} not found.")
             elif res.status_code != 200:
                 raise Exception(f"Request returned status {res.status_code}")
-            root = zipfile.ZipFile(io.BytesIO(res.content))
-            f = root.namelist()
+            with self.instrumentation.phase('unzip', endpoint=endpoint(url)):
+                root = zipfile.ZipFile(io.BytesIO(res.content))
+                f = root.namelist()
             if len(f):
                 d = csv.DictReader(io.TextIOWrapper(root.open(f[0]), 'utf-8'))
             else:
                 d = []
             return d
 
+    def _read_export(self, url, query_params, factory):
+        records = self.request_csv(url, query_params)
+        with self.instrumentation.phase('parse', endpoint=endpoint(url)) as p:
+            rows = list(records)
+            p.count('rows', len(rows))
+        with self.instrumentation.phase(
+                'construct', endpoint=endpoint(url)) as p:
+            data = [factory(row) for row in rows]
+            p.count('objects', len(data))
+        return data
+
     def get_current_annotator(self):
         url = f"{self.api_url}/{self.endpoints['annotators']}/me/"
         return Annotator(**self.get(url))
@@ -178,50 +224,55 @@ class LinalgoClient:
         }
         api_url = "{}/{}/".format(
             self.api_url, self.endpoints['documents-export'])
-        records = self.request_csv(api_url, query_params)
-        data = [Document.from_dict(row) for row in records]
-        return data
+        return self._read_export(api_url, query_params, Document.from_dict)
 
     def get_task_annotations(self, task_id):
         query_params = {'task_id': task_id, 'output_format': 'zip'}
         api_url = "{}/{}/".format(
             self.api_url, self.endpoints['annotations-export'])
-        records = self.request_csv(api_url, query_params)
-        data = [Annotation.from_dict(row) for row in records]
-        return data
+        return self._read_export(api_url, query_params, Annotation.from_dict)
 
     def get_task(self, task_id, verbose=False, lazy=False):
+        """
+        Retrieve a task with its annotators, entities, documents and
+        annotations
+
+        Each step is reported to `instrumentation` as a `get_task` phase.
+        If `verbose`, the timings and counts of each step are printed as
+        they complete.
+        """
         task_url = "{}/{}/{}/".format(
             self.api_url, self.endpoints['task'], task_id)
-        if verbose:
-            print(f'Retrivieving task with id {task_id}...')
-        task_json = self.get(task_url)
-        task = Task.from_dict(task_json)
+
+        @contextmanager
+        def phase(step):
+            with self.instrumentation.phase('get_task', step=step) as event:
+                yield event
+            if verbose:
+                print(event)
+
+        with phase('task') as p:
+            task = Task.from_dict(self.get(task_url))
+            p.count('objects', 1)
         if lazy:
             return task
-        if verbose:
-            print('Retrieving annotators...', end=' ')
-        task.annotators = self.get_annotators(task)
-        if verbose:
-            print(f'({len(task.annotators)} found)')
-        if verbose:
-            print('Retrieving entities...', end=' ')
-        params = {'tasks': task.id, 'page_size': 1000}
-        if verbose:
-            print(f'({len(task.entities)} found)')
-        entities_url = "{}/{}".format(self.api_url, self.endpoints['entities'])
-        entities_json = self.get(entities_url, params)
-        task.entities = [Entity.from_dict(e) for e in entities_json['results']]
-        if verbose:
-            print('Retrieving documents...', end=' ')
-        task.documents = self.get_task_documents(task_id)
-        if verbose:
-            print(f'({len(task.documents)} found)')
-        if verbose:
-            print('Retrieving annotations...', end=' ')
-        task.annotations = self.get_task_annotations(task_id)
-        if verbose:
-            print(f'({len(task.annotations)} found)')
+        with phase('annotators') as p:
+            task.annotators = self.get_annotators(task)
+            p.count('objects', len(task.annotators))
+        with phase('entities') as p:
+            params = {'tasks': task.id, 'page_size': 1000}
+            entities_url = "{}/{}".format(
+                self.api_url, self.endpoints['entities'])
+            entities_json = self.get(entities_url, params)
+            task.entities = [
+                Entity.from_dict(e) for e in entities_json['results']]
+            p.count('objects', len(task.entities))
+        with phase('documents') as p:
+            task.documents = self.get_task_documents(task_id)
+            p.count('objects', len(task.documents))
+        with phase('annotations') as p:
+            task.annotations = self.get_task_annotations(task_id)
+            p.count('objects', len(task.annotations))
         n = len([a for d in task.documents for a in d.annotations])
         if len(task.annotations) != n:
             warnings.warn('Some annotations have no associated document.')
@@ -273,13 +324,48 @@ class LinalgoClient:
     def delete_annotations(self, annotations):
         url = "{}/{}/bulk_delete/".format(self.api_url,
                                           self.endpoints['annotations'])
-        headers = {'Authorization': f"Token {self.access_token}"}
-        annotations_ids = [annotation.id for annotation in annotations]
-        res = requests.delete(url, json=annotations_ids, headers=headers)
+        annotations_ids = [_id(annotation) for annotation in annotations]
+        res = self.request('DELETE', url, json=annotations_ids)
         if res.status_code != 204:
             raise Exception(res.content)
         return res
 
+    def push_changes(self, snapshot: Snapshot, annotations, batch_size=1000):
+        """
+        Push the annotations that changed since a snapshot
+
+        Only added, removed and modified annotations are sent. Modified
+        annotations are deleted and created again.
+
+        Parameters
+        ----------
+        snapshot: Snapshot
+            The state of the annotations on the hub, e.g. taken after
+            `get_task` or returned by the previous call
+        annotations: Iterable[Annotation]
+            The current annotations, e.g. `task.annotations` after edits
+        batch_size: int
+            Number of annotations per upload
+
+        Returns
+        -------
+        Tuple[AnnotationDiff, Snapshot]
+            The changes pushed and the new state of the hub
+        """
+        annotations = list(annotations)
+        current = Snapshot(annotations)
+        changes = snapshot.diff(current)
+        stale = changes.removed | changes.modified
+        if len(stale) > 0:
+            self.delete_annotations(sorted(stale))
+        changed = changes.added | changes.modified
+        for batch in batched(
+                (a for a in annotations if a.id in changed), batch_size):
+            res = self.create_annotations(batch)
+            if not 200 <= res.status_code < 300:
+                raise Exception(res.content)
+        return changes, current
+
     def assign(
         self,
         document: Document,
@@ -301,11 +387,126 @@ class LinalgoClient:
         return res
 
     def unassign(self, status_id):
-        headers = {'Authorization': f"Token {self.access_token}"}
         url = f"{self.api_url}/document-status/{status_id}/"
-        res = requests.delete(url, headers=headers)
+        res = self.request('DELETE', url)
         return res
 
+    def _bulk(self, name, method, url, payload):
+        """
+        Call a bulk endpoint. Returns None if the hub does not provide it,
+        in which case it is not tried again.
+        """
+        if self._bulk_endpoints.get(name) is False:
+            return None
+        res = self.request(method, url, json=payload)
+        if res.status_code in (404, 405):
+            self._bulk_endpoints[name] = False
+            return None
+        self._bulk_endpoints[name] = True
+        return res
+
+    @staticmethod
+    def _run_each(fn, items, workers):
+        # `fn` returns the response whatever its status, so that the status
+        # of failures is recorded too
+        def run(item):
+            try:
+                res = fn(item)
+            except Exception as e:
+                return {'item': item, 'status': None, 'error': str(e)}
+            error = None
+            if not 200 <= res.status_code < 300:
+                error = f"Request returned status {res.status_code}, " \
+                        f"{res.content}"
+            return {'item': item, 'status': res.status_code, 'error': error}
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run, items))
+
+    def _run_many(self, name, method, url, items, payload, fn, batch_size,
+                  workers):
+        results = []
+        for batch in batched(items, batch_size):
+            res = self._bulk(name, method, url, [payload(i) for i in batch])
+            if res is not None and 200 <= res.status_code < 300:
+                results.extend({'item': i, 'status': res.status_code,
+                                'error': None} for i in batch)
+            else:
+                # no bulk endpoint, or a rejected batch: isolate failures
+                results.extend(self._run_each(fn, batch, workers))
+        return results
+
+    def assign_many(self, assignments, batch_size=1000, workers=8):
+        """
+        Assign many documents at once
+
+        The hub bulk endpoint is used when available. Otherwise, or when a
+        batch is rejected, documents are assigned one by one by a pool of
+        `workers` threads.
+
+        Parameters
+        ----------
+        assignments: Iterable[Tuple]
+            (document, annotator, task, type, reviewee) tuples of objects
+            or ids, e.g. the output of `Scheduler.plan`. `type` defaults to
+            `AssignmentType.LABEL` and `reviewee` to None.
+        batch_size: int
+            Number of assignments per bulk request
+        workers: int
+            Number of concurrent requests when assigning one by one
+
+        Returns
+        -------
+        List[Dict]
+            The `item`, HTTP `status` (None without a response) and `error`
+            (None on success) of each assignment, in order
+        """
+        def payload(item):
+            document, annotator, task, *rest = item
+            assignment_type = rest[0] if len(rest) > 0 else None
+            assignment_type = getattr(assignment_type, 'value',
+                                      assignment_type)
+            reviewee = rest[1] if len(rest) > 1 else None
+            return {
+                'status': AssignmentStatus.ASSIGNED.value,
+                'type': assignment_type or AssignmentType.LABEL.value,
+                'document': _id(document),
+                'annotator': _id(annotator),
+                'task': _id(task),
+                'reviewee': _id(reviewee)
+            }
+
+        def assign(item):
+            return self.request('POST', self.api_url + '/document-status/',
+                                data=payload(item))
+
+        url = f"{self.api_url}/document-status/bulk_create/"
+        return self._run_many('assign', 'POST', url, assignments, payload,
+                              assign, batch_size, workers)
+
+    def unassign_many(self, status_ids, batch_size=1000, workers=8):
+        """
+        Delete many assignments at once
+
+        Parameters
+        ----------
+        status_ids: Iterable[str]
+            The ids of the `document-status` records to delete
+        batch_size: int
+            Number of ids per bulk request
+        workers: int
+            Number of concurrent requests when deleting one by one
+
+        Returns
+        -------
+        List[Dict]
+            The `item`, HTTP `status` (None without a response) and `error`
+            (None on success) of each id, in order
+        """
+        url = f"{self.api_url}/document-status/bulk_delete/"
+        return self._run_many('unassign', 'DELETE', url, status_ids, _id,
+                              self.unassign, batch_size, workers)
+
     def get_schedule(self, task):
         query_params = {'task': task.id, 'page_size': 1000}
         schedules = []
@@ -316,6 +517,78 @@ class LinalgoClient:
             schedules.extend(Schedule(**s) for s in res['results'])
         return schedules
 
+    def iter_schedule_pages(self, task, page_size=1000, prefetch=2):
+        """
+        Iterate over the pages of `document-status` records of a task
+
+        The next pages are fetched in a background thread while the
+        current one is processed.
+
+        Parameters
+        ----------
+        task: Task
+            The task to get the schedule of
+        page_size: int
+            Number of records per page
+        prefetch: int
+            Maximum number of pages fetched ahead
+        """
+        pages = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+
+        def fetch():
+            query_params = {'task': task.id, 'page_size': page_size}
+            next_url = f"{self.api_url}/document-status/"
+            try:
+                while next_url and not stop.is_set():
+                    res = self.get(next_url, query_params=query_params)
+                    # the next url already holds the query parameters
+                    next_url, query_params = res['next'], {}
+                    pages.put(res['results'])
+            except Exception as e:
+                pages.put(e)
+            pages.put(None)
+
+        thread = threading.Thread(target=fetch, daemon=True)
+        thread.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is None:
+                    return
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            stop.set()
+            while thread.is_alive():
+                try:
+                    pages.get(timeout=.1)
+                except queue.Empty:
+                    pass
+
+    def get_schedule_columns(self, task, page_size=1000, prefetch=2):
+        """
+        Get the schedule of a task as typed arrays, without creating a
+        `Schedule` object per record
+
+        Parameters
+        ----------
+        task: Task
+            The task to get the schedule of
+        page_size: int
+            Number of records per page
+        prefetch: int
+            Maximum number of pages fetched ahead
+
+        Returns
+        -------
+        ScheduleColumns
+        """
+        from linalgo.hub.columnar import ScheduleColumns
+        pages = self.iter_schedule_pages(task, page_size, prefetch)
+        return ScheduleColumns.from_pages(pages)
+
     def add_document(self, doc: Document, corpus: Corpus):
         url = f"{self.api_url}/corpora/{corpus.id}/add_document/"
         payload = DocumentSerializer(doc).serialize()
@@ -327,4 +600,20 @@ class LinalgoClient:
         return self.post(url, data={'document': doc.id})
 
 
+def _id(obj):
+    return getattr(obj, 'id', obj)
+
+
+def _body_size(request):
+    body = getattr(request, 'body', None)
+    if body is None:
+        return 0
+    return len(body.encode('utf-8') if isinstance(body, str) else body)
+
+
+def _retries(res):
+    retries = getattr(getattr(res, 'raw', None), 'retries', None)
+    return len(getattr(retries, 'history', None) or ())
+
+
 __all__ = ['LinalgoClient']
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""Columnar representation of a task schedule."""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from linalgo.annotate.models import DocumentStatus, ScheduleType
+
+
+def _timestamp(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return 'NaT'
+    if isinstance(value, str):
+        if value.endswith('Z'):
+            return value[:-1]
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_timestamps(values: Iterable) -> np.ndarray:
+    """
+    Convert ISO 8601 strings or datetimes to a `datetime64[us]` array in
+    UTC. Missing values become NaT.
+
+    A column of strings is parsed by numpy at once. Only values with a UTC
+    offset other than `Z`, and columns of other types, are converted one
+    by one.
+    """
+    if not isinstance(values, np.ndarray):
+        values = np.asarray(list(values))
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[us]')
+    if values.dtype.kind != 'U':
+        return np.array([_timestamp(v) for v in values.tolist()],
+                        dtype='datetime64[us]')
+    values = np.char.rstrip(values, 'Z')
+    # a sign after the date starts a UTC offset
+    offset = (np.char.find(values, '+', 10) >= 0) | \
+        (np.char.find(values, '-', 10) >= 0)
+    if not offset.any():
+        return values.astype('datetime64[us]')
+    parsed = np.empty(len(values), dtype='datetime64[us]')
+    parsed[~offset] = values[~offset].astype('datetime64[us]')
+    parsed[offset] = np.array(
+        [_timestamp(v) for v in values[offset].tolist()],
+        dtype='datetime64[us]')
+    return parsed
+
+
+class _Categories:
+
+    def __init__(self):
+        self.index = {}
+
+    def encode(self, values: Iterable) -> np.ndarray:
+        index = self.index
+        return np.array([index.setdefault(v, len(index)) for v in values],
+                        dtype=np.int32)
+
+    def categories(self) -> np.ndarray:
+        categories = np.empty(len(self.index), dtype=object)
+        categories[:] = list(self.index)
+        return categories
+
+
+class ScheduleColumns:
+    """
+    A schedule stored as typed arrays.
+
+    Ids are dictionary-encoded: `codes[name]` holds integer codes into
+    `categories[name]`. Statuses and types are encoded by their position
+    in `DocumentStatus` and `ScheduleType`, timestamps are
+    `datetime64[us]` in UTC and priorities are floats.
+
+    Indexing with a column name returns the decoded column, so that a
+    `ScheduleColumns` can be used where a `pd.DataFrame` is expected.
+    """
+
+    categorical = ('id', 'document', 'annotator', 'task', 'reviewee')
+    fields = categorical + ('status', 'type', 'priority', 'timestamp')
+    statuses = np.array([s.value for s in DocumentStatus], dtype=object)
+    types = np.array([t.value for t in ScheduleType], dtype=object)
+
+    def __init__(self, codes: Dict[str, np.ndarray],
+                 categories: Dict[str, np.ndarray], status: np.ndarray,
+                 type: np.ndarray, priority: np.ndarray,
+                 timestamp: np.ndarray):
+        self.codes = codes
+        self.categories = categories
+        self.status = status
+        self.type = type
+        self.priority = priority
+        self.timestamp = timestamp
+
+    def __len__(self):
+        return len(self.status)
+
+    def __repr__(self):
+        return f'ScheduleColumns::{len(self)} rows'
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name in self.categorical:
+            return self.categories[name][self.codes[name]]
+        if name == 'status':
+            return self.statuses[self.status]
+        if name == 'type':
+            return self.types[self.type]
+        if name == 'priority':
+            return self.priority
+        if name == 'timestamp':
+            return self.timestamp
+        raise KeyError(name)
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[List[Dict]]) -> 'ScheduleColumns':
+        """
+        Build the columns from pages of `document-status` records, one
+        page at a time
+
+        Parameters
+        ----------
+        pages: Iterable[List[Dict]]
+            Pages of records, e.g. from `LinalgoClient.iter_schedule_pages`
+        """
+        return cls.from_chunks(
+            {name: [r.get(name) for r in page] for name in cls.fields}
+            for page in pages)
+
+    @classmethod
+    def from_frame(cls, frame) -> 'ScheduleColumns':
+        """Build the columns from a `pd.DataFrame` or a dict of columns."""
+        n = len(frame[next(iter(frame.keys()))])
+        return cls.from_chunks([{
+            name: list(frame[name]) if name in frame.keys()
+            else [None] * n for name in cls.fields
+        }])
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Dict[str, List]]):
+        """
+        Build the columns from chunks of rows, each chunk being a dict
+        mapping the names in `fields` to lists of values
+        """
+        categories = {name: _Categories() for name in cls.categorical}
+        status_codes = {s: i for i, s in enumerate(cls.statuses)}
+        type_codes = {t: i for i, t in enumerate(cls.types)}
+        default_type = type_codes[ScheduleType.Annotate.value]
+        arrays = {name: [] for name in cls.fields}
+        for chunk in chunks:
+            for name in cls.categorical:
+                arrays[name].append(categories[name].encode(chunk[name]))
+            arrays['status'].append(np.array(
+                [status_codes[s] for s in chunk['status']], dtype=np.uint8))
+            arrays['type'].append(np.array(
+                [default_type if t is None else type_codes[t]
+                 for t in chunk['type']], dtype=np.uint8))
+            arrays['priority'].append(np.array(
+                [np.nan if p is None else p for p in chunk['priority']],
+                dtype=np.float64))
+            arrays['timestamp'].append(parse_timestamps(chunk['timestamp']))
+        dtypes = {'status': np.uint8, 'type': np.uint8,
+                  'priority': np.float64, 'timestamp': 'datetime64[us]'}
+        for name, chunk in arrays.items():
+            arrays[name] = np.concatenate(chunk) if chunk else \
+                np.empty(0, dtype=dtypes.get(name, np.int32))
+        return cls(
+            codes={name: arrays[name] for name in cls.categorical},
+            categories={name: categories[name].categories()
+                        for name in cls.categorical},
+            status=arrays['status'],
+            type=arrays['type'],
+            priority=arrays['priority'],
+            timestamp=arrays['timestamp'],
+        )
+
+
+__all__ = ['ScheduleColumns', 'parse_timestamps']
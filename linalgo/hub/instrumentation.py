@@ -0,0 +1,260 @@
+"""Timings and counters of the requests made by `LinalgoClient`."""
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import re
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+
+
+_ID = re.compile(r'^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-'
+                 r'[0-9a-f]{12}|\d+)$', re.IGNORECASE)
+
+
+def endpoint(url: str) -> str:
+    """The path of a url with ids replaced by `{id}`."""
+    parts = urlsplit(url).path.strip('/').split('/')
+    return '/'.join('{id}' if _ID.match(p) else p for p in parts if p)
+
+
+class RequestEvent:
+    """
+    A request sent to the hub.
+
+    `connect` is the time until the response headers are received, which
+    includes DNS resolution, connection and server time. `download` is the
+    time spent reading the body.
+    """
+
+    def __init__(self, method: str, url: str, status: int = None,
+                 bytes_out: int = 0, bytes_in: int = 0, connect: float = 0.,
+                 download: float = 0., retries: int = 0, error: str = None):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint(url)
+        self.status = status
+        self.bytes_out = bytes_out
+        self.bytes_in = bytes_in
+        self.connect = connect
+        self.download = download
+        self.retries = retries
+        self.error = error
+
+    @property
+    def latency(self):
+        return self.connect + self.download
+
+    def __repr__(self):
+        return f'RequestEvent::{self.method} {self.endpoint} {self.status}'
+
+
+class PhaseEvent:
+    """
+    A step of a client call, e.g. parsing an export or creating models.
+
+    `counts` holds what the step processed, e.g. `rows` or `objects`.
+    """
+
+    def __init__(self, name: str, labels: Dict = None):
+        self.name = name
+        self.labels = labels or {}
+        self.counts = {}
+        self.seconds = 0.
+
+    def count(self, name: str, n: int):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def __repr__(self):
+        return f'PhaseEvent::{self.name}'
+
+    def __str__(self):
+        fields = [f'{k}={v}' for k, v in self.labels.items()]
+        fields += [f'{k}={v}' for k, v in self.counts.items()]
+        return ' '.join([self.name, f'seconds={self.seconds:.3f}'] + fields)
+
+
+class Instrumentation:
+    """
+    Receive the requests and phases of a `LinalgoClient`.
+
+    The base class does nothing. Subclasses override `on_request` and
+    `on_phase`, which may be called from several threads.
+    """
+
+    def on_request(self, event: RequestEvent):
+        pass
+
+    def on_phase(self, event: PhaseEvent):
+        pass
+
+    @contextmanager
+    def phase(self, name: str, **labels):
+        """Time the body of a `with` block and report it to `on_phase`."""
+        event = PhaseEvent(name, labels)
+        start = time.perf_counter()
+        try:
+            yield event
+        finally:
+            event.seconds = time.perf_counter() - start
+            self.on_phase(event)
+
+
+class MetricsCollector(Instrumentation):
+    """
+    Aggregate requests and phases in memory.
+
+    Parameters
+    ----------
+    buckets: Tuple[float]
+        Upper bounds, in seconds, of the latency histogram
+    history: int
+        Number of most recent events kept in `events`
+    """
+
+    buckets = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30.)
+
+    def __init__(self, buckets=None, history=1000):
+        if buckets is not None:
+            self.buckets = tuple(buckets)
+        self.events = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.request_seconds = defaultdict(float)
+            self.connect_seconds = defaultdict(float)
+            self.download_seconds = defaultdict(float)
+            self.request_buckets = defaultdict(
+                lambda: [0] * (len(self.buckets) + 1))
+            self.bytes_in = defaultdict(int)
+            self.bytes_out = defaultdict(int)
+            self.retries = defaultdict(int)
+            self.phases = defaultdict(int)
+            self.phase_seconds = defaultdict(float)
+            self.phase_counts = defaultdict(int)
+            self.events.clear()
+
+    def on_request(self, event: RequestEvent):
+        key = (event.method, event.endpoint)
+        status = 'error' if event.status is None else str(event.status)
+        bucket = sum(1 for b in self.buckets if event.latency > b)
+        with self._lock:
+            self.requests[key + (status,)] += 1
+            self.request_seconds[key] += event.latency
+            self.connect_seconds[key] += event.connect
+            self.download_seconds[key] += event.download
+            self.request_buckets[key][bucket] += 1
+            self.bytes_in[key] += event.bytes_in
+            self.bytes_out[key] += event.bytes_out
+            self.retries[key] += event.retries
+            self.events.append(event)
+
+    def on_phase(self, event: PhaseEvent):
+        key = (event.name,) + tuple(sorted(event.labels.items()))
+        with self._lock:
+            self.phases[key] += 1
+            self.phase_seconds[key] += event.seconds
+            for name, n in event.counts.items():
+                self.phase_counts[key + (('count', name),)] += n
+            self.events.append(event)
+
+    def summary(self):
+        """
+        Returns
+        -------
+        Dict[str, Dict]
+            Number of calls, total seconds and counts of each phase
+        """
+        with self._lock:
+            summary = {}
+            for key, n in self.phases.items():
+                name = ' '.join([key[0]] + [f'{k}={v}' for k, v in key[1:]])
+                summary[name] = {'calls': n,
+                                 'seconds': self.phase_seconds[key]}
+            for key, n in self.phase_counts.items():
+                name = ' '.join(
+                    [key[0]] + [f'{k}={v}' for k, v in key[1:-1]])
+                summary[name][key[-1][1]] = n
+            return summary
+
+    def to_prometheus(self, openmetrics=False) -> str:
+        """
+        Export the metrics in the Prometheus text format, or in the
+        OpenMetrics format if `openmetrics` is True
+        """
+        lines = []
+        suffix = '' if openmetrics else '_total'
+
+        def family(name, kind, help):
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def sample(name, labels, value):
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f'{name}{{{labels}}} {value}')
+
+        with self._lock:
+            family('linalgo_requests' + suffix, 'counter',
+                   'Requests sent to the hub.')
+            for (method, path, status), n in sorted(self.requests.items()):
+                sample('linalgo_requests_total', [
+                    ('method', method), ('endpoint', path),
+                    ('status', status)], n)
+            family('linalgo_request_seconds', 'histogram',
+                   'Request latency in seconds.')
+            for key in sorted(self.request_buckets):
+                labels = [('method', key[0]), ('endpoint', key[1])]
+                cumulative = 0
+                counts = self.request_buckets[key]
+                for bound, n in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += n
+                    sample('linalgo_request_seconds_bucket',
+                           labels + [('le', bound)], cumulative)
+                sample('linalgo_request_seconds_count', labels, cumulative)
+                sample('linalgo_request_seconds_sum', labels,
+                       self.request_seconds[key])
+            for name, values, help in (
+                    ('linalgo_request_connect_seconds', self.connect_seconds,
+                     'Time until the response headers were received.'),
+                    ('linalgo_request_download_seconds',
+                     self.download_seconds,
+                     'Time spent reading response bodies.'),
+                    ('linalgo_request_bytes_in', self.bytes_in,
+                     'Bytes received from the hub.'),
+                    ('linalgo_request_bytes_out', self.bytes_out,
+                     'Bytes sent to the hub.'),
+                    ('linalgo_request_retries', self.retries,
+                     'Requests retried by the transport.')):
+                family(name + suffix, 'counter', help)
+                for (method, path), n in sorted(values.items()):
+                    sample(name + '_total',
+                           [('method', method), ('endpoint', path)], n)
+            family('linalgo_phase_seconds', 'summary',
+                   'Time spent in each phase of a client call.')
+            for key in sorted(self.phases):
+                labels = [('phase', key[0])] + list(key[1:])
+                sample('linalgo_phase_seconds_count', labels,
+                       self.phases[key])
+                sample('linalgo_phase_seconds_sum', labels,
+                       self.phase_seconds[key])
+            family('linalgo_phase_items' + suffix, 'counter',
+                   'Rows parsed and objects created in each phase.')
+            for key, n in sorted(self.phase_counts.items()):
+                labels = [('phase', key[0])] + list(key[1:-1])
+                sample('linalgo_phase_items_total',
+                       labels + [('item', key[-1][1])], n)
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+__all__ = ['Instrumentation', 'MetricsCollector', 'PhaseEvent',
+           'RequestEvent', 'endpoint']
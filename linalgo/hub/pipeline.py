@@ -0,0 +1,347 @@
+"""Run pre-annotation as a pipeline of concurrent, batched stages."""
+from collections import deque
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+
+from linalgo.annotate.models import Annotator, Document
+
+
+_DONE = object()
+
+
+class StageStats:
+    """Throughput and latency of a pipeline stage."""
+
+    def __init__(self, name: str, sample_size=1024):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.batches = 0
+        self.busy = 0.
+        self.idle = 0.
+        self.blocked = 0.
+        self.started = None
+        self.finished = None
+        self.latencies = deque(maxlen=sample_size)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'StageStats::{self.name}'
+
+    def record(self, n_in, n_out, latency, idle, blocked):
+        with self._lock:
+            self.items_in += n_in
+            self.items_out += n_out
+            self.batches += 1
+            self.busy += latency
+            self.idle += idle
+            self.blocked += blocked
+            self.latencies.append(latency)
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self):
+        """
+        Returns
+        -------
+        Dict
+            `throughput` is in items per second of wall time. Latencies are
+            per batch, in seconds, estimated on the most recent batches.
+            `idle` is the time spent waiting for input and `blocked` the
+            time spent waiting for the next stage (backpressure).
+        """
+        latencies = np.array(self.latencies)
+        if len(latencies) == 0:
+            latencies = np.zeros(1)
+        elapsed = self.elapsed
+        return {
+            'stage': self.name,
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'batches': self.batches,
+            'throughput': self.items_in / elapsed if elapsed > 0 else 0.,
+            'latency_mean': latencies.mean(),
+            'latency_p50': np.percentile(latencies, 50),
+            'latency_p95': np.percentile(latencies, 95),
+            'latency_max': latencies.max(),
+            'busy': self.busy,
+            'idle': self.idle,
+            'blocked': self.blocked,
+        }
+
+
+class Stage:
+    """
+    A step of a `Pipeline`.
+
+    Parameters
+    ----------
+    name: str
+        The name of the stage in the statistics
+    fn: Callable[[List], Iterable]
+        Called with a batch of input items. Its return value is the list of
+        items passed to the next stage. The return value of the last stage
+        is discarded.
+    batch_size: int
+        Maximum number of items per batch
+    concurrency: int
+        Number of threads running `fn`
+    max_wait: float
+        Maximum number of seconds to wait for a batch to fill up once it
+        received its first item
+    """
+
+    def __init__(self, name: str, fn: Callable[[List], Iterable],
+                 batch_size=100, concurrency=1, max_wait=1.):
+        self.name = name
+        self.fn = fn
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+
+    def __repr__(self):
+        return f'Stage::{self.name}'
+
+
+class Pipeline:
+    """
+    Connect a source of items and stages through bounded queues.
+
+    Each stage runs in its own threads, so that a slow stage (e.g. the
+    network) does not stop the others (e.g. the model). When a queue is
+    full, upstream stages block until it drains.
+
+    Parameters
+    ----------
+    source: Iterable
+        The items to process
+    stages: List[Stage]
+        The stages, in order
+    queue_size: int
+        Maximum number of items waiting between two stages
+    """
+
+    def __init__(self, source: Iterable, stages: List[Stage], queue_size=1000):
+        self.source = source
+        self.stages = stages
+        self.queue_size = queue_size
+        self.stats = {s.name: StageStats(s.name) for s in stages}
+        self.stats['source'] = StageStats('source')
+        self._stop = threading.Event()
+        self._errors = []
+
+    def _put(self, q, item):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=.1)
+                break
+            except queue.Full:
+                continue
+        return time.perf_counter() - start
+
+    def _get(self, q, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stop.is_set():
+            wait = .1
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return q.get_nowait()
+            try:
+                return q.get(timeout=wait)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _feed(self, q_out, n_consumers):
+        stats = self.stats['source']
+        stats.started = time.perf_counter()
+        try:
+            iterator = iter(self.source)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                latency = time.perf_counter() - start
+                blocked = self._put(q_out, item)
+                stats.record(1, 1, latency, 0., blocked)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            stats.finished = time.perf_counter()
+            for _ in range(n_consumers):
+                self._put(q_out, _DONE)
+
+    def _next_batch(self, stage, q_in):
+        batch = []
+        item = self._get(q_in)
+        if item is _DONE:
+            return batch, True
+        batch.append(item)
+        deadline = time.monotonic() + stage.max_wait
+        while len(batch) < stage.batch_size:
+            try:
+                item = self._get(q_in, max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _work(self, stage, q_in, q_out, n_consumers, remaining):
+        stats = self.stats[stage.name]
+        done = False
+        try:
+            while not done and not self._stop.is_set():
+                start = time.perf_counter()
+                batch, done = self._next_batch(stage, q_in)
+                if len(batch) == 0:
+                    break
+                idle = time.perf_counter() - start
+                start = time.perf_counter()
+                results = stage.fn(batch)
+                latency = time.perf_counter() - start
+                blocked, n_out = 0., 0
+                if q_out is not None:
+                    for item in results or []:
+                        blocked += self._put(q_out, item)
+                        n_out += 1
+                stats.record(len(batch), n_out, latency, idle, blocked)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            with remaining['lock']:
+                remaining['count'] -= 1
+                last = remaining['count'] == 0
+            if last:
+                stats.finished = time.perf_counter()
+                if q_out is not None:
+                    for _ in range(n_consumers):
+                        self._put(q_out, _DONE)
+
+    def _fail(self, error):
+        self._errors.append(error)
+        self._stop.set()
+
+    def run(self) -> Dict[str, StageStats]:
+        """
+        Process all items of the source
+
+        Returns
+        -------
+        Dict[str, StageStats]
+            The statistics of the source and of each stage
+
+        Raises
+        ------
+        Exception
+            The first exception raised by the source or a stage. The other
+            stages are stopped.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = [threading.Thread(
+            target=self._feed, args=(queues[0], self.stages[0].concurrency),
+            daemon=True)]
+        for i, stage in enumerate(self.stages):
+            q_out, n_consumers = None, 0
+            if i + 1 < len(self.stages):
+                q_out = queues[i + 1]
+                n_consumers = self.stages[i + 1].concurrency
+            remaining = {'count': stage.concurrency, 'lock': threading.Lock()}
+            self.stats[stage.name].started = time.perf_counter()
+            for _ in range(stage.concurrency):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[i], q_out, n_consumers, remaining),
+                    daemon=True))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if len(self._errors) > 0:
+            raise self._errors[0]
+        return self.stats
+
+
+def next_document_source(client, task_id: str, n: int = None):
+    """
+    Iterate over the documents returned by `LinalgoClient.get_next_document`
+
+    Parameters
+    ----------
+    client: LinalgoClient
+        The client used to fetch documents
+    task_id: str
+        The task to fetch documents from
+    n: int
+        Maximum number of documents. Stop when the hub has no more
+        documents to serve if None.
+    """
+    count = 0
+    while n is None or count < n:
+        document = client.get_next_document(task_id)
+        if document is None or document.content is None:
+            return
+        yield document
+        count += 1
+
+
+def preannotate(documents: Iterable[Document], annotator: Annotator, client,
+                batch_size=100, upload_batch_size=1000, model_workers=1,
+                upload_workers=2, queue_size=10000, max_wait=1.):
+    """
+    Annotate documents with a model and upload the annotations
+
+    Fetching, scoring and uploading run concurrently: while a batch of
+    annotations is uploaded, the next batches are being scored.
+
+    Parameters
+    ----------
+    documents: Iterable[Document]
+        The documents to annotate, e.g. `task.documents` or
+        `next_document_source(client, task.id)`
+    annotator: Annotator
+        The annotator holding the model
+    client: LinalgoClient
+        The client used to upload annotations
+    batch_size: int
+        Number of documents scored at once
+    upload_batch_size: int
+        Number of annotations uploaded at once
+    model_workers: int
+        Number of threads scoring documents
+    upload_workers: int
+        Number of concurrent uploads
+    queue_size: int
+        Maximum number of items waiting between two stages
+    max_wait: float
+        Maximum number of seconds waiting for a batch to fill up
+
+    Returns
+    -------
+    Dict[str, StageStats]
+    """
+    stages = [
+        Stage('predict', annotator.annotate_many, batch_size=batch_size,
+              concurrency=model_workers, max_wait=max_wait),
+        Stage('upload', client.create_annotations,
+              batch_size=upload_batch_size, concurrency=upload_workers,
+              max_wait=max_wait),
+    ]
+    return Pipeline(documents, stages, queue_size=queue_size).run()
+
+
+__all__ = ['Pipeline', 'Stage', 'StageStats', 'next_document_source',
+           'preannotate']
@@ -0,0 +1,272 @@
+"""Pick the documents to label next from model scores."""
+from typing import Iterable
+
+import numpy as np
+
+from linalgo.annotate.batching import batched
+
+
+def _scores(scores) -> np.ndarray:
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.ndim == 1 or (scores.ndim == 2 and scores.shape[1] >= 2):
+        return scores
+    raise ValueError('Scores should be a vector or a matrix with at least 2 '
+                     f'columns, got shape {scores.shape}.')
+
+
+def _probabilities(scores: np.ndarray, threshold=0.):
+    if scores.ndim == 1:
+        p = 1 / (1 + np.exp(-(scores - threshold)))
+        return np.stack([1 - p, p], axis=1)
+    if np.all(scores >= 0) and np.allclose(scores.sum(axis=1), 1):
+        return scores
+    z = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return z / z.sum(axis=1, keepdims=True)
+
+
+def uncertainty(scores, method='margin', threshold=0.):
+    """
+    Compute how uncertain a model is about each document
+
+    Parameters
+    ----------
+    scores: np.ndarray
+        Either a vector of decision values, the positive class being
+        predicted above `threshold`, or a (documents x classes) matrix of
+        probabilities or decision values
+    method: str, {'margin', 'entropy', 'least-confident'}
+        The uncertainty measure
+    threshold: float
+        The decision threshold of one-dimensional scores
+
+    Returns
+    -------
+    np.ndarray
+        One value per document, higher meaning more uncertain
+    """
+    scores = _scores(scores)
+    if method == 'margin':
+        if scores.ndim == 1:
+            return -np.abs(scores - threshold)
+        top = np.partition(scores, -2, axis=1)[:, -2:]
+        return top[:, 0] - top[:, 1]
+    p = _probabilities(scores, threshold)
+    if method == 'entropy':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return -np.nansum(p * np.log(p), axis=1)
+    if method == 'least-confident':
+        return 1 - p.max(axis=1)
+    raise NotImplementedError(f'{method} is not a valid method.')
+
+
+def predictions(scores, threshold=0.):
+    """The class predicted for each document."""
+    scores = _scores(scores)
+    if scores.ndim == 1:
+        return (scores >= threshold).astype(np.int64)
+    return scores.argmax(axis=1)
+
+
+class TopK:
+    """
+    Keep the `k` items with the largest values seen so far.
+
+    Each update costs time linear in the size of the batch, and memory
+    only depends on `k`.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.ids = np.empty(0, dtype=object)
+        self.values = np.empty(0, dtype=np.float64)
+        self.rows = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def update(self, ids, values, rows=None):
+        if self.k <= 0:
+            return self
+        ids = np.concatenate([self.ids, np.asarray(ids, dtype=object)])
+        values = np.concatenate([self.values, values])
+        if rows is not None:
+            rows = rows if self.rows is None else \
+                np.concatenate([self.rows, rows])
+        if len(values) > self.k:
+            keep = np.argpartition(values, -self.k)[-self.k:]
+            ids, values = ids[keep], values[keep]
+            rows = None if rows is None else rows[keep]
+        self.ids, self.values, self.rows = ids, values, rows
+        return self
+
+    def result(self):
+        """The ids, by decreasing value."""
+        return self.ids[np.argsort(-self.values, kind='stable')].tolist()
+
+
+class UncertaintySampler:
+    """
+    Select the unseen documents to label next.
+
+    Scores are consumed in batches with `update`, so millions of documents
+    can be ranked without a full sort.
+
+    Parameters
+    ----------
+    k: int
+        The number of documents to select
+    method: str, {'margin', 'entropy', 'least-confident'}
+        The uncertainty measure, see `uncertainty`
+    strategy: str, {'uncertain', 'stratified', 'diverse'}
+        'uncertain' selects the `k` most uncertain documents. 'stratified'
+        splits `k` evenly between predicted classes. 'diverse' keeps the
+        `oversample * k` most uncertain documents and selects `k` of them
+        far apart from each other in feature space.
+    threshold: float
+        The decision threshold of one-dimensional scores, e.g.
+        `Annotator.threshold`
+    exclude: set
+        Ids of documents that should not be selected, e.g. documents
+        already annotated
+    oversample: int
+        Candidates kept per selected document for the 'diverse' strategy
+    n_classes: int
+        The number of classes, for the 'stratified' strategy
+    random_state: int
+        Seed of the random number generator
+    """
+
+    def __init__(self, k: int, method='margin', strategy='uncertain',
+                 threshold=0., exclude=None, oversample=5, n_classes=2,
+                 random_state=None):
+        if strategy not in ('uncertain', 'stratified', 'diverse'):
+            raise NotImplementedError(f'{strategy} is not a valid strategy.')
+        self.k = k
+        self.method = method
+        self.strategy = strategy
+        self.threshold = threshold
+        self.exclude = exclude or set()
+        self.rng = np.random.default_rng(random_state)
+        if strategy == 'stratified':
+            per_class = int(np.ceil(k / n_classes))
+            self._strata = [TopK(per_class) for _ in range(n_classes)]
+        elif strategy == 'diverse':
+            self._top = TopK(k * oversample)
+        else:
+            self._top = TopK(k)
+
+    def update(self, ids, scores, features=None):
+        """
+        Add a batch of scored documents
+
+        Parameters
+        ----------
+        ids: Iterable[str]
+            The document ids
+        scores: np.ndarray
+            The model scores, see `uncertainty`
+        features: np.ndarray
+            (documents x features) matrix, required by the 'diverse'
+            strategy
+        """
+        ids = np.asarray(ids, dtype=object)
+        scores = _scores(scores)
+        keep = np.fromiter((i not in self.exclude for i in ids), dtype=bool,
+                           count=len(ids))
+        ids, scores = ids[keep], scores[keep]
+        # random jitter breaks ties between equally uncertain documents
+        values = uncertainty(scores, self.method, self.threshold)
+        values = values + self.rng.random(len(values)) * 1e-9
+        if self.strategy == 'stratified':
+            predicted = predictions(scores, self.threshold)
+            if len(predicted) > 0 and predicted.max() >= len(self._strata):
+                raise ValueError(
+                    f'Class {predicted.max()} is predicted but n_classes is '
+                    f'{len(self._strata)}.')
+            for label, stratum in enumerate(self._strata):
+                idx = predicted == label
+                stratum.update(ids[idx], values[idx])
+        elif self.strategy == 'diverse':
+            if features is None:
+                raise ValueError('The diverse strategy requires features.')
+            features = np.asarray(features, dtype=np.float64)[keep]
+            self._top.update(ids, values, features)
+        else:
+            self._top.update(ids, values)
+        return self
+
+    def select(self):
+        """
+        Returns
+        -------
+        List[str]
+            The ids of the selected documents
+        """
+        if self.strategy == 'stratified':
+            selected = [stratum.result() for stratum in self._strata]
+            # interleave strata so that truncating keeps them balanced
+            ids = []
+            for rank in range(max(len(s) for s in selected)):
+                ids.extend(s[rank] for s in selected if rank < len(s))
+            return ids[:self.k]
+        if self.strategy == 'diverse':
+            return self._farthest_points()
+        return self._top.result()
+
+    def _farthest_points(self):
+        top = self._top
+        if len(top) <= self.k:
+            return top.result()
+        order = np.argsort(-top.values, kind='stable')
+        ids, x = top.ids[order], top.rows[order]
+        chosen = [0]
+        distance = np.linalg.norm(x - x[0], axis=1)
+        while len(chosen) < self.k:
+            i = int(distance.argmax())
+            chosen.append(i)
+            distance = np.minimum(distance, np.linalg.norm(x - x[i], axis=1))
+        return ids[chosen].tolist()
+
+
+def annotation_scores(annotations: Iterable, batch_size=10000):
+    """
+    Turn scored annotations, e.g. from `Annotator.annotate_many`, into
+    (document ids, scores) batches for `UncertaintySampler.update`
+    """
+    for batch in batched(annotations, batch_size):
+        ids = [a.document.id for a in batch if a.score is not None]
+        scores = [a.score for a in batch if a.score is not None]
+        yield ids, np.array(scores, dtype=np.float64)
+
+
+def sample(batches: Iterable, k: int, scheduler=None, **kwargs):
+    """
+    Select the documents to label next
+
+    Parameters
+    ----------
+    batches: Iterable[Tuple]
+        (ids, scores) or (ids, scores, features) batches
+    k: int
+        The number of documents to select
+    scheduler: Scheduler
+        If provided, documents that already have annotations are skipped
+    kwargs:
+        Passed to `UncertaintySampler`
+
+    Returns
+    -------
+    List[str]
+        The ids of the selected documents, e.g. for `Scheduler.assign`
+    """
+    if scheduler is not None:
+        seen = set(scheduler.document_ids[scheduler.seen])
+        kwargs['exclude'] = seen | set(kwargs.get('exclude') or ())
+    sampler = UncertaintySampler(k, **kwargs)
+    for batch in batches:
+        sampler.update(*batch)
+    return sampler.select()
+
+
+__all__ = ['TopK', 'UncertaintySampler', 'annotation_scores', 'predictions',
+           'sample', 'uncertainty']
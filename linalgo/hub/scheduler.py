@@ -1,9 +1,12 @@
-import numpy as np
-
-from django.utils.dateparse import parse_datetime
+from collections import Counter, defaultdict
+import heapq
+import math
+import warnings
 
+import numpy as np
 
-from linalgo.hub.client import AssignmentStatus
+from linalgo.hub.client import AssignmentStatus, AssignmentType
+from linalgo.hub.columnar import ScheduleColumns, parse_timestamps
 
 
 class AnnotatorNotFound(Exception):
@@ -14,12 +17,143 @@ class NotEnoughReviews(Exception):
     pass
 
 
+class UnfilledSlots(UserWarning):
+    pass
+
+
 class Scheduler:
+    """
+    Pick documents to assign to annotators.
+
+    The schedule is indexed once: documents are grouped per annotator and
+    status, and documents that already have annotations are flagged in a
+    bitmap. Assignments issued by the scheduler update these indexes, so
+    that successive calls never hand the same document twice to an
+    annotator.
 
-    def __init__(self, task, schedule):
+    Parameters
+    ----------
+    task: Task
+        The task to schedule
+    schedule: ScheduleColumns
+        The current assignments, e.g. from
+        `LinalgoClient.get_schedule_columns`. A `pd.DataFrame` with
+        `document`, `annotator`, `status` and `timestamp` columns is
+        also accepted.
+    random_state: int
+        Seed of the random number generator
+    """
+
+    def __init__(self, task, schedule, random_state=None):
         self.task = task
+        if not isinstance(schedule, ScheduleColumns):
+            schedule = ScheduleColumns.from_frame(schedule)
         self.schedule = schedule
-        self.schedule['timestamp'] = schedule['timestamp'].apply(parse_datetime)
+        self.rng = np.random.default_rng(random_state)
+        self.annotator_ids = {a.id for a in task.annotators}
+        self.document_ids = np.array([doc.id for doc in task.documents],
+                                     dtype=object)
+        self.document_index = {d: i for i, d in enumerate(self.document_ids)}
+        self.seen = np.zeros(len(self.document_ids), dtype=bool)
+        for annotation in task.annotations:
+            self._mark_seen(annotation.document.id)
+        self._unseen = None
+        # documents assigned to or completed by at least one annotator
+        self.scheduled = np.zeros(len(self.document_ids), dtype=bool)
+        # annotator -> status -> {document: timestamp}
+        self.documents = defaultdict(lambda: defaultdict(dict))
+        # annotator -> documents assigned to or completed by the annotator
+        self._touched = defaultdict(set)
+        # group rows by (annotator, status) without visiting them one by one
+        annotators = schedule.codes['annotator']
+        order = np.lexsort((schedule.status, annotators))
+        keys = np.stack([annotators[order], schedule.status[order]], axis=1)
+        starts = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1))
+        bounds = zip(np.r_[0, starts + 1], np.r_[starts + 1, len(order)])
+        documents = schedule['document'][order]
+        timestamps = schedule.timestamp[order]
+        for start, end in bounds:
+            if start == end:
+                continue
+            annotator = schedule.categories['annotator'][keys[start, 0]]
+            status = schedule.statuses[keys[start, 1]]
+            self.documents[annotator][status].update(
+                zip(documents[start:end], timestamps[start:end]))
+            self._touched[annotator].update(documents[start:end])
+        for document in schedule.categories['document']:
+            self._mark_scheduled(document)
+
+    def _mark_seen(self, document_id):
+        idx = self.document_index.get(document_id)
+        if idx is not None and not self.seen[idx]:
+            self.seen[idx] = True
+            self._unseen = None
+
+    def _mark_scheduled(self, document_id):
+        idx = self.document_index.get(document_id)
+        if idx is not None:
+            self.scheduled[idx] = True
+
+    def _check_annotator(self, annotator_id):
+        if annotator_id not in self.annotator_ids:
+            raise AnnotatorNotFound(
+                '{} is not a known annotator'.format(annotator_id))
+
+    @property
+    def unseen(self):
+        """Indices of the documents without annotations."""
+        if self._unseen is None:
+            self._unseen = np.flatnonzero(~self.seen)
+        return self._unseen
+
+    def annotator_documents(self, annotator_id):
+        """
+        The documents assigned to or completed by an annotator
+
+        The set is kept up to date by the scheduler and returned without a
+        copy: it should not be modified.
+        """
+        return self._touched[annotator_id]
+
+    def _sample(self, candidates, exclude, n):
+        """
+        Draw `n` distinct document ids among the `candidates` indices that
+        are not in `exclude`. When the pool is large compared to `n`, indices
+        are drawn with rejection so that the cost is proportional to `n`.
+        """
+        if n > len(candidates):
+            raise NotEnoughReviews()
+        if 2 * (n + len(exclude)) <= len(candidates):
+            chosen = set()
+            while len(chosen) < n:
+                draws = self.rng.choice(candidates, size=2 * (n - len(chosen)))
+                for doc in self.document_ids[draws]:
+                    if doc not in exclude and len(chosen) < n:
+                        chosen.add(doc)
+            return chosen
+        pool = self.document_ids[candidates]
+        pool = pool[[doc not in exclude for doc in pool]]
+        if n > len(pool):
+            raise NotEnoughReviews()
+        return set(self.rng.choice(pool, size=n, replace=False))
+
+    def assign(self, annotator_id, documents, timestamp=None):
+        """Record that `documents` were assigned to an annotator."""
+        assigned = self.documents[annotator_id][AssignmentStatus.ASSIGNED.value]
+        touched = self._touched[annotator_id]
+        for document in documents:
+            assigned[document] = timestamp
+            touched.add(document)
+            self._mark_scheduled(document)
+
+    def complete(self, annotator_id, document, timestamp=None):
+        """Record that an annotator completed a document."""
+        documents = self.documents[annotator_id]
+        documents[AssignmentStatus.ASSIGNED.value].pop(document, None)
+        documents[AssignmentStatus.COMPLETED.value][document] = timestamp
+        self._touched[annotator_id].add(document)
+        self._mark_seen(document)
+        self._mark_scheduled(document)
 
     def unseen_documents(self, n):
         """
@@ -29,18 +163,10 @@ class Scheduler:
         n: int
             Number of unseen documents to return
         """
-        annotated_docs = set(
-            annotation.to_json()['document'] for annotation in self.task.annotations)
-        docs = set(doc.id for doc in self.task.documents)
-        new_docs = list(docs - annotated_docs)
-
-        if len(new_docs) < n:
-            raise NotEnoughReviews()
-
-        return set(np.random.choice(new_docs, size=n, replace=False))
+        return self._sample(self.unseen, set(), n)
 
     def random_review(self, reviewer_id, reviewee_id, n=None, start_date=None,
-                      end_date=None):
+                      end_date=None, record=False):
         """
         Parameters
         ----------
@@ -53,41 +179,39 @@ class Scheduler:
         start_date:
             Filter reviewee annotations after `start_date`
         end_date:
-            Filters reviewee annotations after `end_date`
+            Filters reviewee annotations before `end_date`
+        record: bool
+            Mark the returned documents as assigned to the reviewer
 
         Return
         ------
         A set of documents to review
         """
-        schedule = self.schedule
-        if start_date is not None:
-            idx = (schedule['annotator'] == reviewee_id) & schedule['timestamp']
-            schedule = schedule[idx]
-        if end_date is not None:
-            idx = (schedule['annotator'] == reviewee_id) & schedule['timestamp']
-            schedule = schedule[idx]
-        if (reviewer_id not in {a.id for a in self.task.annotators} or
-            reviewee_id not in {a.id for a in self.task.annotators}):
-            raise AnnotatorNotFound()
-        reviewer_idx = schedule['annotator'] == reviewer_id
-        reviewee_idx = schedule['annotator'] == reviewee_id
-        seen_idx = schedule['status'] == AssignmentStatus.COMPLETED.value
-        pending_idx = schedule['status'] == AssignmentStatus.ASSIGNED.value
-
-        idx = reviewer_idx & (seen_idx | pending_idx)
-        reviewer_docs = set(schedule.loc[idx, 'document'])
-        idx = reviewee_idx & seen_idx
-        reviewee_docs = set(schedule.loc[idx, 'document'])
-
-        pool = list(reviewee_docs - reviewer_docs)
+        self._check_annotator(reviewer_id)
+        self._check_annotator(reviewee_id)
+        completed = self.documents[reviewee_id][
+            AssignmentStatus.COMPLETED.value]
+        reviewer_docs = self.annotator_documents(reviewer_id)
+        pool = [doc for doc in completed if doc not in reviewer_docs]
+        if start_date is not None or end_date is not None:
+            timestamps = np.array([completed[doc] for doc in pool],
+                                  dtype='datetime64[us]')
+            keep = np.ones(len(pool), dtype=bool)
+            if start_date is not None:
+                keep &= timestamps >= parse_timestamps([start_date])[0]
+            if end_date is not None:
+                keep &= timestamps <= parse_timestamps([end_date])[0]
+            pool = [doc for doc, k in zip(pool, keep) if k]
         if n is not None:
             if n > len(pool):
-                print(pool)
                 raise NotEnoughReviews()
-            return set(np.random.choice(pool, size=n, replace=False))
+            pool = {pool[i] for i in
+                    self.rng.choice(len(pool), size=n, replace=False)}
+        if record:
+            self.assign(reviewer_id, pool)
         return pool
 
-    def random_assign(self, assignee_id, n):
+    def random_assign(self, assignee_id, n, record=False):
         """
 
         Parameters
@@ -97,32 +221,301 @@ class Scheduler:
             The uuid of the annotator
         n: int
             the number of documents
+        record: bool
+            Mark the returned documents as assigned to the annotator
 
         Return
         ------
         A set of documents to assign
         """
+        self._check_annotator(assignee_id)
+        docs = self._sample(
+            self.unseen, self.annotator_documents(assignee_id), n)
+        if record:
+            self.assign(assignee_id, docs)
+        return docs
 
-        if assignee_id not in {a.id for a in self.task.annotators}:
-            raise AnnotatorNotFound(
-                '{} is not a known annotator'.format(assignee_id))
+    def _plan_labels(self, annotators, slots, overlap):
+        """Give each fresh document to `overlap` distinct annotators."""
+        order = self.rng.permutation(len(annotators))
+        annotators, slots = annotators[order], slots[order]
+        # Round-robin over the annotators with remaining slots, always in
+        # the same order, so that consecutive slots belong to different
+        # annotators as long as enough of them are still active.
+        owner = np.repeat(np.arange(len(annotators)), slots)
+        rank = np.concatenate([np.arange(n) for n in slots] + [[]])
+        sequence = owner[np.lexsort((owner, rank))]
+        fresh = np.flatnonzero(~self.seen & ~self.scheduled)
+        n_docs = min(len(fresh), len(sequence) // overlap)
+        groups = sequence[:n_docs * overlap].reshape(n_docs, overlap)
+        ordered = np.sort(groups, axis=1)
+        distinct = (np.diff(ordered, axis=1) != 0).all(axis=1)
+        groups = groups[distinct]
+        documents = self.document_ids[
+            self.rng.choice(fresh, size=len(groups), replace=False)]
+        return list(zip(np.repeat(documents, overlap).tolist(),
+                        annotators[groups].ravel().tolist()))
 
-        all_docs = set(doc.id for doc in self.task.documents)
-        all_seen_docs = set()
-        for annotation in self.task.annotations:
-            all_seen_docs.add(annotation.to_json()['document'])
-        all_new_docs = all_docs - all_seen_docs
+    def _plan_reviews(self, annotators, slots):
+        """Give each reviewer documents completed by other annotators."""
+        completed = AssignmentStatus.COMPLETED.value
+        pairs = [(doc, reviewee) for reviewee, docs in self.documents.items()
+                 for doc in docs[completed]]
+        if len(pairs) == 0 or slots.sum() == 0:
+            return []
+        index = {}
+        pair_doc = np.array([index.setdefault(doc, len(index))
+                             for doc, _ in pairs], dtype=np.int64)
+        doc_ids = np.empty(len(index), dtype=object)
+        doc_ids[:] = list(index)
+        # a document completed by several annotators is reviewed once, for
+        # one of them picked at random
+        order = self.rng.permutation(len(pairs))
+        first = order[np.unique(pair_doc[order], return_index=True)[1]]
+        reviewees = np.empty(len(index), dtype=object)
+        reviewees[:] = [pairs[j][1] for j in first]
+        taken = np.zeros(len(index), dtype=bool)
+        plan = []
+        for i in self.rng.permutation(len(annotators)):
+            annotator, n = annotators[i], int(slots[i])
+            if n == 0:
+                continue
+            # the documents of the reviewer include those they completed,
+            # so that nobody reviews themselves
+            eligible = ~taken
+            eligible[[index[doc] for doc in self.annotator_documents(annotator)
+                      if doc in index]] = False
+            candidates = np.flatnonzero(eligible)
+            chosen = self.rng.choice(candidates, size=min(n, len(candidates)),
+                                     replace=False)
+            taken[chosen] = True
+            plan.extend((doc, annotator, reviewee) for doc, reviewee in
+                        zip(doc_ids[chosen], reviewees[chosen]))
+        return plan
 
-        assignee_idx = self.schedule['annotator'] == assignee_id
-        seen_idx = self.schedule['status'] == AssignmentStatus.COMPLETED.value
-        pending_idx = self.schedule['status'] == AssignmentStatus.ASSIGNED.value
+    def plan(self, annotators, quota, review_ratio=0., overlap=1,
+             record=True):
+        """
+        Compute the assignments of a whole pool of annotators at once
 
-        idx = assignee_idx & (seen_idx | pending_idx)
-        assignee_docs = set(self.schedule.loc[idx, 'document'])
+        Labelling assignments go to documents that are neither annotated
+        nor scheduled yet, each to `overlap` distinct annotators. Review
+        assignments go to documents completed by another annotator that
+        the reviewer has never seen, and a document is reviewed at most
+        once per plan. When there are not enough documents, or not enough
+        distinct annotators for `overlap`, the plan is partial and an
+        `UnfilledSlots` warning gives the number of missing assignments per
+        annotator.
 
-        pool = list(all_new_docs - assignee_docs)
-        if n > len(pool):
-            print(pool)
-            raise NotEnoughReviews()
-        return set(np.random.choice(pool, size=n, replace=False))
+        Parameters
+        ----------
+        annotators: List[uuid]
+            The uuids of the annotators to plan for
+        quota: int or Dict[uuid, int]
+            The number of documents per annotator
+        review_ratio: float or Dict[uuid, float]
+            The fraction of the quota of an annotator spent on reviews
+        overlap: int
+            The number of annotators labelling each document
+        record: bool
+            Mark the planned documents as assigned
+
+        Return
+        ------
+        List[Tuple]
+            (document, annotator, task, type, reviewee) tuples of ids, as
+            accepted by `LinalgoClient.assign_many`
+        """
+        for annotator in annotators:
+            self._check_annotator(annotator)
+        annotators = np.array(list(annotators), dtype=object)
+        if not isinstance(quota, dict):
+            quota = {a: quota for a in annotators}
+        if not isinstance(review_ratio, dict):
+            review_ratio = {a: review_ratio for a in annotators}
+        quotas = np.array([quota.get(a, 0) for a in annotators])
+        ratios = np.array([review_ratio.get(a, 0.) for a in annotators])
+        reviews = np.round(quotas * ratios).astype(np.int64)
+        labels = quotas - reviews
+
+        plan = []
+        label_type = AssignmentType.LABEL.value
+        for doc, annotator in self._plan_labels(annotators, labels, overlap):
+            plan.append((doc, annotator, self.task.id, label_type, None))
+        review_type = AssignmentType.REVIEW.value
+        for doc, annotator, reviewee in self._plan_reviews(annotators,
+                                                           reviews):
+            plan.append((doc, annotator, self.task.id, review_type, reviewee))
+        planned = Counter(annotator for _, annotator, *_ in plan)
+        unfilled = {a: int(q) - planned[a] for a, q in zip(annotators, quotas)
+                    if planned[a] < q}
+        if len(unfilled) > 0:
+            warnings.warn(
+                f'{sum(unfilled.values())} slots could not be filled: '
+                f'{unfilled}', UnfilledSlots)
+        if record:
+            for doc, annotator, *_ in plan:
+                self.assign(annotator, [doc])
+        return plan
+
+
+def _epoch(timestamp):
+    if isinstance(timestamp, (int, float)) and timestamp == timestamp:
+        return float(timestamp)
+    timestamp = parse_timestamps([timestamp])[0]
+    if np.isnat(timestamp):
+        return math.inf
+    return timestamp.astype('datetime64[us]').astype(np.int64) / 1e6
+
+
+class PriorityScheduler:
+    """
+    Serve the pending documents of each annotator by priority.
+
+    Each annotator has a heap of documents keyed by priority (highest
+    first) and then age (oldest first). Ties are broken at random with a
+    seeded generator, so that the order is reproducible. Pushing, popping,
+    completing or reprioritizing a document costs O(log n) amortized.
+
+    The state can be saved with `to_dict` and restored with `from_dict`,
+    so that a long-lived service does not need to rebuild it from the
+    full schedule when it restarts.
+
+    Parameters
+    ----------
+    random_state: int
+        Seed of the random number generator used to break ties
+    """
+
+    _REMOVED = None
+
+    def __init__(self, random_state=None):
+        self.rng = np.random.default_rng(random_state)
+        self._heaps = defaultdict(list)
+        # (annotator, document) -> heap entry
+        self._entries = {}
+        # document -> annotators having it in their queue
+        self._holders = defaultdict(set)
+        self._counts = Counter()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f'PriorityScheduler::{len(self)} pending'
+
+    @classmethod
+    def from_schedule(cls, schedule, random_state=None):
+        """
+        Queue the documents assigned but not completed in a schedule
+
+        Parameters
+        ----------
+        schedule: ScheduleColumns
+            The assignments, or a `pd.DataFrame` with `document`,
+            `annotator`, `status`, `priority` and `timestamp` columns
+        random_state: int
+            Seed of the random number generator used to break ties
+        """
+        scheduler = cls(random_state=random_state)
+        if not isinstance(schedule, ScheduleColumns):
+            schedule = ScheduleColumns.from_frame(schedule)
+        assigned = schedule['status'] == AssignmentStatus.ASSIGNED.value
+        epochs = schedule.timestamp[assigned].astype(np.int64) / 1e6
+        epochs[np.isnat(schedule.timestamp[assigned])] = math.inf
+        for document, annotator, priority, epoch in zip(
+                schedule['document'][assigned], schedule['annotator'][assigned],
+                schedule.priority[assigned], epochs):
+            scheduler.push(annotator, document, priority, epoch)
+        return scheduler
+
+    def pending(self, annotator_id):
+        """Number of documents queued for an annotator."""
+        return self._counts[annotator_id]
+
+    def push(self, annotator_id, document_id, priority=0., timestamp=None):
+        """Queue a document, or update its priority if already queued."""
+        self._remove(annotator_id, document_id)
+        if priority is None or priority != priority:
+            priority = 0.
+        entry = [-float(priority), _epoch(timestamp), self.rng.random(),
+                 document_id, annotator_id]
+        self._entries[annotator_id, document_id] = entry
+        self._holders[document_id].add(annotator_id)
+        self._counts[annotator_id] += 1
+        heapq.heappush(self._heaps[annotator_id], entry)
+
+    def _remove(self, annotator_id, document_id):
+        entry = self._entries.pop((annotator_id, document_id), None)
+        if entry is None:
+            return False
+        entry[3] = self._REMOVED
+        self._counts[annotator_id] -= 1
+        holders = self._holders[document_id]
+        holders.discard(annotator_id)
+        if len(holders) == 0:
+            del self._holders[document_id]
+        # removed entries stay in the heap until they reach the top, rebuild
+        # it when they are the majority so that it does not grow unbounded
+        heap = self._heaps[annotator_id]
+        if 2 * (len(heap) - self._counts[annotator_id]) > len(heap):
+            heap[:] = [e for e in heap if e[3] is not self._REMOVED]
+            heapq.heapify(heap)
+        return True
+
+    def _prune(self, annotator_id):
+        heap = self._heaps[annotator_id]
+        while heap and heap[0][3] is self._REMOVED:
+            heapq.heappop(heap)
+        if not heap:
+            del self._heaps[annotator_id]
+        return heap
+
+    def peek(self, annotator_id):
+        """The next document of an annotator, or None."""
+        heap = self._prune(annotator_id)
+        return heap[0][3] if heap else None
+
+    def pop(self, annotator_id):
+        """Remove and return the next document of an annotator, or None."""
+        heap = self._prune(annotator_id)
+        if not heap:
+            return None
+        document_id = heap[0][3]
+        self._remove(annotator_id, document_id)
+        self._prune(annotator_id)
+        return document_id
+
+    def complete(self, annotator_id, document_id):
+        """Remove a document from the queue of an annotator."""
+        return self._remove(annotator_id, document_id)
+
+    def reprioritize(self, document_id, priority):
+        """Change the priority of a document in every queue holding it."""
+        for annotator_id in list(self._holders.get(document_id, ())):
+            timestamp = self._entries[annotator_id, document_id][1]
+            self.push(annotator_id, document_id, priority, timestamp)
+
+    def to_dict(self):
+        entries = [[-e[0], e[1] if e[1] != math.inf else None, e[2], e[3],
+                    e[4]] for e in self._entries.values()]
+        return {
+            'rng': self.rng.bit_generator.state,
+            'entries': entries,
+        }
 
+    @classmethod
+    def from_dict(cls, d):
+        scheduler = cls()
+        for priority, timestamp, tiebreak, document_id, annotator_id in \
+                d['entries']:
+            entry = [-priority, math.inf if timestamp is None else timestamp,
+                     tiebreak, document_id, annotator_id]
+            scheduler._entries[annotator_id, document_id] = entry
+            scheduler._holders[document_id].add(annotator_id)
+            scheduler._counts[annotator_id] += 1
+            scheduler._heaps[annotator_id].append(entry)
+        for heap in scheduler._heaps.values():
+            heapq.heapify(heap)
+        scheduler.rng.bit_generator.state = d['rng']
+        return scheduler
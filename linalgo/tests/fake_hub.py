@@ -0,0 +1,297 @@
+"""A local stand-in for the hub API, for offline tests and load tests."""
+import csv
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import threading
+import time
+import uuid
+from typing import Dict, List
+from urllib.parse import parse_qs, urlencode, urlsplit
+import zipfile
+
+import numpy as np
+
+
+DOCUMENT_FIELDS = ['id', 'uri', 'content', 'corpus']
+ANNOTATION_FIELDS = ['id', 'entity', 'annotator', 'document', 'task',
+                     'target', 'body', 'created']
+
+
+def _zip_csv(rows: List[Dict], fields: List[str]) -> bytes:
+    f = io.StringIO()
+    writer = csv.DictWriter(f, fields, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({k: json.dumps(v) if isinstance(v, dict) else v
+                         for k, v in row.items()})
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('export.csv', f.getvalue())
+    return buffer.getvalue()
+
+
+class FakeHub:
+    """
+    Serve a task over HTTP the way the hub does.
+
+    Implements the endpoints used by `LinalgoClient`: task, annotator and
+    entity listings, zipped CSV exports, `import_annotations`,
+    `bulk_delete`, `document-status` (listing, create, delete and bulk
+    endpoints), `next_document` and `complete_document`.
+
+    Parameters
+    ----------
+    task: Dict
+        The task record, with `id` and `name`
+    documents: List[Dict]
+        Document records with `id`, `uri`, `content` and `corpus`
+    annotations: List[Dict]
+        Annotation records, as in `Annotation.from_dict`
+    entities: List[Dict]
+        Entity records with `id`, `title` and `color`
+    annotators: List[Dict]
+        Annotator records with `id`, `name` and `owner`
+    schedule: List[Dict]
+        `document-status` records
+    latency: float
+        Seconds added to every response
+    page_size: int
+        Maximum number of records per page of a listing
+    error_rate: float
+        Fraction of requests answered with `error_status`
+    error_status: int
+        The HTTP status of injected errors
+    bulk: bool
+        Whether the `document-status` bulk endpoints exist
+    seed: int
+        Seed of the error injection
+    """
+
+    def __init__(self, task, documents=(), annotations=(), entities=(),
+                 annotators=(), schedule=(), latency=0., page_size=1000,
+                 error_rate=0., error_status=503, bulk=True, seed=0):
+        self.task = dict(task)
+        self.documents = list(documents)
+        self.annotations = {a['id']: a for a in annotations}
+        self.entities = list(entities)
+        self.annotators = list(annotators)
+        self.schedule = {s.get('id') or str(uuid.uuid4()): dict(s)
+                         for s in schedule}
+        for status_id, status in self.schedule.items():
+            status['id'] = status_id
+        self.latency = latency
+        self.page_size = page_size
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.bulk = bulk
+        self.requests = 0
+        self.errors = 0
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._exports = {}
+        self._served = set()
+        self._server = None
+        self._thread = None
+
+    def __repr__(self):
+        return f'FakeHub::{self.url if self._server else "stopped"}'
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self, host='127.0.0.1', port=0):
+        hub = self
+
+        class Handler(_Handler):
+            pass
+        Handler.hub = hub
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={'poll_interval': .05},
+            daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def _inject_error(self):
+        with self._lock:
+            self.requests += 1
+            if self.error_rate > 0 and self._rng.random() < self.error_rate:
+                self.errors += 1
+                return True
+        return False
+
+    def _export(self, name):
+        # exports are cached until the data changes
+        with self._lock:
+            if name not in self._exports:
+                if name == 'documents':
+                    rows, fields = self.documents, DOCUMENT_FIELDS
+                else:
+                    rows = list(self.annotations.values())
+                    fields = ANNOTATION_FIELDS
+                self._exports[name] = _zip_csv(rows, fields)
+            return self._exports[name]
+
+    def _page(self, records, path, query):
+        page_size = min(int(query.get('page_size', self.page_size)),
+                        self.page_size)
+        page = int(query.get('page', 1))
+        start = (page - 1) * page_size
+        results = records[start:start + page_size]
+        next_url = None
+        if start + page_size < len(records):
+            params = dict(query, page=page + 1, page_size=page_size)
+            next_url = f'{self.url}/{path}/?{urlencode(params)}'
+        return {'count': len(records), 'next': next_url, 'results': results}
+
+    def handle(self, method, path, query, body):
+        """
+        Returns
+        -------
+        Tuple[int, bytes, str]
+            The status, body and content type of the response
+        """
+        parts = [p for p in path.split('/') if p]
+        route = '/'.join(parts)
+        task_id = self.task['id']
+        if method == 'GET':
+            if parts[:1] == ['tasks'] and len(parts) == 2:
+                return _json({'id': task_id, 'name': self.task.get('name'),
+                              'description': self.task.get('description'),
+                              'entities': [], 'annotators': [],
+                              'corpora': self.task.get('corpora', [])})
+            if route == 'annotators':
+                return _json(self._page(self.annotators, route, query))
+            if route == 'entities':
+                return _json(self._page(self.entities, route, query))
+            if route == 'documents/export':
+                return 200, self._export('documents'), 'application/zip'
+            if route == 'annotations/export':
+                return 200, self._export('annotations'), 'application/zip'
+            if route == 'document-status':
+                with self._lock:
+                    records = list(self.schedule.values())
+                return _json(self._page(records, route, query))
+            if parts[:1] == ['tasks'] and parts[2:] == ['next_document']:
+                with self._lock:
+                    for document in self.documents:
+                        if document['id'] not in self._served:
+                            self._served.add(document['id'])
+                            return _json(document)
+                return _json({'id': None, 'content': None})
+        if method == 'POST':
+            if route == 'annotations/import_annotations':
+                with self._lock:
+                    for a in json.loads(body):
+                        a = dict(a)
+                        for key in ('entity', 'annotator', 'document',
+                                    'task'):
+                            a[key] = a.pop(f'{key}_id', a.get(key))
+                        if a.get('created'):
+                            a['created'] = datetime.strptime(
+                                a['created'], '%Y/%m/%d %H:%M:%S.%f'
+                            ).isoformat()
+                        self.annotations[a['id']] = a
+                    self._exports.pop('annotations', None)
+                return _json({}, status=201)
+            if route == 'document-status':
+                return _json(self._assign([_form(body)])[0], status=201)
+            if route == 'document-status/bulk_create' and self.bulk:
+                return _json(self._assign(json.loads(body)), status=201)
+            if parts[:1] == ['tasks'] and parts[2:] == ['complete_document']:
+                return _json({}, status=200)
+        if method == 'DELETE':
+            if route == 'annotations/bulk_delete':
+                with self._lock:
+                    for annotation_id in json.loads(body):
+                        self.annotations.pop(annotation_id, None)
+                    self._exports.pop('annotations', None)
+                return 204, b'', 'application/json'
+            if route == 'document-status/bulk_delete' and self.bulk:
+                with self._lock:
+                    for status_id in json.loads(body):
+                        self.schedule.pop(status_id, None)
+                return 204, b'', 'application/json'
+            if parts[:1] == ['document-status'] and len(parts) == 2:
+                with self._lock:
+                    found = self.schedule.pop(parts[1], None)
+                return (204 if found else 404), b'', 'application/json'
+        return _json({'detail': 'Not found.'}, status=404)
+
+    def _assign(self, records):
+        created = []
+        with self._lock:
+            for record in records:
+                record = dict(record, id=str(uuid.uuid4()))
+                record.setdefault('priority', None)
+                record.setdefault('timestamp', time.strftime(
+                    '%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+                self.schedule[record['id']] = record
+                created.append(record)
+        return created
+
+
+def _json(data, status=200):
+    return status, json.dumps(data).encode('utf-8'), 'application/json'
+
+
+def _form(body):
+    return {k: v[0] if v[0] != 'None' else None
+            for k, v in parse_qs(body.decode('utf-8')).items()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    hub = None
+    protocol_version = 'HTTP/1.1'
+    # buffer the headers and body into a single write
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self):
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if self.hub.latency > 0:
+            time.sleep(self.hub.latency)
+        if not self.headers.get('Authorization', '').startswith('Token '):
+            status, content, content_type = _json(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=401)
+        elif self.hub._inject_error():
+            status, content, content_type = _json(
+                {'detail': 'Injected error.'}, status=self.hub.error_status)
+        else:
+            status, content, content_type = self.hub.handle(
+                self.command, url.path, query, body)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_DELETE = _respond
+
+
+__all__ = ['FakeHub']
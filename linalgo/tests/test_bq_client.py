@@ -0,0 +1,142 @@
+import os
+import tempfile
+import time
+import unittest
+
+import pyarrow as pa
+
+from linalgo.annotate.models import Annotation, Document
+from linalgo.hub.bq_client import ANNOTATIONS_QUERY, BQClient
+from linalgo.hub.cache import QueryCache
+
+
+class FakeRows:
+
+    def __init__(self, batches):
+        self.batches = batches
+
+    def to_arrow_iterable(self):
+        return iter(self.batches)
+
+
+class FakeJob:
+
+    def __init__(self, batches):
+        self.batches = batches
+
+    def result(self, page_size=None):
+        return FakeRows(self.batches)
+
+
+class FakeBigQuery:
+
+    def __init__(self, documents, annotations):
+        self.documents = documents
+        self.annotations = annotations
+        self.queries = 0
+
+    def query(self, query, job_config=None):
+        self.queries += 1
+        if query == ANNOTATIONS_QUERY:
+            return FakeJob(self.annotations)
+        return FakeJob(self.documents)
+
+
+def _documents(n, page_size):
+    batches = []
+    for start in range(0, n, page_size):
+        ids = range(start, min(n, start + page_size))
+        batches.append(pa.record_batch({
+            'id': [f'bq-doc-{i}' for i in ids],
+            'uri': [None] * len(ids),
+            'content': [f'text {i}' for i in ids],
+            'corpus_id': ['bq-corpus'] * len(ids),
+        }))
+    return batches
+
+
+def _annotations(n):
+    return [pa.record_batch({
+        'id': [f'bq-ann-{i}' for i in range(n)],
+        'entity_id': ['bq-entity'] * n,
+        'document_id': [f'bq-doc-{i}' for i in range(n)],
+        'body': [''] * n,
+        'annotator_id': ['bq-annotator'] * n,
+        'task_id': ['bq-task'] * n,
+        'created': [None] * n,
+        'target': ['{}'] * n,
+    })]
+
+
+class TestBQClient(unittest.TestCase):
+
+    def setUp(self):
+        fake = FakeBigQuery(_documents(25, 10), _annotations(5))
+        self.client = BQClient('bq-task', client=fake)
+
+    def test_get_task_data(self):
+        documents, annotations = self.client.get_task_data()
+        self.assertEqual(len(documents), 25)
+        self.assertEqual(len(annotations), 5)
+        self.assertIsInstance(documents[3], Document)
+        self.assertEqual(documents[3].content, 'text 3')
+        self.assertIsInstance(annotations[2], Annotation)
+        self.assertIs(annotations[2].document, Document(unique_id='bq-doc-2'))
+
+    def test_get_task_tables(self):
+        documents, annotations = self.client.get_task_tables()
+        self.assertEqual(documents.num_rows, 25)
+        self.assertEqual(annotations.column('document_id')[4].as_py(),
+                         'bq-doc-4')
+
+
+class TestQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fake = FakeBigQuery(_documents(25, 10), _annotations(5))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_hit(self):
+        cache = QueryCache(self.directory.name)
+        client = BQClient('bq-task', client=self.fake, cache=cache)
+        client.get_task_data()
+        self.assertEqual(self.fake.queries, 2)
+        client = BQClient('bq-task', client=self.fake, cache=cache)
+        documents, annotations = client.get_task_data()
+        self.assertEqual(self.fake.queries, 2)
+        self.assertEqual(len(documents), 25)
+        self.assertEqual(len(annotations), 5)
+        BQClient('other-task', client=self.fake, cache=cache).get_documents()
+        self.assertEqual(self.fake.queries, 3)
+
+    def test_ttl(self):
+        cache = QueryCache(self.directory.name, ttl=60)
+        key = cache.key('SELECT 1', {'task_id': 'bq-task'})
+        cache.put(key, _annotations(2))
+        self.assertEqual(sum(b.num_rows for b in cache.get(key)), 2)
+        path = os.path.join(self.directory.name, key + cache.suffix)
+        old = time.time() - 120
+        os.utime(path, (old, old))
+        self.assertIsNone(cache.get(key))
+
+    def test_eviction(self):
+        cache = QueryCache(self.directory.name)
+        keys = [cache.key('SELECT 1', {'task_id': str(i)}) for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.put(key, _documents(100, 100))
+            path = os.path.join(self.directory.name, key + cache.suffix)
+            os.utime(path, (time.time() - 10 + i, time.time()))
+        size = os.path.getsize(path)
+        cache.get(keys[0])
+        cache.max_bytes = 2 * size
+        cache.evict()
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+import unittest
+
+import numpy as np
+
+from linalgo.hub.columnar import ScheduleColumns, parse_timestamps
+
+
+class TestColumnar(unittest.TestCase):
+
+    def test_parse_timestamps(self):
+        expected = np.array(['2021-01-01T00:00:00', '2021-01-01T00:00:00.5',
+                             'NaT', '2021-01-01T00:00:00'],
+                            dtype='datetime64[us]')
+        parsed = parse_timestamps([
+            '2021-01-01T00:00:00Z', '2021-01-01T00:00:00.500000', 'NaT',
+            '2021-01-01T02:00:00+02:00'])
+        self.assertEqual(parsed.dtype, np.dtype('datetime64[us]'))
+        np.testing.assert_array_equal(parsed, expected)
+        tz = timezone(timedelta(hours=-1))
+        parsed = parse_timestamps(iter([
+            datetime(2020, 12, 31, 23, tzinfo=tz),
+            datetime(2021, 1, 1, 0, 0, 0, 500000), None, float('nan')]))
+        np.testing.assert_array_equal(parsed[:2], expected[[0, 1]])
+        self.assertTrue(np.isnat(parsed[2:]).all())
+        self.assertEqual(len(parse_timestamps([])), 0)
+
+    def test_schedule_columns(self):
+        pages = [[
+            {'id': 's0', 'document': 'd0', 'annotator': 'a0', 'task': 't',
+             'status': 'A', 'type': 'R', 'priority': 2.,
+             'reviewee': 'a1', 'timestamp': '2021-01-01T00:00:00Z'},
+            {'id': 's1', 'document': 'd1', 'annotator': 'a1', 'task': 't',
+             'status': 'C', 'type': None, 'priority': None,
+             'reviewee': None, 'timestamp': None},
+        ], [
+            {'id': 's2', 'document': 'd0', 'annotator': 'a1', 'task': 't',
+             'status': 'C', 'type': 'A', 'priority': 1.,
+             'reviewee': None, 'timestamp': '2021-01-02T00:00:00Z'},
+        ]]
+        schedule = ScheduleColumns.from_pages(pages)
+        self.assertEqual(len(schedule), 3)
+        self.assertEqual(list(schedule['document']), ['d0', 'd1', 'd0'])
+        self.assertEqual(list(schedule.codes['document']), [0, 1, 0])
+        self.assertEqual(list(schedule.categories['annotator']),
+                         ['a0', 'a1'])
+        self.assertEqual(list(schedule['status']), ['A', 'C', 'C'])
+        self.assertEqual(list(schedule['type']), ['R', 'A', 'A'])
+        self.assertEqual(list(schedule['reviewee']), ['a1', None, None])
+        np.testing.assert_array_equal(schedule['priority'],
+                                      [2., np.nan, 1.])
+        self.assertTrue(np.isnat(schedule['timestamp'][1]))
+        with self.assertRaises(KeyError):
+            schedule['missing']
+
+        frame = {name: schedule[name] for name in ('document', 'annotator',
+                                                   'status', 'timestamp')}
+        columns = ScheduleColumns.from_frame(frame)
+        self.assertEqual(list(columns['document']), ['d0', 'd1', 'd0'])
+        self.assertEqual(list(columns['type']), ['A', 'A', 'A'])
+        np.testing.assert_array_equal(columns['timestamp'],
+                                      schedule['timestamp'])
+        self.assertEqual(len(ScheduleColumns.from_pages([])), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
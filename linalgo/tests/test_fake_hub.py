@@ -0,0 +1,161 @@
+import unittest
+from unittest import mock
+
+from linalgo.annotate.diff import Snapshot
+from linalgo.annotate.models import Annotation, Document, Target
+from linalgo.hub.client import AssignmentType, LinalgoClient
+from linalgo.tests.fake_hub import FakeHub
+
+
+TASK_ID = 'fake-hub-task'
+
+
+def _hub(**kwargs):
+    documents = [{'id': f'fake-hub-doc-{i}', 'uri': '',
+                  'content': f'text {i}', 'corpus': 'fake-hub-corpus'}
+                 for i in range(25)]
+    annotations = [{
+        'id': f'fake-hub-annotation-{i}', 'entity': 'fake-hub-entity',
+        'annotator': 'fake-hub-annotator', 'document': f'fake-hub-doc-{i}',
+        'task': TASK_ID, 'target': {}, 'body': '',
+        'created': '2021-01-01T00:00:00'} for i in range(10)]
+    return FakeHub(
+        {'id': TASK_ID, 'name': 'fake hub'}, documents=documents,
+        annotations=annotations,
+        entities=[{'id': 'fake-hub-entity', 'title': 'PER', 'color': 'red'}],
+        annotators=[{'id': 'fake-hub-annotator', 'name': 'a',
+                     'owner': None}], **kwargs)
+
+
+class TestFakeHub(unittest.TestCase):
+
+    def test_get_task(self):
+        with _hub() as hub:
+            client = LinalgoClient('token', api_url=hub.url)
+            task = client.get_task(TASK_ID)
+        self.assertEqual(len(task.documents), 25)
+        self.assertEqual(len(task.annotations), 10)
+        self.assertEqual(task.entities[0].name, 'PER')
+
+    def test_annotations_and_assignments(self):
+        with _hub(page_size=4) as hub:
+            client = LinalgoClient('token', api_url=hub.url)
+            task = client.get_task(TASK_ID)
+            document = Document(unique_id='fake-hub-other-doc')
+            annotation = Annotation(
+                unique_id='fake-hub-new', entity=task.entities[0],
+                document=document, annotator=task.annotators[0], task=task,
+                target=Target(source=document))
+            client.create_annotations([annotation])
+            self.assertEqual(len(client.get_task_annotations(TASK_ID)), 11)
+            client.delete_annotations([annotation])
+            self.assertEqual(len(client.get_task_annotations(TASK_ID)), 10)
+
+            assignments = [(d, task.annotators[0], task)
+                           for d in task.documents[:9]]
+            results = client.assign_many(assignments, batch_size=5)
+            self.assertTrue(all(r['error'] is None for r in results))
+            schedule = client.get_schedule_columns(task, page_size=100)
+            self.assertEqual(len(schedule), 9)
+            client.unassign_many(list(schedule['id'][:4]))
+            self.assertEqual(len(client.get_schedule_columns(task)), 5)
+
+    def test_push_changes(self):
+        with _hub() as hub:
+            client = LinalgoClient('token', api_url=hub.url)
+            task = client.get_task(TASK_ID)
+            snapshot = Snapshot(task.annotations)
+            annotations = sorted(task.annotations, key=lambda a: a.id)
+            annotations[0].body = 'edited'
+            document = task.documents[0]
+            added = Annotation(
+                unique_id='fake-hub-added', entity=task.entities[0],
+                document=document, annotator=task.annotators[0], task=task,
+                target=Target(source=document))
+            self.addCleanup(Annotation._registry.pop, added.id)
+            self.addCleanup(document.annotations.discard, added)
+            current = annotations[:1] + annotations[2:] + [added]
+            # a rejected push leaves the hub unchanged
+            hub.error_rate = 1.
+            with self.assertRaises(Exception):
+                client.push_changes(snapshot, current)
+            hub.error_rate = 0.
+            self.assertEqual(len(hub.annotations), 10)
+            self.assertEqual(hub.annotations[annotations[0].id]['body'], '')
+            with mock.patch.object(client, 'delete_annotations',
+                                   wraps=client.delete_annotations) as delete:
+                changes, snapshot = client.push_changes(snapshot, current)
+            # modified annotations are deleted and created again
+            delete.assert_called_once_with(
+                sorted([annotations[0].id, annotations[1].id]))
+            self.assertEqual(changes.added, {added.id})
+            self.assertEqual(changes.removed, {annotations[1].id})
+            self.assertEqual(changes.modified, {annotations[0].id})
+            self.assertEqual(len(hub.annotations), 10)
+            self.assertEqual(hub.annotations[annotations[0].id]['body'],
+                             'edited')
+            self.assertNotIn(annotations[1].id, hub.annotations)
+            changes, _ = client.push_changes(snapshot, current)
+            self.assertEqual(len(changes), 0)
+
+    def test_assign_many(self):
+        assignments = [(f'fake-hub-doc-{i}', 'fake-hub-annotator', TASK_ID)
+                       for i in range(9)]
+        with _hub() as hub:
+            client = LinalgoClient('token', api_url=hub.url)
+            results = client.assign_many(assignments, batch_size=5)
+            self.assertEqual(hub.requests, 2)
+            self.assertEqual([r['item'] for r in results], assignments)
+            self.assertTrue(all(r['status'] == 201 and r['error'] is None
+                                for r in results))
+            self.assertEqual(len(hub.schedule), 9)
+            # enum members are sent by value, on both paths
+            review = [('fake-hub-doc-9', 'fake-hub-annotator', TASK_ID,
+                       AssignmentType.REVIEW, 'fake-hub-other')]
+            for bulk in (True, False):
+                hub.bulk = bulk
+                client._bulk_endpoints.clear()
+                results = client.assign_many(review)
+                self.assertEqual(results[0]['status'], 201)
+            types = [s['type'] for s in hub.schedule.values()]
+            self.assertEqual(types.count(AssignmentType.REVIEW.value), 2)
+
+    def test_assign_many_fallback(self):
+        assignments = [(f'fake-hub-doc-{i}', 'fake-hub-annotator', TASK_ID)
+                       for i in range(9)]
+        with _hub(bulk=False) as hub:
+            client = LinalgoClient('token', api_url=hub.url)
+            results = client.assign_many(assignments, batch_size=5)
+            # one 404 on the bulk endpoint, which is not tried again
+            self.assertEqual(hub.requests, 1 + 9)
+            self.assertTrue(all(r['status'] == 201 and r['error'] is None
+                                for r in results))
+            self.assertEqual(len(hub.schedule), 9)
+
+    def test_assign_many_errors(self):
+        assignments = [(f'fake-hub-doc-{i}', 'fake-hub-annotator', TASK_ID)
+                       for i in range(20)]
+        with _hub(error_rate=.5, error_status=503) as hub:
+            client = LinalgoClient('token', api_url=hub.url)
+            # a rejected batch is sent again one assignment at a time
+            results = client.assign_many(assignments, batch_size=10,
+                                         workers=4)
+            self.assertEqual([r['item'] for r in results], assignments)
+            failed = [r for r in results if r['error'] is not None]
+            self.assertTrue(0 < len(failed) < len(results))
+            self.assertTrue(all(r['status'] == 503 for r in failed))
+            self.assertTrue(all(r['status'] == 201 for r in results
+                                if r['error'] is None))
+            self.assertEqual(len(hub.schedule), 20 - len(failed))
+            self.assertTrue(client._bulk_endpoints['assign'])
+
+    def test_errors(self):
+        with _hub(error_rate=1.) as hub:
+            client = LinalgoClient('token', api_url=hub.url)
+            with self.assertRaises(Exception):
+                client.get_task(TASK_ID)
+            self.assertEqual(hub.errors, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import re
+import subprocess
+import sys
+import unittest
+
+
+# modules that the models, serializers and client must not load
+HEAVY = ['pandas', 'matplotlib', 'sklearn', 'scipy', 'numpy', 'PIL',
+         'pyarrow', 'google.cloud.bigquery', 'django']
+
+# seconds, several times what it takes on a laptop
+BUDGET = .5
+
+
+def _import(modules):
+    code = f"import sys, {', '.join(modules)}; print(','.join(sys.modules))"
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                         capture_output=True, text=True, check=True)
+    # top-level entries of the import tree, cumulative times in us
+    total = sum(int(m.group(1)) for m in re.finditer(
+        r'^import time:\s+\d+ \|\s+(\d+) \| \S', res.stderr, re.MULTILINE))
+    return total / 1e6, set(res.stdout.strip().split(','))
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_core_modules(self):
+        seconds, loaded = _import(['linalgo.annotate.models',
+                                   'linalgo.annotate.serializers',
+                                   'linalgo.hub.client'])
+        self.assertEqual([m for m in HEAVY if m in loaded], [])
+        self.assertLess(seconds, BUDGET)
+
+    def test_analysis_modules(self):
+        _, loaded = _import(['linalgo.annotate.xtram',
+                             'linalgo.annotate.utils',
+                             'linalgo.annotate.transformers'])
+        self.assertEqual(
+            [m for m in ('pandas', 'matplotlib', 'sklearn', 'scipy')
+             if m in loaded], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import csv
+import io
+import json
+import unittest
+import zipfile
+
+import requests
+
+from linalgo.hub.client import LinalgoClient
+from linalgo.hub.instrumentation import MetricsCollector, endpoint
+
+
+TASK_ID = '3f2b8c1e-8d0a-4c55-9d59-0a5bd1c7e001'
+
+
+def _zip(rows):
+    f = io.StringIO()
+    writer = csv.DictWriter(f, list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('export.csv', f.getvalue())
+    return buffer.getvalue()
+
+
+ROUTES = {
+    f'tasks/{TASK_ID}': json.dumps({
+        'id': TASK_ID, 'name': 'inst-task', 'description': '',
+        'entities': [], 'corpora': [], 'annotators': []}).encode(),
+    'annotators': json.dumps({'results': [
+        {'id': 'inst-annotator', 'name': 'a', 'model': None,
+         'owner': None}]}).encode(),
+    'entities': json.dumps({'results': [
+        {'id': 'inst-entity', 'title': 'PER', 'color': 'red'}]}).encode(),
+    'documents/export': _zip([
+        {'id': f'inst-doc-{i}', 'uri': '', 'content': f'text {i}',
+         'corpus': 'inst-corpus'} for i in range(3)]),
+    'annotations/export': _zip([
+        {'id': 'inst-annotation', 'entity': 'inst-entity',
+         'annotator': 'inst-annotator', 'document': 'inst-doc-0',
+         'task': TASK_ID, 'target': '{}', 'body': '',
+         'created': '2021-01-01T00:00:00'}]),
+}
+
+
+class FakeSession:
+
+    def request(self, method, url, headers=None, stream=False, **kwargs):
+        path = endpoint(url).replace('{id}', TASK_ID)
+        res = requests.Response()
+        res.status_code = 200 if path in ROUTES else 404
+        res._content = ROUTES.get(path, b'')
+        res._content_consumed = True
+        res.request = requests.Request(
+            method, url, json=kwargs.get('json')).prepare()
+        return res
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = MetricsCollector()
+        self.client = LinalgoClient('token', api_url='http://hub',
+                                    instrumentation=self.metrics)
+        self.client.session = FakeSession()
+
+    def test_get_task(self):
+        task = self.client.get_task(TASK_ID)
+        self.assertEqual(len(task.documents), 3)
+        summary = self.metrics.summary()
+        self.assertEqual(summary['get_task step=documents']['objects'], 3)
+        self.assertEqual(
+            summary['parse endpoint=documents/export']['rows'], 3)
+        self.assertEqual(
+            summary['construct endpoint=annotations/export']['objects'], 1)
+        self.assertEqual(
+            self.metrics.requests[('GET', 'tasks/{id}', '200')], 1)
+        self.assertEqual(
+            self.metrics.bytes_in[('GET', 'documents/export')],
+            len(ROUTES['documents/export']))
+
+    def test_prometheus(self):
+        self.client.get_task(TASK_ID)
+        with self.assertRaises(Exception):
+            self.client.get('http://hub/missing/')
+        self.client.request('POST', 'http://hub/annotations/', json=[1, 2])
+        text = self.metrics.to_prometheus()
+        self.assertIn('# TYPE linalgo_requests_total counter', text)
+        self.assertIn('linalgo_requests_total{method="GET",'
+                      'endpoint="missing",status="404"} 1', text)
+        self.assertIn('linalgo_request_seconds_bucket{method="GET",'
+                      'endpoint="entities",le="+Inf"} 1', text)
+        self.assertIn('linalgo_request_bytes_out_total{method="POST",'
+                      'endpoint="annotations"} 6', text)
+        self.assertIn('linalgo_phase_items_total{phase="get_task",'
+                      'step="annotations",item="objects"} 1', text)
+        text = self.metrics.to_prometheus(openmetrics=True)
+        self.assertIn('# TYPE linalgo_requests counter', text)
+        self.assertTrue(text.endswith('# EOF\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
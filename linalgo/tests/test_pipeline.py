@@ -0,0 +1,60 @@
+import threading
+import time
+import unittest
+
+from linalgo.annotate.models import Annotator, Document, Task
+from linalgo.hub.pipeline import Pipeline, Stage, preannotate
+
+
+class LengthModel:
+
+    def decision_function(self, texts):
+        return [len(t) for t in texts]
+
+
+class FakeClient:
+
+    def __init__(self, delay=0.):
+        self.delay = delay
+        self.uploaded = []
+        self.lock = threading.Lock()
+
+    def create_annotations(self, annotations):
+        time.sleep(self.delay)
+        with self.lock:
+            self.uploaded.extend(annotations)
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_preannotate(self):
+        task = Task(unique_id='pipeline-task')
+        annotator = Annotator(
+            unique_id='pipeline-bot', model=LengthModel(), threshold=3,
+            entity_id='pipeline-entity', task=task)
+        documents = [Document(unique_id=f'pipeline-{i}', content='x' * i)
+                     for i in range(250)]
+        client = FakeClient(delay=.01)
+        stats = preannotate(documents, annotator, client, batch_size=16,
+                            upload_batch_size=50, upload_workers=3,
+                            queue_size=20, max_wait=.05)
+        self.assertEqual(len(client.uploaded), 250)
+        self.assertEqual(
+            {a.document.id for a in client.uploaded},
+            {d.id for d in documents})
+        self.assertEqual(stats['predict'].items_in, 250)
+        self.assertEqual(stats['upload'].items_in, 250)
+        self.assertGreater(stats['source'].summary()['blocked'], 0)
+
+    def test_error_stops_pipeline(self):
+        def fail(batch):
+            raise ValueError('boom')
+
+        stages = [Stage('identity', lambda b: b, batch_size=2),
+                  Stage('fail', fail, concurrency=2)]
+        with self.assertRaises(ValueError):
+            Pipeline(range(1000), stages, queue_size=4).run()
+
+
+if __name__ == '__main__':
+    unittest.main()
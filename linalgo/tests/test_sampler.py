@@ -0,0 +1,97 @@
+import unittest
+
+import numpy as np
+
+from linalgo.hub.sampler import (
+    TopK, UncertaintySampler, predictions, sample, uncertainty
+)
+
+
+class TestUncertainty(unittest.TestCase):
+
+    def test_margin(self):
+        np.testing.assert_allclose(
+            uncertainty([2., -.5, .1], threshold=.5), [-1.5, -1., -.4])
+        np.testing.assert_allclose(
+            uncertainty([[.7, .2, .1], [.4, .5, .1]]), [-.5, -.1])
+
+    def test_entropy(self):
+        values = uncertainty([[.5, .5], [1., 0.], [.25, .75]], 'entropy')
+        np.testing.assert_allclose(
+            values, [np.log(2), 0., -.25 * np.log(.25) - .75 * np.log(.75)])
+        # decision values go through a sigmoid
+        np.testing.assert_allclose(
+            uncertainty([0., 100.], 'entropy'), [np.log(2), 0.], atol=1e-12)
+        np.testing.assert_allclose(
+            uncertainty([[.9, .1]], 'least-confident'), [.1])
+
+    def test_shapes(self):
+        np.testing.assert_array_equal(
+            predictions([[.1, .9], [.8, .2]]), [1, 0])
+        np.testing.assert_array_equal(predictions([-1., 1.]), [0, 1])
+        for scores in ([[.1], [.9]], np.zeros((2, 2, 2)), 1.):
+            with self.assertRaises(ValueError):
+                uncertainty(scores)
+            with self.assertRaises(ValueError):
+                uncertainty(scores, 'entropy')
+        with self.assertRaises(NotImplementedError):
+            uncertainty([1.], 'random')
+
+
+class TestUncertaintySampler(unittest.TestCase):
+
+    def test_top_k(self):
+        top = TopK(3)
+        top.update(['a', 'b', 'c'], np.array([1., 5., 3.]))
+        top.update(['d', 'e'], np.array([4., 0.]))
+        self.assertEqual(top.result(), ['b', 'd', 'c'])
+        empty = TopK(0).update(['a', 'b'], np.array([1., 2.]))
+        self.assertEqual(len(empty), 0)
+        self.assertEqual(sample([(['a'], np.array([0.]))], 0), [])
+
+        ids = [f'doc-{i}' for i in range(100)]
+        scores = np.linspace(-5, 5, 100)
+        batches = [(ids[i:i + 30], scores[i:i + 30])
+                   for i in range(0, 100, 30)]
+        selected = sample(batches, 4, random_state=0)
+        self.assertEqual(set(selected), {'doc-48', 'doc-49', 'doc-50',
+                                         'doc-51'})
+
+    def test_exclude(self):
+        ids = [f'doc-{i}' for i in range(10)]
+        scores = np.abs(np.arange(10) - 2.)
+        sampler = UncertaintySampler(2, exclude={'doc-2'}, random_state=0)
+        selected = sampler.update(ids, scores).select()
+        self.assertEqual(set(selected), {'doc-1', 'doc-3'})
+
+    def test_stratified(self):
+        # most documents are predicted positive
+        ids = [f'doc-{i}' for i in range(100)]
+        scores = np.concatenate([-np.arange(1, 11.), np.arange(1, 91.)])
+        selected = sample([(ids, scores)], 6, strategy='stratified',
+                          random_state=0)
+        self.assertEqual(len(selected), 6)
+        predicted = predictions(scores[[ids.index(i) for i in selected]])
+        self.assertEqual(predicted.sum(), 3)
+        self.assertEqual(selected[:2], ['doc-0', 'doc-10'])
+        sampler = UncertaintySampler(6, strategy='stratified', n_classes=2)
+        with self.assertRaises(ValueError):
+            sampler.update(['a', 'b'], np.array([[.1, .2, .7], [.8, .1, .1]]))
+
+    def test_diverse(self):
+        # two tight clusters of equally uncertain documents
+        ids = [f'doc-{i}' for i in range(20)]
+        scores = np.zeros(20)
+        features = np.zeros((20, 2))
+        features[10:] = 10.
+        features += np.random.default_rng(0).random((20, 2)) * .1
+        selected = sample([(ids, scores, features)], 2, strategy='diverse',
+                          random_state=0)
+        clusters = {int(i.split('-')[1]) >= 10 for i in selected}
+        self.assertEqual(clusters, {False, True})
+        with self.assertRaises(ValueError):
+            UncertaintySampler(2, strategy='diverse').update(ids, scores)
+
+
+if __name__ == '__main__':
+    unittest.main()
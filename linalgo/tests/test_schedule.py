@@ -1,25 +1,71 @@
-import os, unittest
-
-import pandas as pd
-
+import time
+import unittest
 
+from linalgo.annotate.models import Task
 from linalgo.hub.client import LinalgoClient
 from linalgo.hub.scheduler import Scheduler
+from linalgo.tests.fake_hub import FakeHub
+
+
+TASK_ID = '20c436de-f4d1-4b40-b9e9-ee2fb9087ea9'
+REVIEWER, REVIEWEE = 'schedule-reviewer', 'schedule-reviewee'
+
+
+def _hub():
+    documents = [{'id': f'schedule-doc-{i}', 'uri': '', 'content': f'doc {i}',
+                  'corpus': 'schedule-corpus'} for i in range(40)]
+    schedule = [{'document': d['id'], 'annotator': REVIEWEE, 'task': TASK_ID,
+                 'status': 'C', 'type': 'A', 'priority': None,
+                 'reviewee': None, 'timestamp': '2021-01-01T00:00:00Z'}
+                for d in documents[:30]]
+    annotators = [{'id': a, 'name': a, 'owner': None}
+                  for a in (REVIEWER, REVIEWEE)]
+    return FakeHub({'id': TASK_ID, 'name': 'schedule'}, documents=documents,
+                   annotators=annotators, schedule=schedule, page_size=7)
 
 
 class TestSchedule(unittest.TestCase):
 
     def test_random_review(self):
-        token = os.getenv('LINHUB_TOKEN')
-        client = LinalgoClient(
-            token=token, api_url='https://api.linalgo.com/hub')
-        task_id = '20c436de-f4d1-4b40-b9e9-ee2fb9087ea9'
-        task = client.get_task(task_id, verbose=True)
-        schedule = pd.DataFrame(client.get_schedule(task))
-        scheduler = Scheduler(task, schedule)
-        docs = scheduler.random_review(
-            task.get_id('precious.figueroa'), task.get_id('wallie'), n=20)
+        with _hub() as hub:
+            client = LinalgoClient(token='token', api_url=hub.url)
+            task = client.get_task(TASK_ID)
+            schedule = client.get_schedule_columns(task, page_size=10)
+        self.assertEqual(len(schedule), 30)
+        scheduler = Scheduler(task, schedule, random_state=0)
+        docs = scheduler.random_review(REVIEWER, REVIEWEE, n=20)
+        self.assertEqual(len(set(docs)), 20)
+        self.assertTrue(set(docs) <= set(schedule['document']))
+        # queries do not assign anything unless asked to
+        self.assertEqual(len(scheduler.annotator_documents(REVIEWER)), 0)
+        docs = scheduler.random_review(REVIEWER, REVIEWEE, n=20, record=True)
+        self.assertEqual(scheduler.annotator_documents(REVIEWER), docs)
+
+
+    def test_iter_schedule_pages(self):
+        task = Task(unique_id=TASK_ID)
+        with _hub() as hub:
+            client = LinalgoClient(token='token', api_url=hub.url)
+            pages = list(client.iter_schedule_pages(task, page_size=7))
+            self.assertEqual([len(p) for p in pages], [7, 7, 7, 7, 2])
+            self.assertEqual([r['document'] for p in pages for r in p],
+                             [f'schedule-doc-{i}' for i in range(30)])
+
+            hub.requests = 0
+            pages = client.iter_schedule_pages(task, page_size=7, prefetch=1)
+            next(pages)
+            # one page is queued and the next one waits for room
+            deadline = time.monotonic() + 5
+            while hub.requests < 3 and time.monotonic() < deadline:
+                time.sleep(.01)
+            time.sleep(.1)
+            self.assertEqual(hub.requests, 3)
+            pages.close()
+            self.assertEqual(hub.requests, 3)
 
+            hub.error_rate = 1.
+            with self.assertRaises(Exception):
+                list(client.iter_schedule_pages(task))
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,240 @@
+import json
+import unittest
+
+from linalgo.annotate.models import Annotation, Annotator, Document, Task
+from linalgo.hub.client import AssignmentType
+from linalgo.hub.scheduler import (
+    NotEnoughReviews, PriorityScheduler, Scheduler, UnfilledSlots
+)
+
+
+LABEL = AssignmentType.LABEL.value
+REVIEW = AssignmentType.REVIEW.value
+
+
+def _task(name, n_documents, annotators, annotated=()):
+    documents = [Document(unique_id=f'{name}-doc-{i}')
+                 for i in range(n_documents)]
+    task = Task(unique_id=f'{name}-task', documents=documents,
+                annotators=[Annotator(unique_id=a) for a in annotators])
+    task.annotations = [
+        Annotation(unique_id=f'{name}-ann-{i}', document=documents[i],
+                   annotator=annotators[0], task=task, target={})
+        for i in annotated]
+    return task
+
+
+def _schedule(rows):
+    return {
+        'document': [r[0] for r in rows],
+        'annotator': [r[1] for r in rows],
+        'status': [r[2] for r in rows],
+        'timestamp': ['2021-01-01T00:00:00Z'] * len(rows),
+    }
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_indexes(self):
+        task = _task('sched-index', 10, ['sched-a', 'sched-b'],
+                     annotated=[0])
+        scheduler = Scheduler(task, _schedule([
+            ('sched-index-doc-1', 'sched-a', 'A'),
+            ('sched-index-doc-2', 'sched-a', 'C'),
+        ]), random_state=0)
+        self.assertEqual(scheduler.annotator_documents('sched-a'),
+                         {'sched-index-doc-1', 'sched-index-doc-2'})
+        self.assertEqual(len(scheduler.unseen), 9)
+
+        scheduler.assign('sched-b', ['sched-index-doc-3'])
+        self.assertEqual(scheduler.annotator_documents('sched-b'),
+                         {'sched-index-doc-3'})
+        self.assertTrue(scheduler.scheduled[3])
+        scheduler.complete('sched-a', 'sched-index-doc-1')
+        documents = scheduler.documents['sched-a']
+        self.assertNotIn('sched-index-doc-1', documents['A'])
+        self.assertIn('sched-index-doc-1', documents['C'])
+        self.assertEqual(len(scheduler.annotator_documents('sched-a')), 2)
+        self.assertEqual(len(scheduler.unseen), 8)
+
+        docs = scheduler.random_assign('sched-a', 5, record=True)
+        self.assertEqual(len(docs), 5)
+        self.assertEqual(len(scheduler.annotator_documents('sched-a')), 7)
+        self.assertFalse(docs & {'sched-index-doc-1', 'sched-index-doc-2'})
+        more = scheduler.random_assign('sched-a', 2)
+        self.assertFalse(more & docs)
+        self.assertEqual(len(scheduler.annotator_documents('sched-a')), 7)
+
+    def test_sample(self):
+        task = _task('sched-sample', 1000, ['sched-a'])
+        scheduler = Scheduler(task, _schedule([]), random_state=0)
+        exclude = set(scheduler.document_ids[:100])
+        # few documents among many: drawn with rejection
+        docs = scheduler._sample(scheduler.unseen, exclude, 10)
+        self.assertEqual(len(docs), 10)
+        self.assertFalse(docs & exclude)
+        # most of the pool: drawn without replacement from the remainder
+        docs = scheduler._sample(scheduler.unseen, exclude, 900)
+        self.assertEqual(docs, set(scheduler.document_ids[100:]))
+        with self.assertRaises(NotEnoughReviews):
+            scheduler._sample(scheduler.unseen, exclude, 901)
+        with self.assertRaises(NotEnoughReviews):
+            scheduler._sample(scheduler.unseen, set(), 1001)
+
+    def test_plan(self):
+        annotators = ['sched-a', 'sched-b', 'sched-c']
+        task = _task('sched-plan', 30, annotators)
+        scheduler = Scheduler(task, _schedule([]), random_state=0)
+        quota = {'sched-a': 4, 'sched-b': 4, 'sched-c': 2}
+        plan = scheduler.plan(annotators, quota, overlap=2)
+        counts = {a: sum(1 for p in plan if p[1] == a) for a in annotators}
+        self.assertEqual(counts, quota)
+        self.assertEqual(len(set(plan)), len(plan))
+        by_document = {}
+        for doc, annotator, task_id, kind, reviewee in plan:
+            self.assertEqual((task_id, kind, reviewee),
+                             ('sched-plan-task', LABEL, None))
+            by_document.setdefault(doc, []).append(annotator)
+        # each document is labelled by `overlap` distinct annotators
+        for labellers in by_document.values():
+            self.assertEqual(len(labellers), 2)
+            self.assertEqual(len(set(labellers)), 2)
+        self.assertEqual(len(by_document), 5)
+        self.assertEqual(len(scheduler.annotator_documents('sched-a')), 4)
+        plan = scheduler.plan(annotators, {'sched-c': 3})
+        self.assertEqual(len(plan), 3)
+        self.assertFalse({p[0] for p in plan} & set(by_document))
+        # one annotator cannot fill groups of two
+        with self.assertWarns(UnfilledSlots) as caught:
+            plan = scheduler.plan(annotators, {'sched-a': 2, 'sched-b': 1},
+                                  overlap=2)
+        self.assertEqual(sorted(p[1] for p in plan), ['sched-a', 'sched-b'])
+        self.assertIn("{'sched-a': 1}", str(caught.warning))
+
+    def test_plan_reviews(self):
+        annotators = ['sched-a', 'sched-b', 'sched-c']
+        task = _task('sched-review', 3, annotators)
+        # doc-0 is completed by a and b and assigned to c: c has seen it
+        scheduler = Scheduler(task, _schedule([
+            ('sched-review-doc-0', 'sched-a', 'C'),
+            ('sched-review-doc-0', 'sched-b', 'C'),
+            ('sched-review-doc-0', 'sched-c', 'A'),
+            ('sched-review-doc-1', 'sched-a', 'C'),
+        ]), random_state=0)
+        with self.assertWarns(UnfilledSlots):
+            plan = scheduler.plan(['sched-c'], 2, review_ratio=1.0,
+                                  record=False)
+        self.assertEqual(plan, [('sched-review-doc-1', 'sched-c',
+                                 'sched-review-task', REVIEW, 'sched-a')])
+        with self.assertWarns(UnfilledSlots):
+            plan = scheduler.plan(['sched-a'], 2, review_ratio=1.0)
+        self.assertEqual(plan, [])
+
+        for seed in range(20):
+            task = _task('sched-many', 50, annotators)
+            rows = [(f'sched-many-doc-{i}', annotators[i % 3], 'C')
+                    for i in range(40)]
+            rows += [(f'sched-many-doc-{i}', annotators[(i + 1) % 3], 'C')
+                     for i in range(0, 40, 2)]
+            scheduler = Scheduler(task, _schedule(rows), random_state=seed)
+            seen = {a: set(scheduler.annotator_documents(a))
+                    for a in annotators}
+            plan = scheduler.plan(annotators, 6, review_ratio=0.5)
+            reviews = [p for p in plan if p[3] == REVIEW]
+            self.assertEqual(len(plan), 18)
+            self.assertEqual(len(reviews), 9)
+            # a document is reviewed once, by someone who has never seen it
+            self.assertEqual(len({p[0] for p in reviews}), 9)
+            for doc, annotator, _, _, reviewee in reviews:
+                self.assertNotEqual(annotator, reviewee)
+                self.assertNotIn(doc, seen[annotator])
+                self.assertIn(doc, seen[reviewee])
+
+
+class TestPriorityScheduler(unittest.TestCase):
+
+    def _queue(self):
+        queue = PriorityScheduler(random_state=0)
+        queue.push('a', 'doc-old', 1., '2021-01-01T00:00:00Z')
+        queue.push('a', 'doc-new', 1., '2021-06-01T00:00:00Z')
+        queue.push('a', 'doc-urgent', 5., '2021-09-01T00:00:00Z')
+        queue.push('a', 'doc-undated', 1.)
+        queue.push('a', 'doc-low', None, '2020-01-01T00:00:00Z')
+        queue.push('b', 'doc-old', 2., '2021-01-01T00:00:00Z')
+        return queue
+
+    def _drain(self, queue, annotator):
+        docs = []
+        while queue.peek(annotator) is not None:
+            docs.append(queue.pop(annotator))
+        self.assertIsNone(queue.pop(annotator))
+        return docs
+
+    def test_pop(self):
+        queue = self._queue()
+        self.assertEqual(len(queue), 6)
+        self.assertEqual(queue.pending('a'), 5)
+        # highest priority first, then oldest, undated last
+        self.assertEqual(self._drain(queue, 'a'), [
+            'doc-urgent', 'doc-old', 'doc-new', 'doc-undated', 'doc-low'])
+        self.assertEqual(queue.pending('a'), 0)
+        self.assertEqual(self._drain(queue, 'b'), ['doc-old'])
+        self.assertEqual(len(queue), 0)
+
+    def test_reprioritize(self):
+        queue = self._queue()
+        queue.reprioritize('doc-old', 10.)
+        queue.reprioritize('doc-missing', 10.)
+        self.assertEqual(queue.peek('a'), 'doc-old')
+        self.assertEqual(queue.peek('b'), 'doc-old')
+        queue.reprioritize('doc-old', -1.)
+        self.assertEqual(self._drain(queue, 'a'), [
+            'doc-urgent', 'doc-new', 'doc-undated', 'doc-low', 'doc-old'])
+        # pushing a queued document updates it
+        queue.push('b', 'doc-old', 3.)
+        self.assertEqual(queue.pending('b'), 1)
+
+    def test_complete(self):
+        queue = self._queue()
+        self.assertTrue(queue.complete('a', 'doc-urgent'))
+        self.assertFalse(queue.complete('a', 'doc-urgent'))
+        self.assertTrue(queue.complete('b', 'doc-old'))
+        self.assertEqual(queue.pending('a'), 4)
+        self.assertEqual(queue.peek('a'), 'doc-old')
+        self.assertIsNone(queue.peek('b'))
+        queue.reprioritize('doc-old', 0.)
+        self.assertEqual(queue.pending('b'), 0)
+
+    def test_compaction(self):
+        queue = PriorityScheduler(random_state=0)
+        for i in range(100):
+            queue.push('a', f'doc-{i}', i)
+        for _ in range(10):
+            for i in range(100):
+                queue.reprioritize(f'doc-{i}', -i)
+        # removed entries never outnumber the live ones
+        self.assertLessEqual(len(queue._heaps['a']), 200)
+        for i in range(0, 100, 2):
+            queue.complete('a', f'doc-{i}')
+        self.assertLessEqual(len(queue._heaps['a']), 100)
+        self.assertEqual(self._drain(queue, 'a'),
+                         [f'doc-{i}' for i in range(1, 100, 2)])
+
+    def test_to_dict(self):
+        queue = self._queue()
+        queue.pop('a')
+        queue.complete('a', 'doc-new')
+        restored = PriorityScheduler.from_dict(
+            json.loads(json.dumps(queue.to_dict())))
+        self.assertEqual(len(restored), len(queue))
+        self.assertEqual(restored.pending('a'), queue.pending('a'))
+        # the random generator is restored too
+        queue.push('c', 'doc-tie', 1., '2021-01-01T00:00:00Z')
+        restored.push('c', 'doc-tie', 1., '2021-01-01T00:00:00Z')
+        self.assertEqual(restored.to_dict(), queue.to_dict())
+        for annotator in ('a', 'b', 'c'):
+            self.assertEqual(self._drain(restored, annotator),
+                             self._drain(queue, annotator))
+
+if __name__ == '__main__':
+    unittest.main()